@@ -0,0 +1,34 @@
+"""Note updated_at
+
+Revision ID: 1d7b3e9f5a62
+Revises: 8f2c6a1d4e97
+Create Date: 2026-10-18 21:12:08.553190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d7b3e9f5a62'
+down_revision: Union[str, None] = '8f2c6a1d4e97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    # A note was last modified when its newest version was recorded, or when it was created.
+    op.execute(
+        "UPDATE notes SET updated_at = COALESCE("
+        "(SELECT MAX(note_versions.created_at) FROM note_versions WHERE note_versions.note_id = notes.id), "
+        "notes.created_at)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notes', 'updated_at')
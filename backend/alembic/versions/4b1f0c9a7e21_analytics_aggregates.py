@@ -0,0 +1,51 @@
+"""Analytics aggregates
+
+Revision ID: 4b1f0c9a7e21
+Revises: cdea7aba21f2
+Create Date: 2026-10-18 10:12:41.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f0c9a7e21'
+down_revision: Union[str, None] = 'cdea7aba21f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('corpus_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_count', sa.BigInteger(), nullable=False),
+    sa.Column('char_count', sa.BigInteger(), nullable=False),
+    sa.Column('word_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('note_length_histogram',
+    sa.Column('content_length', sa.Integer(), nullable=False),
+    sa.Column('note_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('content_length')
+    )
+    op.create_table('term_frequencies',
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=255), nullable=False),
+    sa.Column('frequency', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('n', 'term')
+    )
+    op.create_index('ix_term_frequencies_n_frequency', 'term_frequencies', ['n', 'frequency'], unique=False)
+    # Word and n-gram counts need the app's tokenizer, so existing notes are folded in
+    # by aggregates.ensure_built when the API starts and finds no corpus_stats row.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_term_frequencies_n_frequency', table_name='term_frequencies')
+    op.drop_table('term_frequencies')
+    op.drop_table('note_length_histogram')
+    op.drop_table('corpus_stats')
@@ -0,0 +1,147 @@
+"""Delta note versions
+
+Revision ID: 5e8b1f3c9a27
+Revises: 7c2e9b4d1a86
+Create Date: 2026-10-18 15:02:13.418276
+
+"""
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b1f3c9a27'
+down_revision: Union[str, None] = '7c2e9b4d1a86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+notes = sa.table('notes', sa.column('id', sa.Integer), sa.column('content', sa.Text))
+note_versions = sa.table(
+    'note_versions',
+    sa.column('id', sa.Integer),
+    sa.column('note_id', sa.Integer),
+    sa.column('kind', sa.String),
+    sa.column('content', sa.Text),
+    sa.column('payload', sa.LargeBinary),
+    sa.column('compressed', sa.Boolean),
+    sa.column('content_length', sa.Integer),
+)
+
+# A frozen copy of the encoding in app.services.history as of this revision, so
+# the migration writes the same rows whatever the app code or settings become.
+# The app reads any snapshot spacing, so the interval is fixed at its default.
+SNAPSHOT_INTERVAL = 10
+DIFF_TOKEN_PATTERN = re.compile(r"\s+|\S+\s*")
+
+
+def make_delta(base, target):
+    base_tokens = DIFF_TOKEN_PATTERN.findall(base)
+    target_tokens = DIFF_TOKEN_PATTERN.findall(target)
+    offsets = [0]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    limit = min(len(base_tokens), len(target_tokens))
+    prefix = 0
+    while prefix < limit and base_tokens[prefix] == target_tokens[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base_tokens[-suffix - 1] == target_tokens[-suffix - 1]:
+        suffix += 1
+
+    opcodes = [("equal", 0, prefix, 0, prefix)]
+    matcher = SequenceMatcher(None, base_tokens[prefix:len(base_tokens) - suffix],
+                              target_tokens[prefix:len(target_tokens) - suffix], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    opcodes.append(("equal", len(base_tokens) - suffix, len(base_tokens), 0, 0))
+
+    ops = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i2 > i1:
+            if ops and isinstance(ops[-1], list) and ops[-1][0] + ops[-1][1] == offsets[i1]:
+                ops[-1][1] += offsets[i2] - offsets[i1]
+            else:
+                ops.append([offsets[i1], offsets[i2] - offsets[i1]])
+        elif tag in ("replace", "insert"):
+            text = "".join(target_tokens[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += text
+            else:
+                ops.append(text)
+    return ops
+
+
+def encode_version(content, newer_content, is_snapshot):
+    # Uncompressed: HISTORY_COMPRESSION only applies to versions the app writes.
+    values = {"content_length": len(content), "compressed": False}
+    if not is_snapshot:
+        delta = json.dumps(make_delta(newer_content, content), separators=(",", ":"))
+        if len(delta) < len(content):
+            return {**values, "kind": "delta", "content": None, "payload": delta.encode()}
+    return {**values, "kind": "snapshot", "content": content, "payload": None}
+
+
+def decode_version(version, newer_content):
+    # Downgrades also meet versions the app wrote since, which may be compressed.
+    if version.payload is not None:
+        payload = (zlib.decompress(version.payload) if version.compressed else version.payload).decode()
+        if version.kind == "snapshot":
+            return payload
+        return "".join(newer_content[op[0]:op[0] + op[1]] if isinstance(op, list) else op
+                       for op in json.loads(payload))
+    return version.content
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('note_versions', sa.Column('kind', sa.String(length=10), server_default='snapshot', nullable=False))
+    op.add_column('note_versions', sa.Column('payload', sa.LargeBinary(), nullable=True))
+    op.add_column('note_versions', sa.Column('compressed', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('note_versions', sa.Column('content_length', sa.Integer(), nullable=True))
+    op.alter_column('note_versions', 'content', existing_type=sa.Text(), nullable=True)
+
+    # Re-encode every note's history, one note at a time, newest version first:
+    # each delta is taken against the next newer text.
+    bind = op.get_bind()
+    note_ids = bind.execute(sa.select(note_versions.c.note_id).distinct()).scalars().all()
+    for note_id in note_ids:
+        newer_content = bind.execute(sa.select(notes.c.content).where(notes.c.id == note_id)).scalar()
+        versions = bind.execute(
+            sa.select(note_versions.c.id, note_versions.c.content)
+            .where(note_versions.c.note_id == note_id)
+            .order_by(note_versions.c.id)
+        ).all()
+        for position in reversed(range(len(versions))):
+            version_id, content = versions[position]
+            values = encode_version(content, newer_content, position % SNAPSHOT_INTERVAL == 0)
+            bind.execute(note_versions.update().where(note_versions.c.id == version_id).values(**values))
+            newer_content = content
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    note_ids = bind.execute(sa.select(note_versions.c.note_id).distinct()).scalars().all()
+    for note_id in note_ids:
+        newer_content = bind.execute(sa.select(notes.c.content).where(notes.c.id == note_id)).scalar()
+        versions = bind.execute(
+            sa.select(note_versions)
+            .where(note_versions.c.note_id == note_id)
+            .order_by(note_versions.c.id.desc())
+        ).all()
+        for version in versions:
+            newer_content = decode_version(version, newer_content)
+            bind.execute(note_versions.update().where(note_versions.c.id == version.id).values(content=newer_content))
+
+    op.alter_column('note_versions', 'content', existing_type=sa.Text(), nullable=False)
+    op.drop_column('note_versions', 'content_length')
+    op.drop_column('note_versions', 'compressed')
+    op.drop_column('note_versions', 'payload')
+    op.drop_column('note_versions', 'kind')
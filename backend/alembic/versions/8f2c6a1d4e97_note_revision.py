@@ -0,0 +1,28 @@
+"""Note revision
+
+Revision ID: 8f2c6a1d4e97
+Revises: 6b9d4e0a2c18
+Create Date: 2026-10-18 20:41:52.206413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2c6a1d4e97'
+down_revision: Union[str, None] = '6b9d4e0a2c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notes', 'revision')
@@ -0,0 +1,28 @@
+"""Corpus version
+
+Revision ID: 9d3e5a2c8f14
+Revises: 4b1f0c9a7e21
+Create Date: 2026-10-18 11:40:05.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e5a2c8f14'
+down_revision: Union[str, None] = '4b1f0c9a7e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('corpus_stats', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('corpus_stats', 'version')
@@ -0,0 +1,28 @@
+"""Note versions note_id index
+
+Revision ID: a3c7e2d91f45
+Revises: 5e8b1f3c9a27
+Create Date: 2026-10-18 15:40:26.731904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e2d91f45'
+down_revision: Union[str, None] = '5e8b1f3c9a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_note_versions_note_id_created_at', 'note_versions', ['note_id', sa.text('created_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_note_versions_note_id_created_at', table_name='note_versions')
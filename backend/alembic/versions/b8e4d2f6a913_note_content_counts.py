@@ -0,0 +1,60 @@
+"""Note content counts
+
+Revision ID: b8e4d2f6a913
+Revises: 1d7b3e9f5a62
+Create Date: 2026-10-19 09:41:27.264815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d2f6a913'
+down_revision: Union[str, None] = '1d7b3e9f5a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('char_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('notes', sa.Column('word_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Words are counted as the app counts them (str.split), which SQL cannot do portably.
+    notes = sa.table('notes', sa.column('id', sa.Integer), sa.column('content', sa.Text),
+                     sa.column('char_count', sa.Integer), sa.column('word_count', sa.Integer))
+    update = (
+        notes.update()
+        .where(notes.c.id == sa.bindparam('note_id'))
+        .values(char_count=sa.bindparam('chars'), word_count=sa.bindparam('words'))
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(notes.c.id, notes.c.content)
+            .where(notes.c.id > last_id)
+            .order_by(notes.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"note_id": note_id, "chars": len(content or ""), "words": len((content or "").split())}
+            for note_id, content in rows
+        ])
+        last_id = rows[-1][0]
+
+    op.create_index(op.f('ix_notes_char_count'), 'notes', ['char_count'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_notes_char_count'), table_name='notes')
+    op.drop_column('notes', 'word_count')
+    op.drop_column('notes', 'char_count')
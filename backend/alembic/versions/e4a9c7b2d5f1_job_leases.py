@@ -0,0 +1,40 @@
+"""Job leases and unique active dedupe key
+
+Revision ID: e4a9c7b2d5f1
+Revises: b8e4d2f6a913
+Create Date: 2026-10-19 14:12:05.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9c7b2d5f1'
+down_revision: Union[str, None] = 'b8e4d2f6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+    # Racing submits may already have queued duplicates; keep one of each so the index can be built.
+    op.execute(
+        "UPDATE jobs SET status = 'failed', error = 'Duplicate of an earlier job.', finished_at = now() "
+        "WHERE status IN ('queued', 'running') AND id NOT IN ("
+        "SELECT min(id) FROM jobs WHERE status IN ('queued', 'running') GROUP BY dedupe_key)"
+    )
+    op.create_index('uq_jobs_active_dedupe_key', 'jobs', ['dedupe_key'], unique=True,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_jobs_active_dedupe_key', table_name='jobs')
+    op.drop_column('jobs', 'lease_expires_at')
@@ -0,0 +1,33 @@
+"""Note version count
+
+Revision ID: f1b6d8a3c290
+Revises: e4a9c7b2d5f1
+Create Date: 2026-10-19 16:47:22.903115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6d8a3c290'
+down_revision: Union[str, None] = 'e4a9c7b2d5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('version_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE notes SET version_count = counts.version_count "
+        "FROM (SELECT note_id, count(*) AS version_count FROM note_versions GROUP BY note_id) AS counts "
+        "WHERE counts.note_id = notes.id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notes', 'version_count')
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import shutil
+from types import SimpleNamespace
+from app.config import EMBEDDING_DIR, JOB_WORKERS
+from app.database import AsyncSessionLocal
+from app.services import aggregates
+from app.services.ngrams import NGRAM_SIZES, NgramCounter, scan_notes
+
+
+async def rebuild_analytics(args):
+    async with AsyncSessionLocal() as db:
+        await aggregates.rebuild(db, workers=args.workers)
+
+
+async def top_ngrams(args):
+    counter = NgramCounter(capacity=args.capacity)
+    async with AsyncSessionLocal() as db:
+        await scan_notes(db, counter, workers=args.workers)
+    print(json.dumps({n: counter.most_common(n, args.top) for n in NGRAM_SIZES}, indent=2))
+
+
+# Each command imports what it needs, so maintenance commands start fast and do
+# not need the settings of subsystems they do not use.
+async def rebuild_embeddings(args):
+    from app.services.embeddings import EmbeddingIndex
+
+    # Run with the API stopped: it keeps its own mapping of the same files.
+    if EMBEDDING_DIR:
+        shutil.rmtree(EMBEDDING_DIR, ignore_errors=True)
+    index = EmbeddingIndex()
+    async with AsyncSessionLocal() as db:
+        await index.sync(db)
+    print(f"Embedded {len(index)} notes")
+
+
+async def worker(args):
+    from app.services.analytics_cache import AnalyticsCache
+    from app.services.gemini_summerizer import make_gemini_client
+    from app.services.jobs import JobQueue
+    from app.services.summary_cache import SummaryCache
+
+    state = SimpleNamespace(analytics_cache=AnalyticsCache(), gemini_client=make_gemini_client(),
+                            summary_cache=SummaryCache())
+    try:
+        await JobQueue(AsyncSessionLocal, state, workers=args.workers or JOB_WORKERS or 1).run_forever()
+    finally:
+        if state.gemini_client is not None:
+            await state.gemini_client.aclose()
+
+
+COMMANDS = {
+    "rebuild-analytics": rebuild_analytics,
+    "top-ngrams": top_ngrams,
+    "rebuild-embeddings": rebuild_embeddings,
+    "worker": worker,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notes Manager maintenance commands")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="rebuild/top-ngrams: tokenize in this many processes; worker: concurrent jobs")
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="top-ngrams: counters kept per n-gram size (approximate when set)")
+    parser.add_argument("--top", type=int, default=10, help="top-ngrams: terms to print per size")
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,82 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL","postgresql+asyncpg://user:password@db:5432/notes_db")
 TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL","sqlite+aiosqlite:///:memory:")
+
+
+class ConfigError(ValueError):
+    """A subsystem is used without the settings it needs."""
+
+
+def require_settings(subsystem: str, **settings):
+    """Raise ConfigError naming the unset ``settings`` of ``subsystem``.
+
+    Each subsystem checks its own settings when it starts, so a process that
+    never uses one does not need its configuration.
+    """
+    missing = [name for name, value in settings.items() if not value]
+    if missing:
+        raise ConfigError(f"{subsystem} needs {', '.join(missing)} to be set in the environment")
+
+
+# Only needed to summarize notes.
 GENAI_API_KEY = os.getenv("GENAI_API_KEY")
-if not GENAI_API_KEY:
-    raise ValueError("Gemini API Key is not set in the environment variables")
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "10"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+# Circuit breaker: open after this many consecutive failed calls, probe again after the timeout.
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_TIMEOUT = float(os.getenv("GEMINI_BREAKER_RESET_TIMEOUT", "30"))
+# Adaptive concurrency: backs off below GEMINI_MAX_CONCURRENCY on 429s, 5xx and responses slower than the target.
+GEMINI_MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+GEMINI_LATENCY_TARGET = float(os.getenv("GEMINI_LATENCY_TARGET", "5"))
+
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+SUMMARY_BATCH_CHAR_BUDGET = int(os.getenv("SUMMARY_BATCH_CHAR_BUDGET", "8000"))
+SUMMARY_BATCH_MAX_NOTES = int(os.getenv("SUMMARY_BATCH_MAX_NOTES", "10"))
+SUMMARY_BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", str(GEMINI_MAX_CONCURRENCY)))
+# Longer notes are summarized in chunks of at most this many characters.
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "3000"))
+SUMMARY_CHUNK_CONCURRENCY = int(os.getenv("SUMMARY_CHUNK_CONCURRENCY", str(GEMINI_MAX_CONCURRENCY)))
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# A running job whose worker stopped renewing its lease for this long is run again.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+HISTORY_SNAPSHOT_INTERVAL = int(os.getenv("HISTORY_SNAPSHOT_INTERVAL", "10"))
+HISTORY_COMPRESSION = os.getenv("HISTORY_COMPRESSION", "false").lower() in ("1", "true", "yes")
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "256"))
+EMBEDDING_DIR = os.getenv("EMBEDDING_DIR", "data/embeddings")
+EMBEDDING_NPROBE = int(os.getenv("EMBEDDING_NPROBE", "8"))
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+# Optional read replica for GET routes; unset, reads use DATABASE_URL.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Groups of cached responses written to within this many seconds are read from the
+# primary, so replica lag cannot put stale data back into the response cache.
+DB_REPLICA_LAG_WINDOW = float(os.getenv("DB_REPLICA_LAG_WINDOW", "5"))
+
+METRICS_EVENT_LOOP_INTERVAL = float(os.getenv("METRICS_EVENT_LOOP_INTERVAL", "0.5"))
+
+# Startup warm-up: pre-open pooled connections and prime caches before taking traffic.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "10"))
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "4"))
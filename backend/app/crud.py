@@ -1,15 +1,39 @@
 import logging
-from typing import Optional
+from collections import defaultdict
+from typing import Collection, Optional, Sequence
+from sqlalchemy import and_, delete, func, insert, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.future import select
 from app.models import Note, NoteVersion
 from app.schemas import NoteCreate, NoteUpdate
+from app.services import aggregates, history
+from app.services.ngrams import count_words
+from app.services.response_cache import CORPUS_GROUP, note_group
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NOTE_PREVIEW_LENGTH = 200
+# Attempts of an unconditional update that keeps losing the race to concurrent writers.
+UPDATE_ATTEMPTS = 3
+
+
+class RevisionConflict(Exception):
+    """The note changed since the revision an update was based on."""
+
+    def __init__(self, note_id: int, revision: int):
+        super().__init__(f"Note {note_id} is at revision {revision}")
+        self.note_id = note_id
+        self.revision = revision
+
+
+def content_counts(content: str) -> dict:
+    """The note columns derived from its content."""
+    return {"char_count": len(content), "word_count": count_words(content)}
+
 
 async def commit_handler(db: AsyncSession, message: str | None):
     try:
@@ -22,50 +46,210 @@ async def commit_handler(db: AsyncSession, message: str | None):
         raise
 
 
-async def create_note(db: AsyncSession, note_data: NoteCreate) -> Optional[Note]:
-    new_note = Note(**note_data.model_dump())
+async def create_note(db: AsyncSession, note_data: NoteCreate,
+                      indexes: Sequence = (), cache=None) -> Optional[Note]:
+    # The INSERT returns id and created_at, so the response is built without
+    # reading the row back.
+    new_note = Note(**note_data.model_dump(), **content_counts(note_data.content))
     db.add(new_note)
+    await aggregates.apply_note_delta(db, None, new_note.content)
     await commit_handler(db, None)
     logger.info(f"New note created: {new_note}")
-    await db.refresh(new_note)
+    for index in indexes:
+        index.add(new_note.id, new_note.title, new_note.content)
+    if cache is not None:
+        await cache.invalidate(CORPUS_GROUP)
 
     return new_note
 
 
-async def get_note(db: AsyncSession, note_id: int) -> Optional[Note]:
-    return await db.get(Note, note_id)
-
+async def create_notes(db: AsyncSession, notes: list[NoteCreate], indexes: Sequence = (),
+                       cache=None) -> list[int]:
+    # One multi-row INSERT ... RETURNING and one commit for the whole batch.
+    rows = [{**note.model_dump(), **content_counts(note.content)} for note in notes]
+    result = await db.execute(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows)
+    note_ids = result.scalars().all()
+    await aggregates.apply_notes_added(db, [row["content"] for row in rows])
+    await commit_handler(db, f"{len(note_ids)} notes created")
+    for index in indexes:
+        for note_id, row in zip(note_ids, rows):
+            index.add(note_id, row["title"], row["content"])
+    if cache is not None:
+        await cache.invalidate(CORPUS_GROUP)
+    return note_ids
 
-async def get_notes(db: AsyncSession) -> list[Note]:
-    result = await db.execute(select(Note))
-    return result.scalars().all()
 
+async def get_note(db: AsyncSession, note_id: int) -> Optional[Note]:
+    return await db.get(Note, note_id)
 
-async def update_note(db: AsyncSession, note_id: int, note_data: NoteUpdate) -> Optional[Note]:
-    note = await db.get(Note, note_id)
-    if not note:
-        return None
 
-    updated_note = note_data.model_dump(exclude_unset=True)
-    if not updated_note:
+async def get_note_validators(db: AsyncSession, note_id: int):
+    """Return the note's ``(revision, updated_at)`` row, or None."""
+    result = await db.execute(select(Note.revision, Note.updated_at).where(Note.id == note_id))
+    return result.one_or_none()
+
+
+async def get_note_titles(db: AsyncSession, note_ids: list[int]) -> dict[int, str]:
+    result = await db.execute(select(Note.id, Note.title).where(Note.id.in_(note_ids)))
+    return dict(result.all())
+
+
+async def get_notes(db: AsyncSession, limit: int, cursor: Optional[int] = None,
+                    include_versions: bool = False) -> tuple[list[dict], Optional[int]]:
+    # Keyset pagination on the primary key: ids grow with created_at, so the page
+    # order matches creation order and every page is an index range scan.
+    stmt = (
+        select(
+            Note.id,
+            Note.title,
+            Note.created_at,
+            func.substr(Note.content, 1, NOTE_PREVIEW_LENGTH).label("preview"),
+        )
+        .order_by(Note.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(Note.id > cursor)
+
+    result = await db.execute(stmt)
+    notes = [dict(row._mapping) for row in result.all()]
+
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        next_cursor = notes[-1]["id"]
+
+    if include_versions and notes:
+        note_ids = [note["id"] for note in notes]
+        versions = await db.execute(
+            select(NoteVersion)
+            .where(NoteVersion.note_id.in_(note_ids))
+            .order_by(NoteVersion.created_at.desc(), NoteVersion.id.desc())
+        )
+        versions_by_note = defaultdict(list)
+        for version in versions.scalars():
+            versions_by_note[version.note_id].append(version)
+        # Versions are stored as deltas against the current content.
+        contents = dict((await db.execute(select(Note.id, Note.content).where(Note.id.in_(note_ids)))).all())
+        for note in notes:
+            history.load_contents(contents[note["id"]], versions_by_note[note["id"]])
+            note["versions"] = versions_by_note[note["id"]]
+
+    return notes, next_cursor
+
+
+async def get_note_versions(db: AsyncSession, note_id: int, limit: int, cursor: Optional[int] = None,
+                            metadata_only: bool = False) -> tuple[list, Optional[int]]:
+    # Newest first, keyset-paginated on (created_at, id) so every page is a range
+    # scan of ix_note_versions_note_id_created_at.
+    if metadata_only:
+        content_length = func.coalesce(NoteVersion.content_length, func.length(NoteVersion.content))
+        stmt = select(NoteVersion.id, NoteVersion.created_at, content_length.label("content_length"))
+    else:
+        stmt = select(NoteVersion)
+    stmt = (
+        stmt.where(NoteVersion.note_id == note_id)
+        .order_by(NoteVersion.created_at.desc(), NoteVersion.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        # Compared in SQL so both sides use the database's own timestamp representation.
+        created_at = (
+            select(NoteVersion.created_at)
+            .where(NoteVersion.id == cursor, NoteVersion.note_id == note_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(or_(
+            NoteVersion.created_at < created_at,
+            and_(NoteVersion.created_at == created_at, NoteVersion.id < cursor),
+        ))
+
+    result = await db.execute(stmt)
+    versions = [dict(row._mapping) for row in result.all()] if metadata_only else result.scalars().all()
+
+    next_cursor = None
+    if len(versions) > limit:
+        versions = versions[:limit]
+        next_cursor = versions[-1]["id"] if metadata_only else versions[-1].id
+
+    if not metadata_only:
+        await history.load_page(db, note_id, versions)
+    return versions, next_cursor
+
+
+async def update_note(db: AsyncSession, note_id: int, note_data: NoteUpdate,
+                      indexes: Sequence = (), revisions: Optional[Collection[int]] = None,
+                      cache=None) -> Optional[Note]:
+    """Apply ``note_data`` to a note, recording the old content as a version.
+
+    ``revisions`` holds the revisions the caller's edit was based on; if the
+    note is at none of them, or moves on before the write lands,
+    ``RevisionConflict`` is raised. Without it, an update that loses the race
+    to a concurrent writer is retried on the new content.
+    """
+    for attempt in range(UPDATE_ATTEMPTS):
+        # No row lock: the UPDATE itself checks that the revision read here is
+        # still current, so nothing is held while the delta is computed. The
+        # read bypasses the identity map, which may hold an older revision.
+        note = await db.get(Note, note_id, populate_existing=True)
+        if not note:
+            return None
+        if revisions is not None and note.revision not in revisions:
+            raise RevisionConflict(note_id, note.revision)
+
+        updated_note = note_data.model_dump(exclude_unset=True)
+        if not updated_note:
+            return note
+
+        old_content = note.content
+        new_content = updated_note.get("content", old_content)
+        if "content" in updated_note:
+            updated_note.update(content_counts(new_content))
+        # The new version and the note UPDATE go out in one flush; the version's
+        # id and created_at come back through INSERT ... RETURNING. The stored
+        # count places snapshots without reading the history.
+        history_entry = history.make_version(old_content, new_content, note.version_count)
+        history_entry.note_id = note_id
+        db.add(history_entry)
+        updated_note["version_count"] = note.version_count + 1
+
+        for key, value in updated_note.items():
+            setattr(note, key, value)
+
+        try:
+            await db.flush()
+        except StaleDataError:
+            # Rolling back expires the note, so the next attempt reads it afresh.
+            await db.rollback()
+            logger.info(f"Concurrent update of note {note_id}, attempt {attempt + 1}")
+            if revisions is not None or attempt == UPDATE_ATTEMPTS - 1:
+                raise RevisionConflict(note_id, await db.scalar(select(Note.revision).where(Note.id == note_id)))
+            continue
+
+        await aggregates.apply_note_delta(db, old_content, note.content)
+
+        await commit_handler(db, f"Note updated with ID: {note.id}")
+        for index in indexes:
+            index.add(note.id, note.title, note.content)
+        if cache is not None:
+            await cache.invalidate(note_group(note.id), CORPUS_GROUP)
         return note
 
-    history_entry = NoteVersion(note_id=note.id, content=note.content)
-    db.add(history_entry)
-
-    for key, value in updated_note.items():
-        setattr(note, key, value)
 
-    await commit_handler(db, f"Note updated with ID: {note.id}")
-    await db.refresh(note)
-    return note
-
-
-async def delete_note(db: AsyncSession, note_id: int) -> Optional[Note]:
-    note = await db.get(Note, note_id)
-    if not note:
-        return None
-
-    await db.delete(note)
-    await commit_handler(db, f"Note deleted with ID: {note.id}")
-    return note
+async def delete_note(db: AsyncSession, note_id: int,
+                      indexes: Sequence = (), cache=None) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        # SQLite does not enforce the ON DELETE CASCADE foreign key by default.
+        await db.execute(delete(NoteVersion).where(NoteVersion.note_id == note_id))
+    content = await db.scalar(delete(Note).where(Note.id == note_id).returning(Note.content))
+    if content is None:
+        await db.rollback()
+        return False
+
+    await aggregates.apply_note_delta(db, content, None)
+    await commit_handler(db, f"Note deleted with ID: {note_id}")
+    for index in indexes:
+        index.remove(note_id)
+    if cache is not None:
+        await cache.invalidate(note_group(note_id), CORPUS_GROUP)
+    return True
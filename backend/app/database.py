@@ -1,10 +1,83 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import (
+    DATABASE_URL, DATABASE_READ_URL, DB_COMMAND_TIMEOUT, DB_CONNECT_TIMEOUT, DB_MAX_OVERFLOW, DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_STATEMENT_CACHE_SIZE,
+)
 
 
-engine = create_async_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+class MonitoredPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def stats(self) -> dict:
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "saturation": checked_out / capacity if capacity else 0.0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds,
+            "wait_seconds_avg": self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+            "wait_seconds_max": self.max_wait_seconds,
+        }
+
+
+def make_engine(url: str) -> AsyncEngine:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "future": True}
+    parsed = make_url(url)
+    # SQLite keeps its own pool classes; the queue pool settings only apply to servers.
+    if parsed.get_backend_name() != "sqlite":
+        options.update(
+            poolclass=MonitoredPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "command_timeout": DB_COMMAND_TIMEOUT,
+            "timeout": DB_CONNECT_TIMEOUT,
+        }
+    return create_async_engine(url, **options)
+
+
+engine = make_engine(DATABASE_URL)
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+# Read-only replica for GET routes; None when reads go to the primary.
+read_engine = make_engine(DATABASE_READ_URL) if DATABASE_READ_URL else None
+ReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False) if read_engine else None
 Base = declarative_base()
 
 
@@ -15,3 +88,27 @@ async def init_db():
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_db():
+    """Yield a session on the read replica, or None when there is none."""
+    if ReadSessionLocal is None:
+        yield None
+        return
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+def pool_stats() -> dict:
+    engines = {"primary": engine, "replica": read_engine}
+    return {
+        name: pool.stats() if isinstance(pool := current.pool, MonitoredPool) else {"status": pool.status()}
+        for name, current in engines.items() if current is not None
+    }
+
+
+def dialect_insert(db: AsyncSession):
+    """Return the insert() construct of the session's dialect, which supports ON CONFLICT."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
@@ -1,21 +1,80 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
-from app.database import init_db
+from app.config import DB_WARMUP_CONNECTIONS, STARTUP_WARMUP, STARTUP_WARMUP_TIMEOUT
+from app.database import AsyncSessionLocal, engine, init_db, read_engine
 from app.routes.notes import router as notes_router
 from app.routes.note_history import router as note_history_router
 from app.routes.summarizer import router as summarizer_router
 from app.routes.analytics import router as analytics_router
+from app.routes.jobs import router as jobs_router
+from app.routes.system import metrics_router, router as system_router
+from app.services import aggregates
+from app.services.analytics_cache import AnalyticsCache
+from app.services.response_cache import make_response_cache
+from app.services.metrics import MetricsMiddleware, instrument_engine, monitor_event_loop
+from app.services.gemini_summerizer import make_gemini_client
+from app.services.summary_cache import SummaryCache
+from app.services.jobs import JobQueue
+from app.services.search import SearchIndex
+from app.services.warmup import prime_analytics, run_warmup, warm_pool
+
+
+instrument_engine(engine, "primary")
+if read_engine is not None:
+    instrument_engine(read_engine, "replica")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
-    yield
+    # Imported here: numpy is only needed once the index is built, not to import the app.
+    from app.services.embeddings import EmbeddingIndex
+
+    event_loop_monitor = asyncio.create_task(monitor_event_loop())
+    # Set before anything can fail, so cleanup knows what was started.
+    app.state.response_cache = app.state.gemini_client = app.state.job_queue = None
+    try:
+        await init_db()
+        app.state.analytics_cache = AnalyticsCache()
+        app.state.response_cache = make_response_cache()
+        # PostgreSQL searches its own tsvector index; elsewhere search runs in process.
+        app.state.search_index = None
+        app.state.embedding_index = EmbeddingIndex()
+        async with AsyncSessionLocal() as db:
+            await aggregates.ensure_built(db)
+            if engine.dialect.name != "postgresql":
+                app.state.search_index = await SearchIndex.build(db)
+            await app.state.embedding_index.sync(db)
+        app.state.gemini_client = make_gemini_client()
+        app.state.summary_cache = SummaryCache()
+        app.state.job_queue = JobQueue(AsyncSessionLocal, app.state)
+        app.state.job_queue.start()
+        if STARTUP_WARMUP:
+            hooks = {
+                "primary pool": lambda: warm_pool(engine, DB_WARMUP_CONNECTIONS),
+                "analytics": lambda: prime_analytics(AsyncSessionLocal, app.state.analytics_cache),
+            }
+            if read_engine is not None:
+                hooks["replica pool"] = lambda: warm_pool(read_engine, DB_WARMUP_CONNECTIONS)
+            await run_warmup(hooks, STARTUP_WARMUP_TIMEOUT)
+        yield
+    finally:
+        event_loop_monitor.cancel()
+        await asyncio.gather(event_loop_monitor, return_exceptions=True)
+        if app.state.job_queue is not None:
+            await app.state.job_queue.stop()
+        if app.state.gemini_client is not None:
+            await app.state.gemini_client.aclose()
+        if app.state.response_cache is not None:
+            await app.state.response_cache.aclose()
+        if read_engine is not None:
+            await read_engine.dispose()
+        await engine.dispose()
 
 
-app = FastAPI(title="Notes Manager System")
+app = FastAPI(title="Notes Manager System", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,9 +82,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(notes_router)
 app.include_router(note_history_router)
 app.include_router(summarizer_router)
 app.include_router(analytics_router)
+app.include_router(jobs_router)
+app.include_router(system_router)
+app.include_router(metrics_router)
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index, JSON, Boolean, LargeBinary, false, func, text,
+)
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -10,16 +12,31 @@ class Note(Base):
     title = Column(String(100), nullable=False, index=True)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Bumped on every update. The mapper adds "AND revision = <read revision>" to
+    # each UPDATE, so a concurrent edit makes the flush fail instead of being lost.
+    revision = Column(Integer, nullable=False, server_default="1")
+    # Derived from content by every write, so analytics can sort notes by size in SQL.
+    char_count = Column(Integer, nullable=False, server_default="0", index=True)
+    word_count = Column(Integer, nullable=False, server_default="0")
+    # Versions of the note, kept by every update; it spaces the history snapshots.
+    version_count = Column(Integer, nullable=False, server_default="0")
+    # On PostgreSQL a migration also adds search_vector, a generated tsvector
+    # with a GIN index. It is left unmapped and only read by app.services.search.
 
     versions = relationship(
         "NoteVersion",
         back_populates="note",
         cascade="all, delete",
         passive_deletes=True,
-        order_by="NoteVersion.created_at.desc()",
-        lazy = "selectin"
+        order_by="[NoteVersion.created_at.desc(), NoteVersion.id.desc()]",
+        # Never loaded through the note: history is read a page at a time from /history.
+        lazy="raise"
     )
 
+    # eager_defaults: updated_at comes back through UPDATE ... RETURNING.
+    __mapper_args__ = {"version_id_col": revision, "eager_defaults": True}
+
     def __repr__(self):
         return f"Note(id={self.id} title={self.title})"
 
@@ -29,7 +46,13 @@ class NoteVersion(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"),nullable=False)
-    content = Column(Text, nullable=False)
+    # Snapshots keep the text in content (or compressed in payload); deltas keep
+    # a reverse delta from the next newer version in payload.
+    kind = Column(String(10), nullable=False, default="snapshot", server_default="snapshot")
+    content = Column(Text, nullable=True)
+    payload = Column(LargeBinary, nullable=True)
+    compressed = Column(Boolean, nullable=False, default=False, server_default=false())
+    content_length = Column(Integer, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
 
     note = relationship(
@@ -38,4 +61,84 @@ class NoteVersion(Base):
     )
 
     def __repr__(self):
-        return f"NoteVersion(id={self.id} note_id={self.note_id})"
+        return f"NoteVersion(id={self.id} note_id={self.note_id} kind={self.kind})"
+
+
+Index("ix_note_versions_note_id_created_at", NoteVersion.note_id, NoteVersion.created_at.desc())
+
+
+class CorpusStats(Base):
+    __tablename__ = "corpus_stats"
+
+    id = Column(Integer, primary_key=True)
+    note_count = Column(BigInteger, nullable=False, default=0)
+    char_count = Column(BigInteger, nullable=False, default=0)
+    word_count = Column(BigInteger, nullable=False, default=0)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"CorpusStats(note_count={self.note_count} version={self.version})"
+
+
+class NoteLengthBucket(Base):
+    __tablename__ = "note_length_histogram"
+
+    content_length = Column(Integer, primary_key=True)
+    note_count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"NoteLengthBucket(content_length={self.content_length} note_count={self.note_count})"
+
+
+class TermFrequency(Base):
+    __tablename__ = "term_frequencies"
+    __table_args__ = (
+        Index("ix_term_frequencies_n_frequency", "n", "frequency"),
+    )
+
+    n = Column(Integer, primary_key=True)
+    term = Column(String(255), primary_key=True)
+    frequency = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"TermFrequency(n={self.n} term={self.term})"
+
+
+class Summary(Base):
+    __tablename__ = "summaries"
+
+    content_hash = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"Summary(content_hash={self.content_hash} model={self.model})"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_priority", "status", "priority"),
+        # At most one queued or running job per dedupe key, also under concurrent submits.
+        Index("uq_jobs_active_dedupe_key", "dedupe_key", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')"),
+              sqlite_where=text("status IN ('queued', 'running')")),
+    )
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    params = Column(JSON, nullable=False)
+    dedupe_key = Column(String(64), nullable=False, index=True)
+    priority = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="queued")
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Renewed while a worker runs the job; a running job past its lease is claimed again.
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"Job(id={self.id} kind={self.kind} status={self.status})"
@@ -1,23 +1,30 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.services import aggregates
 from app.services.analytics import NoteAnalytics
+from app.services.analytics_cache import AnalyticsCache, get_analytics_cache
+from app.services.response_cache import CORPUS_GROUP, CachedResponse, get_response_cache, serve
+from app.services.serialization import dumps
 
 
 router = APIRouter(prefix="/analytics", tags=["Notes Analytics"])
 
 
 @router.get("/")
-async def get_analytics(db: AsyncSession = Depends(get_db)):
-    analytics_service = NoteAnalytics(db)
+async def get_analytics(request: Request, db: AsyncSession = Depends(get_db),
+                        read_db: Optional[AsyncSession] = Depends(get_read_db),
+                        cache: AnalyticsCache = Depends(get_analytics_cache),
+                        response_cache=Depends(get_response_cache)):
+    async def render(db: AsyncSession):
+        version = await aggregates.get_corpus_version(db)
+        summary = await cache.get_or_compute("summary", version, NoteAnalytics(db).get_summary)
+        return CachedResponse(dumps(summary), {"ETag": f'"c{version}"'})
 
-    return {
-        "total_word_count": await analytics_service.get_word_count(),
-        "average_note_length": await analytics_service.get_average_length(),
-        "most_common_words": await analytics_service.get_most_common_words(),
-        "top_notes": await analytics_service.get_top_notes(),
-        "total_character_count": await analytics_service.get_character_count(),
-        "median_note_length": await analytics_service.get_median_length(),
-        "common_bigrams": await analytics_service.get_common_bigrams(),
-        "common_trigrams": await analytics_service.get_common_trigrams()
-    }
+    return await serve(request, response_cache, CORPUS_GROUP, "analytics", render, db, read_db)
+
+
+@router.get("/cache")
+async def get_analytics_cache_stats(cache: AnalyticsCache = Depends(get_analytics_cache)):
+    return cache.stats()
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas
+from app.database import get_db
+from app.models import Job
+from app.services.jobs import JobQueue, get_job_queue
+
+
+router = APIRouter(prefix="/jobs", tags=["Background Jobs"])
+
+
+@router.post("/", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job_data: schemas.JobCreate, db: AsyncSession = Depends(get_db),
+                     queue: JobQueue = Depends(get_job_queue)):
+    if job_data.kind == "summarize" and not isinstance(job_data.params.get("note_id"), int):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Summarize jobs require an integer note_id param.")
+    return await queue.submit(db, job_data.kind, job_data.params, job_data.priority)
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id, populate_existing=True)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return job
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id, populate_existing=True)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}.")
+    return {"id": job.id, "result": job.result}
@@ -1,18 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from typing import Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud, schemas
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.services.response_cache import CachedResponse, get_response_cache, http_date, note_group, serve
+from app.services.serialization import dumps, version_fields
 
 
 router = APIRouter(prefix="/history", tags=["Note History"])
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
 
-@router.get("/{note_id}", response_model=list[schemas.NoteVersionResponse])
-async def get_note_history(note_id: int, db: AsyncSession = Depends(get_db)):
-    stmt = select(crud.NoteVersion).filter(crud.NoteVersion.note_id == note_id)
-    result = await db.execute(stmt)
-    history = result.scalars().all()
-    if not history:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Note history not found.")
-    return history
+
+@router.get("/{note_id}", response_model=Union[list[schemas.NoteVersionResponse], list[schemas.NoteVersionMetadata]])
+async def get_note_history(note_id: int, request: Request,
+                           limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                           cursor: Optional[int] = None,
+                           metadata_only: bool = False,
+                           db: AsyncSession = Depends(get_db),
+                           read_db: Optional[AsyncSession] = Depends(get_read_db),
+                           cache=Depends(get_response_cache)):
+    async def render(db: AsyncSession):
+        # History only changes with the note, so the note's revision validates it.
+        # It is read first, so the ETag is never newer than the page.
+        validators = await crud.get_note_validators(db, note_id)
+        versions, next_cursor = await crud.get_note_versions(db, note_id, limit, cursor, metadata_only)
+        if validators is None or (not versions and cursor is None):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Note history not found.")
+        revision, updated_at = validators
+        headers = {"ETag": f'"{revision}"'}
+        if updated_at is not None:
+            headers["Last-Modified"] = http_date(updated_at)
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = str(next_cursor)
+        # Metadata rows are already plain dicts.
+        body = versions if metadata_only else [version_fields(version) for version in versions]
+        return CachedResponse(dumps(body), headers)
+
+    variant = f"history?limit={limit}&cursor={cursor}&metadata_only={metadata_only}"
+    return await serve(request, cache, note_group(note_id), variant, render, db, read_db)
@@ -1,50 +1,188 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app import crud, schemas
+from app.services import aggregates
+from app.services.bulk import export_notes, import_notes
+from app.services.note_indexes import get_embedding_index, get_note_indexes
+from app.services.response_cache import (
+    CORPUS_GROUP, CachedResponse, get_response_cache, http_date, note_group, serve,
+)
+from app.services.serialization import dumps, note_fields, note_list_item_fields, note_response
+from app.services.search import SearchIndex, get_search_index, search_notes
 
 router = APIRouter(prefix="/notes", tags=["Notes CRUD"])
 
+NOTES_PAGE_SIZE = 50
+NOTES_MAX_PAGE_SIZE = 200
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def note_etag(note) -> str:
+    return f'"{note.revision}"'
+
+
+def note_headers(note) -> dict[str, str]:
+    headers = {"ETag": note_etag(note)}
+    if note.updated_at is not None:
+        headers["Last-Modified"] = http_date(note.updated_at)
+    return headers
+
+
+def parse_if_match(header: Optional[str]) -> Optional[set[int]]:
+    """Return the revisions listed in an If-Match header, or None if any revision matches.
+
+    Weak and malformed entity tags never match.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    revisions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            revisions.add(int(tag[1:-1]))
+    return revisions
+
+
+async def similar_notes_response(db: AsyncSession, ranked: list[tuple[int, float]]) -> list[dict]:
+    titles = await crud.get_note_titles(db, [note_id for note_id, _ in ranked])
+    return [{"id": note_id, "title": titles[note_id], "score": score} for note_id, score in ranked if note_id in titles]
+
 
 @router.post("/", response_model=schemas.NoteResponse,
          status_code=status.HTTP_201_CREATED)
-async def create_note(note_data: schemas.NoteCreate, db: AsyncSession = Depends(get_db)):
-    return await crud.create_note(db, note_data)
+async def create_note(note_data: schemas.NoteCreate, db: AsyncSession = Depends(get_db),
+                      indexes: list = Depends(get_note_indexes),
+                      cache=Depends(get_response_cache)):
+    note = await crud.create_note(db, note_data, indexes, cache)
+    return note_response(note, status.HTTP_201_CREATED, note_headers(note))
+
+
+# The bulk and search routes are declared before /{note_id} so their paths are not parsed as note ids.
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import(request: Request, db: AsyncSession = Depends(get_db),
+                      indexes: list = Depends(get_note_indexes),
+                      cache=Depends(get_response_cache)):
+    content_type = request.headers.get("content-type", "")
+    body_format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    return await import_notes(db, request.stream(), body_format, indexes, cache)
+
+
+@router.get("/export")
+async def export(include_versions: bool = False, db: AsyncSession = Depends(get_db),
+                 read_db: Optional[AsyncSession] = Depends(get_read_db)):
+    # An export is a long scan that does not need the latest write: use the replica.
+    db = read_db or db
+
+    async def ndjson():
+        try:
+            async for lines in export_notes(db, include_versions):
+                yield lines
+        finally:
+            # The stream outlives the request-scoped dependency; release the connection explicitly.
+            await db.close()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'})
+
+
+@router.get("/search", response_model=list[schemas.SearchResult])
+async def search(q: str = Query(..., min_length=1, max_length=200),
+                 limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+                 db: AsyncSession = Depends(get_db),
+                 search_index: Optional[SearchIndex] = Depends(get_search_index)):
+    return await search_notes(db, search_index, q, limit)
+
+
+@router.get("/semantic-search", response_model=list[schemas.SimilarNote])
+async def semantic_search(q: str = Query(..., min_length=1, max_length=1000),
+                          limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+                          db: AsyncSession = Depends(get_db),
+                          embedding_index=Depends(get_embedding_index)):
+    return await similar_notes_response(db, embedding_index.search_text(q, limit))
 
 
 @router.get("/{note_id}", response_model=schemas.NoteResponse)
-async def get_note(note_id: int, db: AsyncSession = Depends(get_db)):
-    note = await crud.get_note(db, note_id)
-    if not note:
+async def get_note(note_id: int, request: Request, db: AsyncSession = Depends(get_db),
+                   read_db: Optional[AsyncSession] = Depends(get_read_db),
+                   cache=Depends(get_response_cache)):
+    async def render(db: AsyncSession):
+        note = await crud.get_note(db, note_id)
+        if not note:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Note not found.")
+        return CachedResponse(dumps(note_fields(note)), note_headers(note))
+
+    return await serve(request, cache, note_group(note_id), "", render, db, read_db)
+
+
+@router.get("/{note_id}/similar", response_model=list[schemas.SimilarNote])
+async def get_similar_notes(note_id: int,
+                            limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+                            db: AsyncSession = Depends(get_db),
+                            embedding_index=Depends(get_embedding_index)):
+    vector = embedding_index.vector(note_id)
+    if vector is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Note not found.")
-    return note
+    return await similar_notes_response(db, embedding_index.search(vector, limit, exclude=note_id))
+
 
+@router.get("/", response_model=list[schemas.NoteListItem])
+async def get_notes(request: Request,
+                    limit: int = Query(NOTES_PAGE_SIZE, ge=1, le=NOTES_MAX_PAGE_SIZE),
+                    cursor: Optional[int] = None,
+                    include_versions: bool = False,
+                    db: AsyncSession = Depends(get_db),
+                    read_db: Optional[AsyncSession] = Depends(get_read_db),
+                    cache=Depends(get_response_cache)):
+    async def render(db: AsyncSession):
+        # The version is read before the page, so the ETag is never newer than the data.
+        version = await aggregates.get_corpus_version(db)
+        notes, next_cursor = await crud.get_notes(db, limit, cursor, include_versions)
+        headers = {"ETag": f'"c{version}"'}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = str(next_cursor)
+        return CachedResponse(dumps([note_list_item_fields(note) for note in notes]), headers)
 
-@router.get("/", response_model=list[schemas.NoteResponse])
-async def get_notes(db: AsyncSession = Depends(get_db)):
-    notes = await crud.get_notes(db)
-    if not notes:
-        return []
-    return notes
+    variant = f"notes?limit={limit}&cursor={cursor}&include_versions={include_versions}"
+    return await serve(request, cache, CORPUS_GROUP, variant, render, db, read_db)
 
 
 @router.put("/{note_id}", response_model=schemas.NoteResponse)
-async def update_note(note_id: int, note_data: schemas.NoteUpdate, db: AsyncSession = Depends(get_db)):
+async def update_note(note_id: int, note_data: schemas.NoteUpdate,
+                      if_match: Optional[str] = Header(None),
+                      db: AsyncSession = Depends(get_db),
+                      indexes: list = Depends(get_note_indexes),
+                      cache=Depends(get_response_cache)):
     if not note_data.title and not note_data.content:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="At least title or content must be updated.")
 
-    updated_note = await crud.update_note(db, note_id, note_data)
+    try:
+        updated_note = await crud.update_note(db, note_id, note_data, indexes, parse_if_match(if_match), cache)
+    except crud.RevisionConflict as e:
+        # With If-Match the client's precondition failed; without it, concurrent
+        # writers kept winning the race.
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED if if_match else status.HTTP_409_CONFLICT,
+            detail="Note was modified by another request.",
+            headers={"ETag": f'"{e.revision}"'} if e.revision is not None else None,
+        )
     if not updated_note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Note not found.")
-    return updated_note
+    return note_response(updated_note, headers=note_headers(updated_note))
 
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_note(note_id: int, db: AsyncSession = Depends(get_db)):
-    if not await crud.delete_note(db, note_id):
+async def delete_note(note_id: int, db: AsyncSession = Depends(get_db),
+                      indexes: list = Depends(get_note_indexes),
+                      cache=Depends(get_response_cache)):
+    if not await crud.delete_note(db, note_id, indexes, cache):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Note not found.")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
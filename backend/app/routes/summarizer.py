@@ -1,18 +1,105 @@
+import anyio
+import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas
 from app.database import get_db
 from app.models import Note
-from app.services.gemini_summerizer import summarize_text
+from app.services.batch_summarizer import summarize_notes
+from app.services.chunked_summarizer import reduce_prompt
+from app.services.gemini_summerizer import (
+    GeminiClient, SUMMARY_ERRORS, SUMMARY_PROMPT, get_gemini_client, summary_error_message, summary_http_error,
+)
+from app.services.summary_cache import SummaryCache, get_summary_cache, release_connection, summary_key
 
 
 router = APIRouter(prefix="/summarizer", tags=["AI Summarizer"])
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def close_stream_session(db: AsyncSession):
+    # The stream outlives the request-scoped dependency; release the connection explicitly.
+    # A client disconnect cancels the stream, so shield the close from that cancellation.
+    with anyio.CancelScope(shield=True):
+        await db.close()
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/batch")
+async def summarize_batch(batch: schemas.SummaryBatchRequest, db: AsyncSession = Depends(get_db),
+                          client: GeminiClient = Depends(get_gemini_client),
+                          cache: SummaryCache = Depends(get_summary_cache)):
+    async def ndjson():
+        try:
+            async for result in summarize_notes(db, client, cache, batch.note_ids):
+                yield json.dumps(result) + "\n"
+        finally:
+            await close_stream_session(db)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 
 @router.post("/{note_id}")
-async def get_note_summary(note_id: int, db: AsyncSession = Depends(get_db)):
+async def get_note_summary(note_id: int, db: AsyncSession = Depends(get_db),
+                           client: GeminiClient = Depends(get_gemini_client),
+                           cache: SummaryCache = Depends(get_summary_cache)):
     note = await db.get(Note, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    summary = summarize_text(note.content)
-    return {"note_id": note_id, "summary": summary}
+    try:
+        summary, cached = await cache.summarize(db, client, note.content)
+    except SUMMARY_ERRORS as e:
+        raise summary_http_error(e)
+    return {"note_id": note_id, "summary": summary, "cached": cached}
+
+
+@router.post("/{note_id}/stream")
+async def stream_note_summary(note_id: int, db: AsyncSession = Depends(get_db),
+                              client: GeminiClient = Depends(get_gemini_client),
+                              cache: SummaryCache = Depends(get_summary_cache)):
+    """Relay the summary as server-sent events while Gemini generates it.
+
+    ``chunk`` events carry partial text and a final ``done`` event the whole
+    summary, or an ``error`` event the failure. A client that disconnects
+    cancels the upstream call; only completed summaries are cached.
+    """
+    note = await db.get(Note, note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    key = summary_key(note.content, client.model)
+    cached = await cache.get(db, key)
+
+    async def events():
+        try:
+            if cached is not None:
+                yield sse_event("chunk", {"text": cached})
+                yield sse_event("done", {"note_id": note_id, "summary": cached, "cached": True})
+                return
+
+            parts = []
+            try:
+                # Long notes stream the reduce step once their chunks are summarized.
+                partials = await cache.chunk_summaries(db, client, note.content)
+                prompt = reduce_prompt(partials) if partials else SUMMARY_PROMPT + note.content
+                await release_connection(db)
+                async for text in client.stream(prompt):
+                    parts.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except SUMMARY_ERRORS as e:
+                yield sse_event("error", {"note_id": note_id, "error": summary_error_message(e)})
+                return
+
+            summary = "".join(parts).strip()
+            await cache.put(db, key, client.model, summary)
+            yield sse_event("done", {"note_id": note_id, "summary": summary, "cached": False})
+        finally:
+            await close_stream_session(db)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Request, Response
+from app.database import pool_stats
+from app.services.metrics import CONTENT_TYPE, Family, family, render
+
+
+router = APIRouter(prefix="/system", tags=["System"])
+metrics_router = APIRouter(tags=["System"])
+
+POOL_GAUGES = {
+    "size": "Connections the pool keeps open.",
+    "checked_out": "Connections in use.",
+    "saturation": "Connections in use over pool size plus overflow.",
+}
+POOL_COUNTERS = {
+    "checkouts": ("db_pool_checkouts_total", "Connections handed out by the pool."),
+    "timeouts": ("db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection."),
+    "wait_seconds_total": ("db_pool_checkout_wait_seconds_total", "Time spent waiting for a connection."),
+}
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Connection pool usage of the primary database and, if configured, the read replica."""
+    return pool_stats()
+
+
+def app_state_families(state) -> list[Family]:
+    families = []
+    analytics_cache = getattr(state, "analytics_cache", None)
+    if analytics_cache is not None:
+        stats = analytics_cache.stats()
+        families.append(family("analytics_cache_lookups_total", "counter", "Analytics cache lookups by result.", {
+            (("result", result),): stats[key] for result, key in
+            (("hit", "hits"), ("miss", "misses"), ("coalesced", "coalesced"))
+        }))
+        families.append(family("analytics_cache_hit_ratio", "gauge", "Analytics lookups served without computing.",
+                               {(): stats["hit_ratio"]}))
+    response_cache = getattr(state, "response_cache", None)
+    if hasattr(response_cache, "hits"):
+        families.append(family("response_cache_lookups_total", "counter", "Response cache lookups by result.", {
+            (("result", "hit"),): response_cache.hits, (("result", "miss"),): response_cache.misses,
+        }))
+    gemini_client = getattr(state, "gemini_client", None)
+    if gemini_client is not None:
+        breaker, limiter = gemini_client.breaker, gemini_client.limiter
+        families.append(family("gemini_circuit_state", "gauge", "1 for the Gemini circuit breaker's current state.", {
+            (("state", name),): float(breaker.state == name)
+            for name in (breaker.CLOSED, breaker.HALF_OPEN, breaker.OPEN)
+        }))
+        families.append(family("gemini_concurrency_limit", "gauge", "Adaptive limit on concurrent Gemini calls.",
+                               {(): limiter.limit}))
+        families.append(family("gemini_calls_in_flight", "gauge", "Gemini calls holding a slot.",
+                               {(): limiter.in_flight}))
+    pools = {name: stats for name, stats in pool_stats().items() if "checkouts" in stats}
+    for key, documentation in POOL_GAUGES.items():
+        families.append(family(f"db_pool_{key}", "gauge", documentation,
+                               {(("engine", name),): stats[key] for name, stats in pools.items()}))
+    for key, (name, documentation) in POOL_COUNTERS.items():
+        families.append(family(name, "counter", documentation,
+                               {(("engine", engine),): stats[key] for engine, stats in pools.items()}))
+    return families
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    return Response(render(app_state_families(request.app.state)), media_type=CONTENT_TYPE)
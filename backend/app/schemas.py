@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict, constr
+from pydantic import BaseModel, ConfigDict, Field, constr
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Literal, Optional
 
 
 class NoteBase(BaseModel):
@@ -17,17 +17,80 @@ class NoteUpdate(BaseModel):
     content: Optional[constr(min_length=1, max_length=10000)] = None
 
 
-class NoteVersionResponse(BaseModel):
+class NoteVersionMetadata(BaseModel):
     id: int
-    content: str
     created_at: datetime
+    content_length: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class NoteVersionResponse(NoteVersionMetadata):
+    content: str
+
+
 class NoteResponse(NoteBase):
     id: int
     created_at: datetime
-    versions: List[NoteVersionResponse] = []
+    updated_at: Optional[datetime] = None
+    revision: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteListItem(BaseModel):
+    id: int
+    title: str
+    preview: str
+    created_at: datetime
+    versions: Optional[List[NoteVersionResponse]] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    score: float
+
+
+class SimilarNote(BaseModel):
+    id: int
+    title: str
+    score: float
+
+
+class SummaryBatchRequest(BaseModel):
+    note_ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class JobCreate(BaseModel):
+    kind: Literal["summarize", "analytics"]
+    params: dict[str, Any] = {}
+    priority: int = 0
+
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    params: dict[str, Any]
+    priority: int
+    status: str
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[BulkImportError]
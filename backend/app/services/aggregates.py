@@ -0,0 +1,227 @@
+import logging
+from collections import Counter
+from typing import Optional
+from sqlalchemy import delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.database import dialect_insert
+from app.models import CorpusStats, Note, NoteLengthBucket, TermFrequency
+from app.services.ngrams import NGRAM_SIZES, NgramCounter, count_terms, count_words, scan_notes
+
+
+logger = logging.getLogger(__name__)
+
+CORPUS_STATS_ID = 1
+REBUILD_BATCH_SIZE = 1000
+REBUILD_MAX_PENDING_TERMS = 500_000
+
+
+async def _increment(db: AsyncSession, model, keys: list[str], columns: list[str], rows: list[dict],
+                     returning=None) -> list:
+    """Upsert ``rows``, adding their ``columns`` to existing values.
+
+    With ``returning``, the new values of that column are returned.
+    """
+    if not rows:
+        return []
+    stmt = dialect_insert(db)(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in columns},
+    )
+    if returning is None:
+        await db.execute(stmt, rows)
+        return []
+    result = await db.execute(stmt.returning(returning), rows)
+    return result.scalars().all()
+
+
+async def apply_note_delta(db: AsyncSession, old_content: Optional[str], new_content: Optional[str]):
+    """Fold one note write into the aggregates without committing.
+
+    ``old_content`` is None for inserts and ``new_content`` is None for deletes,
+    so the caller's commit makes the note and its aggregates visible together.
+    Every call also bumps the corpus version, including writes that leave the
+    content unchanged.
+    """
+    old_content = old_content or ""
+    new_content = new_content or ""
+    note_delta = bool(new_content) - bool(old_content)
+
+    await _increment(db, CorpusStats, ["id"], ["note_count", "char_count", "word_count", "version"], [{
+        "id": CORPUS_STATS_ID,
+        "note_count": note_delta,
+        "char_count": len(new_content) - len(old_content),
+        "word_count": count_words(new_content) - count_words(old_content),
+        "version": 1,
+    }])
+    if old_content == new_content:
+        return
+
+    lengths = Counter()
+    if old_content:
+        lengths[len(old_content)] -= 1
+    if new_content:
+        lengths[len(new_content)] += 1
+    # Rows are upserted in key order so concurrent writers lock them in the same order.
+    # Only writes replacing old content decrement. Their upserts return the new
+    # counts, so emptied rows are swept only when a decrement reached zero.
+    note_counts = await _increment(db, NoteLengthBucket, ["content_length"], ["note_count"], [
+        {"content_length": length, "note_count": count}
+        for length, count in sorted(lengths.items()) if count
+    ], returning=NoteLengthBucket.note_count if old_content else None)
+
+    terms = count_terms(new_content)
+    terms.subtract(count_terms(old_content))
+    frequencies = await _increment(db, TermFrequency, ["n", "term"], ["frequency"], [
+        {"n": n, "term": term, "frequency": count}
+        for (n, term), count in sorted(terms.items()) if count
+    ], returning=TermFrequency.frequency if old_content else None)
+
+    if any(count <= 0 for count in note_counts):
+        await db.execute(delete(NoteLengthBucket).where(NoteLengthBucket.note_count <= 0))
+    if any(frequency <= 0 for frequency in frequencies):
+        await db.execute(
+            delete(TermFrequency)
+            .where(TermFrequency.n.in_(NGRAM_SIZES), TermFrequency.frequency <= 0)
+        )
+
+
+async def apply_notes_added(db: AsyncSession, contents: list[str]):
+    """Fold a batch of new notes into the aggregates with one upsert per table."""
+    counter = NgramCounter()
+    for content in contents:
+        counter.add_text(content)
+
+    await _increment(db, CorpusStats, ["id"], ["note_count", "char_count", "word_count", "version"], [{
+        "id": CORPUS_STATS_ID,
+        "note_count": len(contents),
+        "char_count": sum(len(content) for content in contents),
+        "word_count": counter.word_count,
+        "version": 1,
+    }])
+    await _increment(db, NoteLengthBucket, ["content_length"], ["note_count"], [
+        {"content_length": length, "note_count": count}
+        for length, count in sorted(Counter(len(content) for content in contents).items())
+    ])
+    await _increment(db, TermFrequency, ["n", "term"], ["frequency"], [
+        {"n": n, "term": term, "frequency": count}
+        for n, term, count in sorted(counter.terms())
+    ])
+
+
+async def get_corpus_stats(db: AsyncSession) -> dict:
+    result = await db.execute(
+        select(CorpusStats.note_count, CorpusStats.char_count, CorpusStats.word_count)
+        .where(CorpusStats.id == CORPUS_STATS_ID)
+    )
+    row = result.first()
+    if not row:
+        return {"note_count": 0, "char_count": 0, "word_count": 0}
+    return dict(row._mapping)
+
+
+async def get_corpus_version(db: AsyncSession) -> int:
+    result = await db.execute(select(CorpusStats.version).where(CorpusStats.id == CORPUS_STATS_ID))
+    return result.scalar() or 0
+
+
+async def get_median_length(db: AsyncSession, note_count: int) -> float:
+    if not note_count:
+        return 0
+
+    # The histogram has at most one row per distinct length (bounded by the
+    # content limit), so walking it stays cheap regardless of the note count.
+    cumulative = select(
+        NoteLengthBucket.content_length,
+        func.sum(NoteLengthBucket.note_count).over(order_by=NoteLengthBucket.content_length).label("cumulative"),
+    ).subquery()
+
+    async def length_at(position: int) -> int:
+        result = await db.execute(
+            select(cumulative.c.content_length)
+            .where(cumulative.c.cumulative > position)
+            .order_by(cumulative.c.content_length)
+            .limit(1)
+        )
+        return result.scalar()
+
+    lower = await length_at((note_count - 1) // 2)
+    if note_count % 2:
+        return lower
+    return (lower + await length_at(note_count // 2)) / 2
+
+
+async def get_top_terms(db: AsyncSession, n: int, top_n: int) -> list[str]:
+    result = await db.execute(
+        select(TermFrequency.term)
+        .where(TermFrequency.n == n)
+        .order_by(TermFrequency.frequency.desc(), TermFrequency.term)
+        .limit(top_n)
+    )
+    return list(result.scalars().all())
+
+
+async def _insert_batches(db: AsyncSession, model, rows: list[dict]):
+    for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+        await db.execute(model.__table__.insert(), rows[start:start + REBUILD_BATCH_SIZE])
+
+
+async def rebuild(db: AsyncSession, workers: int = 0):
+    """Recompute every aggregate from the notes table and commit the result.
+
+    N-gram counts are flushed into term_frequencies whenever the in-memory
+    counters exceed REBUILD_MAX_PENDING_TERMS, so memory stays bounded.
+    """
+    version = await get_corpus_version(db)
+    await db.execute(delete(CorpusStats))
+    await db.execute(delete(NoteLengthBucket))
+    await db.execute(delete(TermFrequency))
+
+    length = Note.char_count
+    lengths = await db.execute(select(length, func.count()).group_by(length))
+    await _insert_batches(db, NoteLengthBucket, [
+        {"content_length": content_length, "note_count": count} for content_length, count in lengths.all()
+    ])
+    char_count = (await db.execute(select(func.sum(length)))).scalar() or 0
+
+    counter = NgramCounter()
+
+    async def flush_terms(force: bool = False):
+        if not force and counter.pending_terms() < REBUILD_MAX_PENDING_TERMS:
+            return
+        await _increment(db, TermFrequency, ["n", "term"], ["frequency"], [
+            {"n": n, "term": term, "frequency": count} for n, term, count in counter.terms()
+        ])
+        counter.clear_terms()
+
+    await scan_notes(db, counter, batch_size=REBUILD_BATCH_SIZE, workers=workers, on_batch=flush_terms)
+    await flush_terms(force=True)
+
+    await db.execute(CorpusStats.__table__.insert().values(
+        id=CORPUS_STATS_ID,
+        version=version + 1,
+        note_count=counter.note_count,
+        char_count=char_count,
+        word_count=counter.word_count,
+    ))
+    await db.commit()
+    logger.info(f"Analytics aggregates rebuilt for {counter.note_count} notes")
+
+
+async def ensure_built(db: AsyncSession):
+    """Rebuild the aggregates if they were never built.
+
+    The migration creating the tables leaves them empty, and the first write
+    creates the corpus_stats row. Without that row, existing notes have not
+    been counted yet.
+    """
+    if await db.scalar(select(CorpusStats.id).where(CorpusStats.id == CORPUS_STATS_ID)) is not None:
+        return
+    try:
+        await rebuild(db)
+    except IntegrityError:
+        # Another API process built them first.
+        await db.rollback()
+        logger.info("Analytics aggregates were built by another process")
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+from fastapi import Request
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsCache:
+    """Process-wide cache of analytics results keyed by corpus version.
+
+    A value is only served for the exact version it was computed at, so any
+    note write (which bumps the version) invalidates it. Concurrent misses for
+    the same key and version share a single computation.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[int, Any]] = {}
+        self._in_flight: dict[tuple[str, int], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.computations = 0
+        self.compute_seconds = 0.0
+
+    async def get_or_compute(self, key: str, version: int, compute: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+
+            flight = self._in_flight.get((key, version))
+            if not flight:
+                break
+            try:
+                value = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if flight.cancelled():
+                    # The computing request went away; retry and compute it ourselves.
+                    continue
+                raise
+            self.coalesced += 1
+            return value
+
+        self.misses += 1
+        flight = asyncio.get_running_loop().create_future()
+        self._in_flight[(key, version)] = flight
+        started = time.perf_counter()
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unawaited flight does not log a warning.
+            flight.exception()
+            raise
+        finally:
+            del self._in_flight[(key, version)]
+            self.computations += 1
+            self.compute_seconds += time.perf_counter() - started
+
+        current = self._entries.get(key)
+        if not current or current[0] <= version:
+            self._entries[key] = (version, value)
+        flight.set_result(value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "computations": self.computations,
+            "compute_seconds_total": self.compute_seconds,
+            "compute_seconds_avg": self.compute_seconds / self.computations if self.computations else 0.0,
+        }
+
+
+def get_analytics_cache(request: Request) -> AnalyticsCache:
+    return request.app.state.analytics_cache
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict, deque
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.config import SUMMARY_BATCH_CHAR_BUDGET, SUMMARY_BATCH_MAX_NOTES, SUMMARY_BATCH_CONCURRENCY, SUMMARY_CHUNK_CHARS
+from app.models import Note
+from app.services.gemini_summerizer import GeminiAPIError, GeminiClient, SUMMARY_ERRORS, summary_error_message
+from app.services.summary_cache import SummaryCache, summary_key
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROMPT = (
+    "Summarize each of the following {count} texts separately. For every text provide a concise, "
+    "yet complete summary that captures all key details. Avoid adding opinions or extra commentary. "
+    "Respond only with a JSON array of exactly {count} strings, one summary per text, in the same order.\n\n"
+)
+
+# A group is a list of (content_hash, content) pairs summarized by one model call.
+Group = list[tuple[str, str]]
+
+
+def pack_groups(items: list[tuple[str, str]], char_budget: int = SUMMARY_BATCH_CHAR_BUDGET,
+                max_notes: int = SUMMARY_BATCH_MAX_NOTES) -> list[Group]:
+    groups, current, current_size = [], [], 0
+    for key, content in sorted(items, key=lambda item: len(item[1])):
+        if len(content) > char_budget // 2:
+            groups.append([(key, content)])
+            continue
+        if current and (current_size + len(content) > char_budget or len(current) >= max_notes):
+            groups.append(current)
+            current, current_size = [], 0
+        current.append((key, content))
+        current_size += len(content)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_batch_prompt(group: Group) -> str:
+    texts = "\n\n".join(f"### Text {i}\n{content}" for i, (_, content) in enumerate(group, start=1))
+    return BATCH_PROMPT.format(count=len(group)) + texts
+
+
+def parse_batch_response(text: str, count: int) -> list[str]:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        summaries = json.loads(text)
+    except ValueError:
+        raise GeminiAPIError(f"Batch response is not JSON: {text[:200]}")
+    if (not isinstance(summaries, list) or len(summaries) != count
+            or not all(isinstance(summary, str) and summary.strip() for summary in summaries)):
+        raise GeminiAPIError(f"Batch response does not hold {count} summaries")
+    return [summary.strip() for summary in summaries]
+
+
+async def summarize_group(client: GeminiClient, group: Group) -> list[tuple[str, str]]:
+    if len(group) == 1:
+        key, content = group[0]
+        return [(key, await client.summarize(content))]
+
+    response = await client.generate(build_batch_prompt(group))
+    return list(zip((key for key, _ in group), parse_batch_response(response, len(group))))
+
+
+async def summarize_notes(db: AsyncSession, client: GeminiClient, cache: SummaryCache, note_ids: list[int],
+                          concurrency: int = SUMMARY_BATCH_CONCURRENCY) -> AsyncIterator[dict]:
+    """Yield one result per requested note as soon as its summary is known.
+
+    Notes are loaded in one query and deduplicated by content hash; cached
+    summaries are looked up together and come first. The rest is packed into multi-note prompts where the
+    character budget allows, and at most ``concurrency`` model calls run at a
+    time so queued calls do not burn their deadline waiting for a slot. Packed
+    summaries are cached under the single-note key so later requests reuse them.
+    Notes too long for one prompt are map-reduced over their chunks last.
+    """
+    note_ids = list(dict.fromkeys(note_ids))
+    result = await db.execute(select(Note.id, Note.content).where(Note.id.in_(note_ids)))
+    contents = dict(result.all())
+
+    note_ids_by_key = defaultdict(list)
+    content_by_key = {}
+    for note_id in note_ids:
+        if note_id not in contents:
+            yield {"note_id": note_id, "error": "Note not found"}
+            continue
+        key = summary_key(contents[note_id], client.model)
+        note_ids_by_key[key].append(note_id)
+        content_by_key[key] = contents[note_id]
+
+    uncached, long = [], []
+    cached = await cache.get_many(db, list(content_by_key))
+    for key, content in content_by_key.items():
+        summary = cached.get(key)
+        if summary is None:
+            (long if len(content) > SUMMARY_CHUNK_CHARS else uncached).append((key, content))
+            continue
+        for note_id in note_ids_by_key[key]:
+            yield {"note_id": note_id, "summary": summary, "cached": True}
+
+    queue = deque(pack_groups(uncached))
+    running: dict[asyncio.Task, Group] = {}
+    try:
+        while queue or running:
+            while queue and len(running) < concurrency:
+                group = queue.popleft()
+                running[asyncio.create_task(summarize_group(client, group))] = group
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                group = running.pop(task)
+                try:
+                    summaries = task.result()
+                except SUMMARY_ERRORS as e:
+                    if isinstance(e, GeminiAPIError) and len(group) > 1:
+                        logger.warning(f"Packed summary of {len(group)} notes failed ({e}), summarizing separately")
+                        queue.extend([entry] for entry in group)
+                        continue
+                    error = summary_error_message(e)
+                    for key, _ in group:
+                        for note_id in note_ids_by_key[key]:
+                            yield {"note_id": note_id, "error": error}
+                    continue
+
+                for key, summary in summaries:
+                    await cache.put(db, key, client.model, summary)
+                    for note_id in note_ids_by_key[key]:
+                        yield {"note_id": note_id, "summary": summary, "cached": False}
+
+        # Chunked notes cache their chunks through the session, so they run here, one at a time,
+        # rather than as tasks beside the generator's own use of it.
+        for key, content in long:
+            try:
+                summary = await cache.generate(db, client, content)
+            except SUMMARY_ERRORS as e:
+                error = summary_error_message(e)
+                for note_id in note_ids_by_key[key]:
+                    yield {"note_id": note_id, "error": error}
+                continue
+            await cache.put(db, key, client.model, summary)
+            for note_id in note_ids_by_key[key]:
+                yield {"note_id": note_id, "summary": summary, "cached": False}
+    finally:
+        # The client went away or the stream failed: stop paying for calls nobody reads.
+        for task in running:
+            task.cancel()
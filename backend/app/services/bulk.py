@@ -0,0 +1,141 @@
+import csv
+import orjson
+from typing import AsyncIterator, Sequence
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app import crud
+from app.models import Note, NoteVersion
+from app.schemas import NoteCreate
+from app.services import history
+
+
+BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def read_ndjson(lines: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, orjson.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+
+async def read_csv(lines: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """Yield CSV records as dicts keyed by the header row.
+
+    Quoted fields may span lines: physical lines are joined until the quotes
+    balance. Records are numbered by their first line.
+    """
+    header, record, first_line, line_number = None, [], 0, 0
+    async for line in lines:
+        line_number += 1
+        try:
+            text = line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError as e:
+            yield line_number, ValueError(f"Invalid UTF-8: {e}")
+            continue
+        if not record:
+            first_line = line_number
+        record.append(text)
+        if sum(part.count('"') for part in record) % 2:
+            continue
+
+        text, record = "\n".join(record).rstrip("\r"), []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+        elif len(values) != len(header):
+            yield first_line, ValueError(f"Expected {len(header)} fields, got {len(values)}")
+        else:
+            yield first_line, dict(zip(header, values))
+    if record:
+        yield first_line, ValueError("Unterminated quoted field")
+
+
+def error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+async def import_notes(db: AsyncSession, chunks: AsyncIterator[bytes], body_format: str = "ndjson",
+                       indexes: Sequence = (), cache=None, batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """Validate and insert notes from a streamed NDJSON or CSV body.
+
+    Valid rows are inserted ``batch_size`` at a time, one commit per batch.
+    Invalid rows are counted and reported by line number, and the import
+    continues. Only the first ``MAX_REPORTED_ERRORS`` errors are listed.
+    """
+    records = read_csv(read_lines(chunks)) if body_format == "csv" else read_ndjson(read_lines(chunks))
+    inserted, failed, errors, batch = 0, 0, [], []
+    async for line_number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(NoteCreate.model_validate(record))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "error": error_message(e)})
+            continue
+        if len(batch) >= batch_size:
+            inserted += len(await crud.create_notes(db, batch, indexes, cache))
+            batch = []
+    if batch:
+        inserted += len(await crud.create_notes(db, batch, indexes, cache))
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+
+async def export_notes(db: AsyncSession, include_versions: bool = False,
+                       batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Yield every note as one NDJSON line, reading through a server-side cursor."""
+    result = await db.stream(
+        select(Note.id, Note.title, Note.content, Note.created_at)
+        .order_by(Note.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for notes in result.partitions():
+        versions_by_note = {}
+        if include_versions:
+            versions = await db.execute(
+                select(NoteVersion)
+                .where(NoteVersion.note_id.in_([note.id for note in notes]))
+                .order_by(NoteVersion.created_at.desc(), NoteVersion.id.desc())
+            )
+            for version in versions.scalars():
+                versions_by_note.setdefault(version.note_id, []).append(version)
+            # Versions are only needed for this line; keep the identity map small.
+            db.expunge_all()
+
+        lines = []
+        for note in notes:
+            line = {"id": note.id, "title": note.title, "content": note.content, "created_at": note.created_at}
+            if include_versions:
+                versions = versions_by_note.get(note.id, [])
+                history.load_contents(note.content, versions)
+                line["versions"] = [
+                    {"id": version.id, "content": version.content, "created_at": version.created_at}
+                    for version in versions
+                ]
+            lines.append(orjson.dumps(line))
+        yield b"\n".join(lines) + b"\n"
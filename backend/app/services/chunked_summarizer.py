@@ -0,0 +1,128 @@
+"""Map-reduce summaries of notes too long for one prompt.
+
+Long content is split into chunks on paragraph and sentence boundaries. The
+chunks are summarized concurrently (map) and the partial summaries combined
+into one summary (reduce), so the latency of a long note is roughly that of
+its slowest chunk plus the reduce call rather than growing with its length.
+
+Chunk boundaries depend only on nearby text: a chunk ends at a paragraph end,
+or at a sentence picked by its hash, once it holds at least half the chunk
+size. An edit therefore changes the chunks around it and leaves the rest, with
+their cached summaries, as they were.
+"""
+import asyncio
+import logging
+import re
+import zlib
+from functools import lru_cache
+from typing import Iterator, Optional
+from app.config import SUMMARY_CHUNK_CHARS, SUMMARY_CHUNK_CONCURRENCY
+from app.services.gemini_summerizer import GeminiClient, SUMMARY_ERRORS
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_PROMPT = (
+    "The following text is one part of a longer document. Provide a concise, yet complete summary "
+    "of this part that captures all key details. Avoid adding opinions or extra commentary. "
+    "Respond only with the summary:\n\n"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of one document, in order. Combine them into "
+    "a single concise, yet complete summary of the whole document that captures all key details. "
+    "Avoid adding opinions or extra commentary. Respond only with the summary:\n\n"
+)
+# On average one sentence in this many may end a chunk that is at least half full.
+SENTENCE_CUT_EVERY = 4
+
+PARAGRAPHS = re.compile(r".+?(?:\n[ \t]*\n\s*|\Z)", re.S)
+SENTENCES = re.compile(r".+?(?:[.!?]+[\"')\]]*\s+|\Z)", re.S)
+
+
+@lru_cache(maxsize=1)
+def _punkt():
+    # Imported here: nltk is slow to import and only long notes need it.
+    from nltk.tokenize.punkt import PunktTokenizer
+    try:
+        return PunktTokenizer("english")
+    except LookupError:
+        logger.warning("nltk punkt_tab data is not installed; splitting sentences on punctuation")
+        return None
+
+
+def sentence_spans(paragraph: str) -> list[tuple[int, int]]:
+    tokenizer = _punkt()
+    if tokenizer is not None:
+        starts = [start for start, _ in tokenizer.span_tokenize(paragraph)]
+    else:
+        starts = [match.start() for match in SENTENCES.finditer(paragraph) if match.group()]
+    # Each sentence keeps the whitespace up to the next one; the first also keeps leading whitespace.
+    starts = [0] + starts[1:]
+    return list(zip(starts, starts[1:] + [len(paragraph)]))
+
+
+def _units(text: str, max_chars: int) -> Iterator[tuple[str, bool]]:
+    """Yield ``(piece, ends_paragraph)`` pieces of at most ``max_chars`` characters."""
+    for match in PARAGRAPHS.finditer(text):
+        paragraph = match.group()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph, True
+            continue
+        spans = sentence_spans(paragraph)
+        for i, (start, end) in enumerate(spans):
+            last = i == len(spans) - 1
+            for offset in range(start, end, max_chars):
+                yield paragraph[offset:min(offset + max_chars, end)], last and offset + max_chars >= end
+
+
+def split_chunks(text: str, max_chars: int = SUMMARY_CHUNK_CHARS) -> list[str]:
+    if len(text) <= max_chars:
+        return [text]
+
+    min_chars = max_chars // 2
+    chunks, current, size = [], [], 0
+    for unit, ends_paragraph in _units(text, max_chars):
+        if current and size + len(unit) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit)
+        if size >= min_chars and (ends_paragraph or zlib.crc32(unit.encode()) % SENTENCE_CUT_EVERY == 0):
+            chunks.append("".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("".join(current))
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+async def map_chunks(client: GeminiClient, chunks: dict[str, str],
+                     concurrency: int = SUMMARY_CHUNK_CONCURRENCY) -> tuple[dict[str, str], Optional[Exception]]:
+    """Summarize ``{key: chunk}`` concurrently; return the summaries that succeeded and the first error.
+
+    At most ``concurrency`` calls run at a time so queued chunks do not burn
+    their deadline waiting for a client slot. Successful summaries are returned
+    even when another chunk fails, so a retry only repeats the failed chunks.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(chunk: str) -> str:
+        async with semaphore:
+            return await client.generate(CHUNK_PROMPT + chunk)
+
+    results = await asyncio.gather(*(summarize(chunk) for chunk in chunks.values()), return_exceptions=True)
+    summaries, error = {}, None
+    for key, result in zip(chunks, results):
+        if isinstance(result, SUMMARY_ERRORS):
+            error = error or result
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            summaries[key] = result
+    return summaries, error
+
+
+def reduce_prompt(summaries: list[str]) -> str:
+    parts = "\n\n".join(f"### Part {i}\n{summary}" for i, summary in enumerate(summaries, start=1))
+    return REDUCE_PROMPT + parts
@@ -0,0 +1,392 @@
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import shutil
+import zlib
+from collections import Counter
+from typing import Optional
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.config import EMBEDDING_BACKEND, EMBEDDING_DIMENSION, EMBEDDING_DIR, EMBEDDING_NPROBE
+from app.models import Note
+from app.services.ngrams import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 1000
+# Below this many vectors a brute-force scan is fast enough and always exact.
+IVF_MIN_SIZE = 20_000
+IVF_TRAIN_SAMPLES_PER_LIST = 40
+IVF_TRAIN_ITERATIONS = 10
+IVF_ASSIGN_CHUNK = 65_536
+
+
+class HashingEmbedder:
+    """Local, CPU-only embedding of unigrams and bigrams.
+
+    Features are signed-hashed straight into ``dimension`` buckets, which is a
+    sparse random projection of the bag of words: no vocabulary, no training
+    and no network. Counts are damped logarithmically and vectors normalized,
+    so a dot product is the cosine similarity.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION):
+        self.dimension = dimension
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = Counter(tokens)
+            features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+            if not features:
+                continue
+            buckets, weights = [], []
+            for feature, count in features.items():
+                hashed = zlib.crc32(feature.encode())
+                buckets.append(hashed % self.dimension)
+                weights.append((1 + math.log(count)) * (1 if hashed & 0x80000000 else -1))
+            np.add.at(vectors[row], buckets, weights)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+}
+
+
+def get_embedder(name: str = EMBEDDING_BACKEND, dimension: int = EMBEDDING_DIMENSION):
+    """Return a registered embedder, or one loaded from a ``module:attribute`` path.
+
+    An embedder has ``name`` and ``dimension`` attributes and an ``embed(texts)``
+    method returning L2-normalized float32 rows.
+    """
+    if name in EMBEDDERS:
+        return EMBEDDERS[name](dimension)
+    module_name, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)(dimension)
+
+
+class VectorStore:
+    """Fixed-width float32 rows in reusable slots.
+
+    With ``path`` set, the vectors, the slot owners (note ids, -1 when free) and
+    the slots' IVF list numbers live in memory-mapped files, so a restart only
+    has to embed notes written while the process was down.
+    """
+
+    COLUMNS = (("vectors", np.float32, 0), ("ids", np.int64, -1), ("lists", np.int32, -1))
+
+    def __init__(self, dimension: int, path: Optional[str] = None, capacity: int = 1024):
+        self.dimension = dimension
+        self.path = path
+        self.slots: dict[int, int] = {}
+        self.size = 0
+        self._free: list[int] = []
+        self.vectors = self.ids = self.lists = None
+
+        existing = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self._file("ids")):
+                existing = os.path.getsize(self._file("ids")) // np.dtype(np.int64).itemsize
+        self._resize(max(capacity, existing), existing)
+
+        used = np.flatnonzero(self.ids >= 0)
+        self.slots = {int(self.ids[slot]): int(slot) for slot in used}
+        self.size = int(used[-1]) + 1 if len(used) else 0
+        self._free = sorted(set(range(self.size)) - set(self.slots.values()), reverse=True)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _resize(self, capacity: int, existing: int):
+        for name, dtype, fill in self.COLUMNS:
+            shape = (capacity, self.dimension) if name == "vectors" else (capacity,)
+            if self.path is None:
+                array = np.full(shape, fill, dtype=dtype)
+                if existing:
+                    array[:existing] = getattr(self, name)[:existing]
+            else:
+                if getattr(self, name) is not None:
+                    getattr(self, name).flush()
+                with open(self._file(name), "ab") as file:
+                    file.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                array = np.memmap(self._file(name), dtype=dtype, mode="r+", shape=shape)
+                array[existing:] = fill
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def put(self, note_id: int, vector: np.ndarray) -> int:
+        slot = self.slots.get(note_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self.size == len(self.ids):
+                    self._resize(2 * len(self.ids), len(self.ids))
+                slot = self.size
+                self.size += 1
+            self.slots[note_id] = slot
+            self.ids[slot] = note_id
+        self.vectors[slot] = vector
+        return slot
+
+    def delete(self, note_id: int) -> Optional[int]:
+        slot = self.slots.pop(note_id, None)
+        if slot is not None:
+            self.ids[slot] = -1
+            self.lists[slot] = -1
+            self._free.append(slot)
+        return slot
+
+    def used_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.ids[:self.size] >= 0)
+
+    def flush(self):
+        if self.path is not None:
+            for name, _, _ in self.COLUMNS:
+                getattr(self, name).flush()
+
+
+class EmbeddingIndex:
+    """Embeddings of every note with an IVF approximate nearest-neighbour index.
+
+    Vectors are clustered with spherical k-means into about sqrt(n) lists; a
+    query scans only the ``nprobe`` lists whose centroids are closest. New
+    vectors join the nearest existing list, and the lists are retrained when
+    the corpus has grown fourfold since the last training. Training runs in a
+    worker thread off the request path; queries keep using the previous lists,
+    or an exact scan, until it finishes. Small corpora are scanned exactly. Like the in-process search index, it belongs to one
+    process: run a single API worker per ``EMBEDDING_DIR``.
+    """
+
+    def __init__(self, embedder=None, path: Optional[str] = EMBEDDING_DIR or None, nprobe: int = EMBEDDING_NPROBE):
+        self.embedder = embedder or get_embedder()
+        self.path = path
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._lists: list[set[int]] = []
+        self._list_arrays: list[Optional[np.ndarray]] = []
+        self._training: Optional[asyncio.Task] = None
+        # Slots written while a background training runs; they are reassigned when it lands.
+        self._written_during_training: Optional[set[int]] = None
+
+        settings = self._settings()
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            with open(os.path.join(path, "meta.json")) as file:
+                stored = json.load(file)
+            if {key: stored.get(key) for key in settings} != settings:
+                logger.info(f"Embedding settings changed from {stored}, discarding {path}")
+                shutil.rmtree(path)
+            elif "trained_size" in stored:
+                self.trained_size = stored["trained_size"]
+                self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.store = VectorStore(self.embedder.dimension, path)
+        if path:
+            self._save_meta()
+        if self.centroids is not None:
+            self._rebuild_lists()
+
+    def __len__(self):
+        return len(self.store)
+
+    def _settings(self) -> dict:
+        return {"embedder": self.embedder.name, "dimension": self.embedder.dimension}
+
+    def _save_meta(self):
+        meta = self._settings()
+        if self.centroids is not None:
+            meta["trained_size"] = self.trained_size
+            np.save(os.path.join(self.path, "centroids.npy"), self.centroids)
+        with open(os.path.join(self.path, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+    def _rebuild_lists(self):
+        self._lists = [set() for _ in range(len(self.centroids))]
+        self._list_arrays = [None] * len(self.centroids)
+        slots = self.store.used_slots()
+        for slot, list_id in zip(slots.tolist(), self.store.lists[slots].tolist()):
+            self._lists[list_id].add(slot)
+
+    def _assign(self, slots: np.ndarray):
+        for start in range(0, len(slots), IVF_ASSIGN_CHUNK):
+            chunk = slots[start:start + IVF_ASSIGN_CHUNK]
+            self.store.lists[chunk] = np.argmax(self.store.vectors[chunk] @ self.centroids.T, axis=1)
+
+    @staticmethod
+    def _fit(vectors: np.ndarray, slots: np.ndarray, seed: int) -> tuple[np.ndarray, np.ndarray]:
+        """Spherical k-means over a sample of ``slots``; return the centroids and every slot's list."""
+        list_count = max(1, int(math.sqrt(len(slots))))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(slots, min(len(slots), list_count * IVF_TRAIN_SAMPLES_PER_LIST), replace=False)]
+        centroids = sample[rng.choice(len(sample), list_count, replace=False)]
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid.
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        centroids = centroids.astype(np.float32)
+        lists = np.empty(len(slots), dtype=np.int32)
+        for start in range(0, len(slots), IVF_ASSIGN_CHUNK):
+            chunk = slots[start:start + IVF_ASSIGN_CHUNK]
+            lists[start:start + IVF_ASSIGN_CHUNK] = np.argmax(vectors[chunk] @ centroids.T, axis=1)
+        return centroids, lists
+
+    def _apply_training(self, centroids: np.ndarray, lists: np.ndarray, slots: np.ndarray):
+        self.centroids = centroids
+        self.trained_size = len(slots)
+        self.store.lists[slots] = lists
+        written, self._written_during_training = self._written_during_training or set(), None
+        used = self.store.ids[:self.store.size] >= 0
+        current = np.array(sorted(slot for slot in written if slot < self.store.size and used[slot]), dtype=np.int64)
+        if len(current):
+            self._assign(current)
+        # Slots freed during training are skipped: the lists are rebuilt from used slots only.
+        self._rebuild_lists()
+        if self.path:
+            self.store.flush()
+            self._save_meta()
+        logger.info(f"Trained {len(centroids)} IVF lists over {len(slots)} note embeddings")
+
+    def train(self, seed: int = 0):
+        slots = self.store.used_slots()
+        self._apply_training(*self._fit(self.store.vectors, slots, seed), slots)
+
+    def _snapshot(self) -> tuple[np.ndarray, np.ndarray]:
+        # Slots written from here on are reassigned once the new lists land. The
+        # current arrays are kept: a resize during training swaps in new ones.
+        self._written_during_training = set()
+        return self.store.vectors, self.store.used_slots()
+
+    async def _train_in_background(self, vectors: np.ndarray, slots: np.ndarray, seed: int = 0):
+        """Fit in a worker thread while the event loop keeps serving from the current lists."""
+        try:
+            centroids, lists = await asyncio.get_running_loop().run_in_executor(None, self._fit, vectors, slots, seed)
+        except BaseException:
+            self._written_during_training = None
+            raise
+        self._apply_training(centroids, lists, slots)
+
+    def _needs_training(self) -> bool:
+        size = len(self.store)
+        return size >= IVF_MIN_SIZE and (self.centroids is None or size >= 4 * self.trained_size)
+
+    def _schedule_training(self):
+        if self._training is not None or not self._needs_training():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts, benchmarks): nothing to keep responsive.
+            self.train()
+            return
+        self._training = loop.create_task(self._run_training(*self._snapshot()))
+
+    async def _run_training(self, vectors: np.ndarray, slots: np.ndarray):
+        try:
+            await self._train_in_background(vectors, slots)
+        except Exception as e:
+            logger.error(f"IVF training failed: {e}")
+        finally:
+            self._training = None
+
+    def add_vectors(self, note_ids: list[int], vectors: np.ndarray):
+        slots = np.array([self.store.put(note_id, vector) for note_id, vector in zip(note_ids, vectors)], dtype=np.int64)
+        if self._written_during_training is not None:
+            self._written_during_training.update(slots.tolist())
+        self._schedule_training()
+        if self.centroids is None or not len(slots):
+            return
+        for slot, list_id in zip(slots.tolist(), self.store.lists[slots].tolist()):
+            if list_id >= 0:
+                self._lists[list_id].discard(slot)
+                self._list_arrays[list_id] = None
+        self._assign(slots)
+        for slot, list_id in zip(slots.tolist(), self.store.lists[slots].tolist()):
+            self._lists[list_id].add(slot)
+            self._list_arrays[list_id] = None
+
+    def add(self, note_id: int, title: str, content: str):
+        self.add_vectors([note_id], self.embedder.embed([f"{title}\n{content}"]))
+
+    def remove(self, note_id: int):
+        slot = self.store.slots.get(note_id)
+        if slot is None:
+            return
+        list_id = int(self.store.lists[slot])
+        if list_id >= 0:
+            self._lists[list_id].discard(slot)
+            self._list_arrays[list_id] = None
+        self.store.delete(note_id)
+
+    def vector(self, note_id: int) -> Optional[np.ndarray]:
+        slot = self.store.slots.get(note_id)
+        return None if slot is None else np.array(self.store.vectors[slot])
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if self.centroids is None:
+            return self.store.used_slots()
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        arrays = []
+        for list_id in probe.tolist():
+            if self._list_arrays[list_id] is None:
+                self._list_arrays[list_id] = np.fromiter(self._lists[list_id], dtype=np.int64)
+            arrays.append(self._list_arrays[list_id])
+        return np.concatenate(arrays)
+
+    def search(self, query: np.ndarray, k: int, exclude: Optional[int] = None,
+               nprobe: Optional[int] = None) -> list[tuple[int, float]]:
+        candidates = self._candidates(query, nprobe or self.nprobe)
+        if not len(candidates):
+            return []
+        scores = self.store.vectors[candidates] @ query
+        top = min(k + 1, len(candidates))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        results = [(int(self.store.ids[candidates[i]]), float(scores[i])) for i in best]
+        return [(note_id, score) for note_id, score in results if note_id != exclude][:k]
+
+    def search_text(self, text: str, k: int) -> list[tuple[int, float]]:
+        return self.search(self.embedder.embed([text])[0], k)
+
+    async def sync(self, db: AsyncSession, batch_size: int = EMBED_BATCH_SIZE):
+        """Embed notes missing from the index and drop vectors of deleted notes.
+
+        Notes edited by another process while this one was down keep their old
+        vectors; ``python -m app.cli rebuild-embeddings`` re-embeds everything.
+        """
+        result = await db.stream(select(Note.id).execution_options(yield_per=batch_size))
+        note_ids = {note_id async for note_id in result.scalars()}
+        for note_id in set(self.store.slots) - note_ids:
+            self.remove(note_id)
+
+        missing = sorted(note_ids - set(self.store.slots))
+        for start in range(0, len(missing), batch_size):
+            result = await db.execute(
+                select(Note.id, Note.title, Note.content).where(Note.id.in_(missing[start:start + batch_size]))
+            )
+            rows = result.all()
+            self.add_vectors([row.id for row in rows], self.embedder.embed([f"{row.title}\n{row.content}" for row in rows]))
+        if missing:
+            logger.info(f"Embedded {len(missing)} notes")
+        # A training that started partway through the sync may leave the index due for another.
+        for _ in range(2):
+            self._schedule_training()
+            if self._training is not None:
+                await asyncio.shield(self._training)
+        self.store.flush()
@@ -1,12 +1,51 @@
-import requests
+import asyncio
+import httpx
+import json
 import logging
+import random
+import time
 from dataclasses import dataclass
-from typing import List, Optional, Dict
-from app.config import GENAI_API_KEY
+from typing import AsyncIterator, List, Optional, Dict
+from fastapi import HTTPException, Request, status
+from app.config import (
+    ConfigError,
+    GENAI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_BREAKER_FAILURES,
+    GEMINI_BREAKER_RESET_TIMEOUT,
+    GEMINI_LATENCY_TARGET,
+    GEMINI_MIN_CONCURRENCY,
+    GEMINI_MODEL,
+    GEMINI_TIMEOUT,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_DELAY,
+    require_settings,
+)
+from app.services.metrics import Counter, Histogram
+from app.services.resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError
 
 
 logger = logging.getLogger(__name__)
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+
+SUMMARY_PROMPT = (
+    "Read the following text and provide a concise, yet complete summary "
+    "that captures all key details. Avoid adding opinions or extra commentary. "
+    "Respond only with the summary:\n\n"
+)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 8.0
+
+GEMINI_CALL_DURATION = Histogram(
+    "gemini_call_duration_seconds", "Gemini calls, including the wait for a slot and retries, by outcome.",
+    ("outcome",), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+GEMINI_STREAM_FIRST_CHUNK = Histogram(
+    "gemini_stream_first_chunk_seconds", "Time from starting a streamed Gemini call to its first text.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+GEMINI_ATTEMPTS = Counter("gemini_attempts_total", "Gemini HTTP attempts by response status.", ("status",))
+GEMINI_REJECTED = Counter("gemini_calls_rejected_total", "Gemini calls failed fast by the open circuit breaker.")
 
 
 @dataclass
@@ -26,6 +65,14 @@ class GeminiResponse:
         summary_text = content_parts[0].get("text", "").strip()
         return GeminiResponse(summary_text) if summary_text else None
 
+    @staticmethod
+    def chunk_text(response: Dict) -> str:
+        """Text of one streamed response chunk, unstripped so chunks join back up."""
+        candidates: List[Dict] = response.get("candidates", [])
+        if not candidates:
+            return ""
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
 
 class GeminiAPIError(Exception):
     def __init__(self, message: str, status_code: Optional[int] = None):
@@ -33,22 +80,134 @@ class GeminiAPIError(Exception):
         self.status_code = status_code
 
 
-def summarize_text(text: str) -> str:
-    headers = {"Content-Type": "application/json"}
-    params = {"key": GENAI_API_KEY}
+class GeminiClient:
+    """Async Gemini client sharing one pooled HTTP connection set per process.
 
-    prompt = (
-            "Read the following text and provide a concise, yet complete summary "
-            "that captures all key details. Avoid adding opinions or extra commentary. "
-            "Respond only with the summary:\n\n" + text
-    )
+    At most ``max_concurrency`` calls are in flight, fewer while Gemini is rate
+    limiting or slow (see ``AdaptiveLimiter``); each call gets a deadline
+    covering the wait for a slot and all retries. 429 and 5xx responses and
+    transport errors are retried with full-jitter exponential backoff. After
+    repeated upstream failures the circuit breaker opens and calls fail fast
+    with ``CircuitOpenError`` until a probe succeeds.
+    """
 
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-    try:
-        logger.debug(f"Sending text to Gemini API: {data}")
-        response = requests.post(GEMINI_URL, json=data, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
+    def __init__(self, api_key: str = GENAI_API_KEY, base_url: str = GEMINI_BASE_URL,
+                 model: str = GEMINI_MODEL, timeout: float = GEMINI_TIMEOUT,
+                 max_concurrency: int = GEMINI_MAX_CONCURRENCY, max_retries: int = GEMINI_MAX_RETRIES,
+                 retry_base_delay: float = GEMINI_RETRY_BASE_DELAY,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 breaker: Optional[CircuitBreaker] = None, limiter: Optional[AdaptiveLimiter] = None):
+        require_settings("Summarization", GENAI_API_KEY=api_key)
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.breaker = breaker or CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_TIMEOUT)
+        self.limiter = limiter or AdaptiveLimiter(max_concurrency, GEMINI_MIN_CONCURRENCY, GEMINI_LATENCY_TARGET)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(MAX_RETRY_DELAY, self.retry_base_delay * 2 ** attempt))
 
+    async def _send(self, action: str, data: Dict, epoch: int, stream: bool = False, **params) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                started = time.perf_counter()
+                request = self._client.build_request(
+                    "POST",
+                    f"/models/{self.model}:{action}",
+                    json=data,
+                    headers={"Content-Type": "application/json"},
+                    params={"key": self.api_key, **params},
+                )
+                response = await self._client.send(request, stream=stream)
+                GEMINI_ATTEMPTS.labels(response.status_code).inc()
+                if response.status_code in RETRY_STATUS_CODES:
+                    self.limiter.on_overload(epoch)
+                else:
+                    self.limiter.on_response(time.perf_counter() - started, epoch)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+                await response.aclose()
+            except httpx.TransportError:
+                GEMINI_ATTEMPTS.labels("transport_error").inc()
+                self.limiter.on_overload(epoch)
+                if attempt == self.max_retries:
+                    raise
+
+            delay = self._retry_delay(attempt, response)
+            logger.warning(f"Gemini API attempt {attempt + 1} failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _open(self, action: str, data: Dict, timeout: Optional[float], **kwargs) -> httpx.Response:
+        """Send under a deadline covering the wait for a slot and all retries; the caller releases the slot."""
+        epoch = None
+        try:
+            async with asyncio.timeout(timeout or self.timeout):
+                epoch = await self.limiter.acquire()
+                logger.debug(f"Sending text to Gemini API: {data}")
+                return await self._send(action, data, epoch, **kwargs)
+        except BaseException as e:
+            if epoch is not None:
+                self.limiter.release()
+                if isinstance(e, TimeoutError):
+                    self.limiter.on_overload(epoch)
+            raise
+
+    def _admit(self):
+        try:
+            self.breaker.acquire()
+        except CircuitOpenError:
+            GEMINI_REJECTED.inc()
+            raise
+
+    def _settle(self, error: Optional[BaseException], elapsed: float):
+        if error is None:
+            outcome = "ok"
+            self.breaker.on_success()
+        elif not isinstance(error, Exception):
+            outcome = "cancelled"
+            self.breaker.on_cancel()
+        else:
+            outcome = call_outcome(error)
+            # Client errors and odd payloads still show Gemini is answering.
+            if is_upstream_failure(error):
+                self.breaker.on_failure()
+            else:
+                self.breaker.on_success()
+        GEMINI_CALL_DURATION.labels(outcome).observe(elapsed)
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        self._admit()
+        started = time.perf_counter()
+        error = None
+        try:
+            return await self._generate(prompt, timeout)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._settle(error, time.perf_counter() - started)
+
+    async def _generate(self, prompt: str, timeout: Optional[float]) -> str:
+        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        response = await self._open("generateContent", data, timeout)
+        self.limiter.release()
+
+        response.raise_for_status()
         try:
             result = response.json()
         except ValueError:
@@ -60,12 +219,150 @@ def summarize_text(text: str) -> str:
 
         return summary.text
 
-    except requests.Timeout:
+    async def summarize(self, text: str, timeout: Optional[float] = None) -> str:
+        return await self.generate(SUMMARY_PROMPT + text, timeout)
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield the text of ``prompt``'s response as the model produces it.
+
+        Closing the iterator (or cancelling its consumer) closes the upstream
+        connection, which stops the generation.
+        """
+        self._admit()
+        started = time.perf_counter()
+        error = None
+        try:
+            first = True
+            async for text in self._stream(prompt, timeout):
+                if first:
+                    GEMINI_STREAM_FIRST_CHUNK.observe(time.perf_counter() - started)
+                    first = False
+                yield text
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._settle(error, time.perf_counter() - started)
+
+    async def _stream(self, prompt: str, timeout: Optional[float]) -> AsyncIterator[str]:
+        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        # The deadline covers the wait for a slot and opening the stream; after
+        # that the client's read timeout bounds each gap between chunks, so long
+        # generations are not cut off. The slot is held until the stream ends.
+        response = await self._open("streamGenerateContent", data, timeout, stream=True, alt="sse")
+        try:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+
+            produced = False
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    event = json.loads(line[len("data:"):])
+                except ValueError:
+                    raise GeminiAPIError(f"Invalid stream event: {line}", response.status_code)
+                text = GeminiResponse.chunk_text(event)
+                if text:
+                    produced = True
+                    yield text
+
+            if not produced:
+                raise GeminiAPIError("Empty or malformed stream", response.status_code)
+        finally:
+            await response.aclose()
+            self.limiter.release()
+
+    def stream_summary(self, text: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        return self.stream(SUMMARY_PROMPT + text, timeout)
+
+
+SUMMARY_ERRORS = (TimeoutError, httpx.HTTPError, GeminiAPIError, CircuitOpenError)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Whether ``error`` means Gemini is down, overloaded or too slow."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (TimeoutError, httpx.TransportError))
+
+
+def call_outcome(error: Exception) -> str:
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        return "http_error"
+    if isinstance(error, GeminiAPIError):
+        return "api_error"
+    if isinstance(error, httpx.HTTPError):
+        return "transport_error"
+    return "error"
+
+
+def summary_error_message(error: Exception) -> str:
+    if isinstance(error, CircuitOpenError):
+        return "Summarization temporarily unavailable"
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
         logger.error("Gemini API request timed out.")
         return "API request timed out"
-    except requests.RequestException as e:
-        logger.error(f"Gemini API error: {e}. Request data: {data}")
-        return "Generation failed"
-    except GeminiAPIError as e:
-        logger.error(f"Gemini API response error: {e}. Status code: {e.status_code}")
+    if isinstance(error, GeminiAPIError):
+        logger.error(f"Gemini API response error: {error}. Status code: {error.status_code}")
         return "API response error"
+    logger.error(f"Gemini API error: {error}")
+    return "Generation failed"
+
+
+async def summarize_text(client: GeminiClient, text: str) -> str:
+    """Summarize ``text``, returning a short error message instead of raising on failure."""
+    try:
+        return await client.summarize(text)
+    except SUMMARY_ERRORS as e:
+        return summary_error_message(e)
+
+
+def make_gemini_client() -> Optional[GeminiClient]:
+    """Return a client, or None when Gemini is not configured; the rest of the app still runs."""
+    try:
+        return GeminiClient()
+    except ConfigError as e:
+        logger.warning(f"{e}; summaries are disabled")
+        return None
+
+
+def unavailable(error: CircuitOpenError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail="Summarization is temporarily unavailable.",
+                         headers={"Retry-After": error.retry_after_header})
+
+
+def summary_http_error(error: Exception) -> HTTPException:
+    """The response for a summary that failed upstream.
+
+    Timeouts are 504 and other upstream or response errors 502. An open
+    circuit or Gemini rate limiting after all retries is 503 with Retry-After.
+    """
+    if isinstance(error, CircuitOpenError):
+        return unavailable(error)
+    message = summary_error_message(error)
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Summarization timed out.")
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+        retry_after = error.response.headers.get("Retry-After", "")
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                             detail="Summarization is rate limited.",
+                             headers={"Retry-After": retry_after if retry_after.isdigit() else str(int(MAX_RETRY_DELAY))})
+    return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Summarization failed: {message}.")
+
+
+def get_gemini_client(request: Request) -> GeminiClient:
+    client = request.app.state.gemini_client
+    if client is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Summarization is not configured.")
+    # Fail fast while the breaker is open, before the route touches the database.
+    retry_after = client.breaker.retry_after()
+    if retry_after > 0:
+        GEMINI_REJECTED.inc()
+        raise unavailable(CircuitOpenError(retry_after))
+    return client
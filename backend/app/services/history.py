@@ -0,0 +1,151 @@
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import Iterable, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm.attributes import set_committed_value
+from app.config import HISTORY_SNAPSHOT_INTERVAL, HISTORY_COMPRESSION
+from app.models import Note, NoteVersion
+
+
+# Diffing runs over words with their trailing whitespace rather than characters:
+# far fewer elements for SequenceMatcher, and no single whitespace token that
+# matches everywhere. Edits to prose rarely split a word anyway.
+DIFF_TOKEN_PATTERN = re.compile(r"\s+|\S+\s*")
+
+# A delta is a list of ops: [start, length] copies a slice of the newer text,
+# a string is inserted as-is.
+Delta = list[Union[list[int], str]]
+
+
+def make_delta(base: str, target: str) -> Delta:
+    base_tokens = DIFF_TOKEN_PATTERN.findall(base)
+    target_tokens = DIFF_TOKEN_PATTERN.findall(target)
+    offsets = [0]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    # Most edits touch one region: match the common prefix and suffix directly
+    # and only diff what lies between.
+    limit = min(len(base_tokens), len(target_tokens))
+    prefix = 0
+    while prefix < limit and base_tokens[prefix] == target_tokens[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base_tokens[-suffix - 1] == target_tokens[-suffix - 1]:
+        suffix += 1
+
+    opcodes = [("equal", 0, prefix, 0, prefix)]
+    matcher = SequenceMatcher(None, base_tokens[prefix:len(base_tokens) - suffix],
+                              target_tokens[prefix:len(target_tokens) - suffix], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    opcodes.append(("equal", len(base_tokens) - suffix, len(base_tokens), 0, 0))
+
+    ops: Delta = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i2 > i1:
+            if ops and isinstance(ops[-1], list) and ops[-1][0] + ops[-1][1] == offsets[i1]:
+                ops[-1][1] += offsets[i2] - offsets[i1]
+            else:
+                ops.append([offsets[i1], offsets[i2] - offsets[i1]])
+        elif tag in ("replace", "insert"):
+            text = "".join(target_tokens[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += text
+            else:
+                ops.append(text)
+    return ops
+
+
+def apply_delta(base: str, ops: Delta) -> str:
+    return "".join(base[op[0]:op[0] + op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _pack(data: str, compressed: bool) -> bytes:
+    raw = data.encode()
+    return zlib.compress(raw) if compressed else raw
+
+
+def _unpack(payload: bytes, compressed: bool) -> str:
+    return (zlib.decompress(payload) if compressed else payload).decode()
+
+
+def encode_version(content: str, newer_content: str, is_snapshot: bool,
+                   compress: bool = HISTORY_COMPRESSION) -> dict:
+    """Column values storing ``content`` as a version older than ``newer_content``.
+
+    Deltas are reverse deltas: they rebuild the old text from the next newer
+    one. A delta that would not be smaller than the text itself is stored as a
+    snapshot instead.
+    """
+    values = {"content_length": len(content), "compressed": compress}
+    if not is_snapshot:
+        delta = json.dumps(make_delta(newer_content, content), separators=(",", ":"))
+        if len(delta) < len(content):
+            return {**values, "kind": "delta", "content": None, "payload": _pack(delta, compress)}
+
+    if compress:
+        return {**values, "kind": "snapshot", "content": None, "payload": _pack(content, True)}
+    return {**values, "kind": "snapshot", "content": content, "payload": None, "compressed": False}
+
+
+def decode_version(version: NoteVersion, newer_content: str) -> str:
+    if version.kind == "delta":
+        return apply_delta(newer_content, json.loads(_unpack(version.payload, version.compressed)))
+    if version.payload is not None:
+        return _unpack(version.payload, version.compressed)
+    return version.content
+
+
+def make_version(old_content: str, new_content: str, version_count: int,
+                 interval: int = HISTORY_SNAPSHOT_INTERVAL) -> NoteVersion:
+    # Every interval-th version of a note is a snapshot, counting the note's existing versions.
+    return NoteVersion(**encode_version(old_content, new_content, version_count % interval == 0))
+
+
+def load_contents(current_content: str, versions: Iterable[NoteVersion]):
+    """Fill ``content`` of loaded versions with their full text.
+
+    Walks from the current note content back through the chain, newest
+    first. Each delta is relative to the next newer version, so ``versions``
+    must be contiguous, starting either at the newest version or at a snapshot.
+    The value is set as committed state, so the instances are not marked dirty
+    and the stored encoding is untouched.
+    """
+    content = current_content
+    for version in sorted(versions, key=lambda version: version.id, reverse=True):
+        content = decode_version(version, content)
+        set_committed_value(version, "content", content)
+
+
+async def load_page(db: AsyncSession, note_id: int, versions: list[NoteVersion],
+                    interval: int = HISTORY_SNAPSHOT_INTERVAL):
+    """Fill ``content`` of a contiguous page of versions.
+
+    Only the rows between the page and the nearest newer snapshot are read, at
+    most about ``interval`` of them, plus the current note content when no
+    snapshot is newer than the page.
+    """
+    if not versions:
+        return
+
+    content = None
+    chain = sorted(versions, key=lambda version: version.id)
+    while chain[-1].kind != "snapshot":
+        result = await db.execute(
+            select(NoteVersion)
+            .where(NoteVersion.note_id == note_id, NoteVersion.id > chain[-1].id)
+            .order_by(NoteVersion.id)
+            .limit(interval)
+        )
+        newer = result.scalars().all()
+        if not newer:
+            content = await db.scalar(select(Note.content).where(Note.id == note_id))
+            break
+        snapshot = next((i for i, version in enumerate(newer) if version.kind == "snapshot"), len(newer) - 1)
+        chain.extend(newer[:snapshot + 1])
+
+    load_contents(content, chain)
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import Request
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.config import ConfigError, JOB_LEASE_SECONDS, JOB_WORKERS, JOB_POLL_INTERVAL
+from app.models import Job, Note
+from app.services import aggregates
+from app.services.analytics import NoteAnalytics
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+async def run_summarize(db: AsyncSession, state, params: dict) -> dict:
+    note = await db.get(Note, int(params["note_id"]))
+    if not note:
+        raise LookupError(f"Note {params['note_id']} not found")
+    if state.gemini_client is None:
+        raise ConfigError("Summarization is not configured")
+    summary, cached = await state.summary_cache.summarize(db, state.gemini_client, note.content)
+    return {"note_id": note.id, "summary": summary, "cached": cached}
+
+
+async def run_analytics(db: AsyncSession, state, params: dict) -> dict:
+    version = await aggregates.get_corpus_version(db)
+    return await state.analytics_cache.get_or_compute("summary", version, NoteAnalytics(db).get_summary)
+
+
+JOB_HANDLERS: dict[str, Callable[[AsyncSession, Any, dict], Awaitable[Any]]] = {
+    "summarize": run_summarize,
+    "analytics": run_analytics,
+}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def dedupe_key(kind: str, params: dict) -> str:
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+class JobQueue:
+    """Job queue persisted in the jobs table.
+
+    Workers claim the highest-priority queued job with a conditional UPDATE, so
+    in-process workers and separate worker processes (``python -m app.cli
+    worker``) can share one table. Submitting a job identical to one that is
+    still queued or running returns the existing job instead; a partial unique
+    index keeps concurrent submits from both inserting.
+
+    A worker holds a lease on its job and renews it while the job runs. When a
+    worker dies mid-job the lease runs out and the job is claimed again.
+    """
+
+    def __init__(self, session_factory, state, workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.state = state
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def _active_job(self, db: AsyncSession, key: str) -> Optional[Job]:
+        result = await db.execute(
+            select(Job).where(Job.dedupe_key == key, Job.status.in_(ACTIVE_STATUSES)).limit(1)
+        )
+        return result.scalar()
+
+    async def submit(self, db: AsyncSession, kind: str, params: dict, priority: int = 0) -> Job:
+        key = dedupe_key(kind, params)
+        job = await self._active_job(db, key)
+        if job:
+            return job
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params, dedupe_key=key, priority=priority, status="queued")
+        db.add(job)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent submit inserted the same job first.
+            await db.rollback()
+            existing = await self._active_job(db, key)
+            if existing is None:
+                raise
+            return existing
+        await db.refresh(job)
+        logger.info(f"Job queued: {job}")
+        self._wakeup.set()
+        return job
+
+    async def claim(self, db: AsyncSession) -> Optional[Job]:
+        while True:
+            now = utcnow()
+            # Running jobs without a lease predate leases; their workers are gone.
+            claimable = or_(
+                Job.status == "queued",
+                and_(Job.status == "running",
+                     or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)),
+            )
+            result = await db.execute(
+                select(Job.id)
+                .where(claimable)
+                .order_by(Job.priority.desc(), Job.created_at, Job.id)
+                .limit(1)
+            )
+            job_id = result.scalar()
+            if not job_id:
+                return None
+
+            claimed = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, claimable)
+                .values(status="running", started_at=func.now(),
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+            await db.commit()
+            if claimed.rowcount:
+                return await db.get(Job, job_id, populate_existing=True)
+
+    async def _finish(self, db: AsyncSession, job_id: str, **values):
+        await db.execute(update(Job).where(Job.id == job_id)
+                         .values(finished_at=func.now(), lease_expires_at=None, **values))
+        await db.commit()
+
+    async def _renew_lease(self, job_id: str):
+        # Its own session: the job's session is busy running the handler.
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(Job).where(Job.id == job_id, Job.status == "running")
+                        .values(lease_expires_at=utcnow() + timedelta(seconds=self.lease_seconds))
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Renewing the lease of job {job_id} failed: {e}")
+
+    async def run_next(self) -> bool:
+        async with self.session_factory() as db:
+            job = await self.claim(db)
+            if not job:
+                return False
+
+            # Rollbacks expire the instance, so keep plain copies for the bookkeeping below.
+            job_id, description = job.id, repr(job)
+            renewal = asyncio.create_task(self._renew_lease(job_id))
+            try:
+                try:
+                    result = await JOB_HANDLERS[job.kind](db, self.state, job.params)
+                finally:
+                    renewal.cancel()
+            except asyncio.CancelledError:
+                await db.rollback()
+                await db.execute(update(Job).where(Job.id == job_id)
+                                 .values(status="queued", started_at=None, lease_expires_at=None))
+                await db.commit()
+                raise
+            except Exception as e:
+                logger.error(f"Job failed: {description}: {e}")
+                await db.rollback()
+                await self._finish(db, job_id, status="failed", error=str(e) or type(e).__name__)
+            else:
+                await self._finish(db, job_id, status="succeeded", result=result)
+                logger.info(f"Job succeeded: {description}")
+            return True
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_next():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self):
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.job_queue
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Note
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+NGRAM_SIZES = (1, 2, 3)
+MAX_TERM_LENGTH = 255
+SCAN_BATCH_SIZE = 1000
+
+
+def tokenize(content: str) -> list[str]:
+    return TOKEN_PATTERN.findall(content.lower())
+
+
+def count_words(content: str) -> int:
+    return len(content.split())
+
+
+def count_terms(content: str) -> Counter:
+    counter = NgramCounter()
+    counter.add_text(content)
+    return Counter({(n, term): count for n, term, count in counter.terms()})
+
+
+class Vocabulary:
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._tokens: list[str] = []
+
+    def intern(self, token: str) -> int:
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token_id = self._ids[token] = len(self._tokens)
+            self._tokens.append(token)
+        return token_id
+
+    def decode(self, token_ids: tuple[int, ...]) -> str:
+        return " ".join(self._tokens[token_id] for token_id in token_ids)
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter sketch keeping at most ``capacity`` counters.
+
+    When full, a new item replaces the current minimum and inherits its count,
+    so counts are over-estimates by at most that minimum, and every item whose
+    true frequency exceeds total / capacity is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counts: dict = {}
+        self._heap: list[tuple[int, object]] = []
+
+    def __getitem__(self, item) -> int:
+        return self._counts.get(item, 0)
+
+    def __setitem__(self, item, count: int):
+        self.add(item, count - self._counts.get(item, 0))
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, item, count: int = 1):
+        if item not in self._counts and len(self._counts) >= self.capacity:
+            item_count = self._pop_min()
+        else:
+            item_count = self._counts.get(item, 0)
+        self._counts[item] = item_count + count
+        heapq.heappush(self._heap, (item_count + count, item))
+        if len(self._heap) > 2 * self.capacity:
+            self._heap = [(count, item) for item, count in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> int:
+        # Heap entries go stale when a counter grows; skip them lazily.
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self._counts.get(item) == count:
+                del self._counts[item]
+                return count
+
+    def items(self):
+        return self._counts.items()
+
+    def most_common(self, k: int) -> list[tuple[object, int]]:
+        return heapq.nlargest(k, self._counts.items(), key=lambda entry: entry[1])
+
+    def clear(self):
+        self._counts.clear()
+        self._heap.clear()
+
+
+class NgramCounter:
+    """Counts unigrams, bigrams and trigrams of many notes in one tokenizer pass.
+
+    Tokens are interned to integers so n-gram keys are small int tuples rather
+    than joined strings. With ``capacity`` set, each n-gram size is tracked by a
+    Space-Saving sketch instead of an exact counter, bounding memory on huge
+    vocabularies at the cost of approximate counts.
+    """
+
+    def __init__(self, sizes: tuple[int, ...] = NGRAM_SIZES, capacity: Optional[int] = None):
+        self.sizes = sizes
+        self.capacity = capacity
+        self.vocabulary = Vocabulary()
+        self.counters = {n: self._new_counter() for n in sizes}
+        self.note_count = 0
+        self.word_count = 0
+
+    def _new_counter(self):
+        return Counter() if self.capacity is None else SpaceSaving(self.capacity)
+
+    def add_text(self, content: str):
+        self.note_count += 1
+        self.word_count += count_words(content)
+        token_ids = [self.vocabulary.intern(token) for token in tokenize(content)]
+        for n in self.sizes:
+            counter = self.counters[n]
+            for i in range(len(token_ids) - n + 1):
+                key = tuple(token_ids[i:i + n])
+                counter[key] += 1
+
+    def add_batch(self, batch: "BatchCounts"):
+        self.note_count += batch.note_count
+        self.word_count += batch.word_count
+        for (n, term), count in batch.terms.items():
+            key = tuple(self.vocabulary.intern(token) for token in term.split(" "))
+            if isinstance(self.counters[n], SpaceSaving):
+                self.counters[n].add(key, count)
+            else:
+                self.counters[n][key] += count
+
+    def terms(self) -> Iterator[tuple[int, str, int]]:
+        for n, counter in self.counters.items():
+            for key, count in counter.items():
+                term = self.vocabulary.decode(key)
+                if len(term) <= MAX_TERM_LENGTH:
+                    yield n, term, count
+
+    def most_common(self, n: int, k: int) -> list[str]:
+        return [self.vocabulary.decode(key) for key, _ in self.counters[n].most_common(k)]
+
+    def pending_terms(self) -> int:
+        return sum(len(counter) for counter in self.counters.values())
+
+    def clear_terms(self):
+        # The vocabulary is kept: it is bounded by distinct tokens, not n-grams.
+        for counter in self.counters.values():
+            counter.clear()
+
+
+@dataclass
+class BatchCounts:
+    note_count: int
+    word_count: int
+    terms: Counter
+
+
+def count_batch(contents: list[str]) -> BatchCounts:
+    """Process-pool entry point: count one batch and return string-keyed terms."""
+    counter = NgramCounter()
+    for content in contents:
+        counter.add_text(content)
+    terms = Counter({(n, term): count for n, term, count in counter.terms()})
+    return BatchCounts(counter.note_count, counter.word_count, terms)
+
+
+async def scan_notes(db: AsyncSession, counter: NgramCounter, batch_size: int = SCAN_BATCH_SIZE,
+                     workers: int = 0, on_batch: Optional[Callable[[], Awaitable[None]]] = None) -> NgramCounter:
+    """Stream every note through ``counter`` using a server-side cursor.
+
+    With ``workers`` > 0, batches are tokenized in a process pool while the
+    next ones are fetched; at most two batches per worker are in flight.
+    ``on_batch`` runs after each merged batch, e.g. to flush exact counts.
+    """
+    result = await db.stream(select(Note.content).execution_options(yield_per=batch_size))
+    batches = result.scalars().partitions()
+
+    if not workers:
+        async for batch in batches:
+            for content in batch:
+                counter.add_text(content)
+            if on_batch:
+                await on_batch()
+        return counter
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        async def merge(return_when):
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for future in done:
+                counter.add_batch(future.result())
+                if on_batch:
+                    await on_batch()
+
+        async for batch in batches:
+            pending.add(loop.run_in_executor(pool, count_batch, list(batch)))
+            if len(pending) >= 2 * workers:
+                await merge(asyncio.FIRST_COMPLETED)
+        if pending:
+            await merge(asyncio.ALL_COMPLETED)
+    return counter
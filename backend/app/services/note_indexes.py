@@ -0,0 +1,16 @@
+from fastapi import Request
+
+
+def get_note_indexes(request: Request) -> list:
+    """In-process indexes kept current by note writes.
+
+    Each has ``add(note_id, title, content)``, which also replaces an existing
+    entry, and ``remove(note_id)``.
+    """
+    state = request.app.state
+    return [index for index in (state.search_index, state.embedding_index) if index is not None]
+
+
+def get_embedding_index(request: Request):
+    # Lives here rather than in app.services.embeddings so the routes do not import numpy.
+    return request.app.state.embedding_index
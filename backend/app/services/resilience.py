@@ -0,0 +1,147 @@
+"""Client-side protection against a slow or failing dependency.
+
+``CircuitBreaker`` fails calls fast while the dependency is down and lets a
+few probes through to find out when it is back. ``AdaptiveLimiter`` bounds the
+calls in flight with a limit that grows additively while responses are fast
+and halves on rate limiting, overload or slow responses (AIMD).
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit is open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected with ``CircuitOpenError``. After
+    ``reset_timeout`` seconds it turns half-open and admits up to
+    ``half_open_calls`` probes: a successful probe closes it, a failed one
+    opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, half_open_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self._state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._state, self.probes = self.HALF_OPEN, 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until a call may be admitted; 0 when one would be now."""
+        state = self.state
+        if state == self.OPEN:
+            return self.opened_at + self.reset_timeout - self.clock()
+        if state == self.HALF_OPEN and self.probes >= self.half_open_calls:
+            # Probes are in flight; their outcome decides soon.
+            return 1.0
+        return 0.0
+
+    def acquire(self):
+        """Admit a call or raise ``CircuitOpenError``; every admitted call must end in one ``on_*`` call."""
+        retry_after = self.retry_after()
+        if retry_after > 0:
+            raise CircuitOpenError(retry_after)
+        if self._state == self.HALF_OPEN:
+            self.probes += 1
+
+    def on_success(self):
+        self._state, self.failures, self.probes = self.CLOSED, 0, 0
+
+    def on_failure(self):
+        self.failures += 1
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state, self.opened_at, self.probes = self.OPEN, self.clock(), 0
+
+    def on_cancel(self):
+        """The call ended without telling anything about the dependency."""
+        if self._state == self.HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit between ``min_limit`` and ``max_limit`` adjusted by AIMD.
+
+    The limit starts at ``max_limit``. Each fast response adds ``1 / limit``
+    (about one per round of calls); an overload signal or a response slower
+    than ``latency_target`` multiplies it by ``backoff``. Calls that started
+    before the last decrease cannot decrease it again, so one burst of
+    failures halves the limit once instead of collapsing it.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_target: float = 5.0, backoff: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.epoch = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> int:
+        """Wait for a slot and return the epoch the call started in."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                # Pass on a wake-up that arrived together with the cancellation.
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+        return self.epoch
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        for waiter in self._waiters:
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_response(self, latency: float, epoch: int):
+        if latency > self.latency_target:
+            self.on_overload(epoch)
+            return
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_overload(self, epoch: int):
+        if epoch < self.epoch:
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.epoch += 1
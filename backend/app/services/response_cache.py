@@ -0,0 +1,263 @@
+import importlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, NamedTuple, Optional
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import DB_REPLICA_LAG_WINDOW, RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_URL
+
+
+# Responses are cached in groups that are invalidated together: one group per
+# note (the note and its history pages) and one for everything that changes
+# with the corpus version (note listings and analytics).
+CORPUS_GROUP = "corpus"
+MAX_TRACKED_GENERATIONS = 10_000
+
+
+def note_group(note_id: int) -> str:
+    return f"note:{note_id}"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers.items())
+
+
+def http_date(value: datetime) -> str:
+    # Timestamps are stored naive, in UTC.
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def not_modified(request: Request, headers: dict[str, str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: a W/ prefix on either side is ignored.
+        etag = headers.get("ETag", "").removeprefix("W/")
+        return any(tag.strip() == "*" or tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def respond(request: Request, entry: CachedResponse) -> Response:
+    # no-cache: browsers may keep the response but revalidate it on every use,
+    # which is answered from the cache with a 304.
+    headers = {**entry.headers, "Cache-Control": "no-cache"}
+    if not_modified(request, entry.headers):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+class MemoryResponseCache:
+    """In-process LRU of rendered responses, bounded by their total size.
+
+    Every invalidation stamps the group with a new generation. A response
+    rendered from a read that started before the invalidation is dropped by
+    ``store``, so a slow reader cannot put stale data back. Like the search
+    index, it is per process: with several API workers, use a shared backend.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, lag_window: float = DB_REPLICA_LAG_WINDOW):
+        self.max_bytes = max_bytes
+        self.lag_window = lag_window
+        self._entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        self._groups: dict[str, set[str]] = {}
+        self._size = 0
+        self._generation = 0
+        # Generations of recently invalidated groups. Untracked groups report
+        # the newest generation ever dropped from here, so a forgotten group
+        # never goes back to an older one.
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._untracked_generation = 0
+        self._invalidated_at: OrderedDict[str, float] = OrderedDict()
+        self._untracked_invalidated_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _group_generation(self, group: str) -> int:
+        return self._generations.get(group, self._untracked_generation)
+
+    async def lookup(self, group: str, variant: str) -> tuple[Optional[CachedResponse], int]:
+        entry = self._entries.get((group, variant))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end((group, variant))
+        return entry, self._group_generation(group)
+
+    async def store(self, group: str, variant: str, entry: CachedResponse, generation: int):
+        if generation != self._group_generation(group) or entry.size > self.max_bytes:
+            return
+        self._discard(group, variant)
+        self._entries[(group, variant)] = entry
+        self._groups.setdefault(group, set()).add(variant)
+        self._size += entry.size
+        while self._size > self.max_bytes:
+            (old_group, old_variant), _ = next(iter(self._entries.items()))
+            self._discard(old_group, old_variant)
+
+    async def recently_invalidated(self, group: str) -> bool:
+        invalidated_at = self._invalidated_at.get(group, self._untracked_invalidated_at)
+        return time.monotonic() - invalidated_at < self.lag_window
+
+    async def invalidate(self, *groups: str):
+        now = time.monotonic()
+        for group in groups:
+            self._invalidated_at[group] = now
+            self._invalidated_at.move_to_end(group)
+            if len(self._invalidated_at) > MAX_TRACKED_GENERATIONS:
+                _, invalidated_at = self._invalidated_at.popitem(last=False)
+                self._untracked_invalidated_at = max(self._untracked_invalidated_at, invalidated_at)
+            for variant in list(self._groups.get(group, ())):
+                self._discard(group, variant)
+            self._generation += 1
+            self._generations[group] = self._generation
+            self._generations.move_to_end(group)
+            if len(self._generations) > MAX_TRACKED_GENERATIONS:
+                _, generation = self._generations.popitem(last=False)
+                self._untracked_generation = max(self._untracked_generation, generation)
+
+    def _discard(self, group: str, variant: str):
+        entry = self._entries.pop((group, variant), None)
+        if entry is None:
+            return
+        self._size -= entry.size
+        variants = self._groups[group]
+        variants.discard(variant)
+        if not variants:
+            del self._groups[group]
+
+    def clear(self):
+        self._entries.clear()
+        self._groups.clear()
+        self._size = 0
+
+    async def aclose(self):
+        pass
+
+
+# Stores the entry only if the group has not been invalidated since the lookup.
+REDIS_STORE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class RedisResponseCache:
+    """Response cache shared by every API process through Redis.
+
+    Each group is a Redis hash of its variants, next to a generation counter
+    bumped on invalidation. Entries expire after ``ttl`` seconds. Redis'
+    own ``maxmemory`` policy bounds the total size. Needs the optional
+    ``redis`` package.
+    """
+
+    def __init__(self, url: str = RESPONSE_CACHE_URL, ttl: int = RESPONSE_CACHE_TTL,
+                 prefix: str = "notes:responses:", lag_window: float = DB_REPLICA_LAG_WINDOW):
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis needs the redis package: pip install redis") from e
+        self._redis = redis.from_url(url)
+        self._store_script = self._redis.register_script(REDIS_STORE_SCRIPT)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lag_window = lag_window
+
+    def _keys(self, group: str) -> tuple[str, str]:
+        return f"{self.prefix}{group}", f"{self.prefix}{group}:generation"
+
+    async def lookup(self, group: str, variant: str) -> tuple[Optional[CachedResponse], int]:
+        entries_key, generation_key = self._keys(group)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hget(entries_key, variant)
+            pipe.get(generation_key)
+            raw, generation = await pipe.execute()
+        entry = None
+        if raw is not None:
+            headers, _, body = raw.partition(b"\n")
+            entry = CachedResponse(body, json.loads(headers))
+        return entry, int(generation or 0)
+
+    async def store(self, group: str, variant: str, entry: CachedResponse, generation: int):
+        raw = json.dumps(entry.headers).encode() + b"\n" + entry.body
+        await self._store_script(keys=list(self._keys(group)), args=[variant, raw, generation, self.ttl])
+
+    async def invalidate(self, *groups: str):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for group in groups:
+                entries_key, generation_key = self._keys(group)
+                pipe.delete(entries_key)
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, self.ttl)
+                if self.lag_window > 0:
+                    pipe.set(f"{self.prefix}{group}:written", 1, px=int(self.lag_window * 1000))
+            await pipe.execute()
+
+    async def recently_invalidated(self, group: str) -> bool:
+        return bool(await self._redis.exists(f"{self.prefix}{group}:written"))
+
+    async def aclose(self):
+        await self._redis.aclose()
+
+
+RESPONSE_CACHES = {"memory": MemoryResponseCache, "redis": RedisResponseCache}
+
+
+def make_response_cache(backend: str = RESPONSE_CACHE_BACKEND):
+    """Return a registered response cache, or one loaded from a ``module:attribute`` path.
+
+    A response cache has async ``lookup(group, variant)``, ``store(group,
+    variant, entry, generation)``, ``invalidate(*groups)``,
+    ``recently_invalidated(group)`` and ``aclose()``.
+    """
+    if backend in RESPONSE_CACHES:
+        return RESPONSE_CACHES[backend]()
+    module_name, _, attribute = backend.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+async def serve(request: Request, cache, group: str, variant: str,
+                render: Callable[[AsyncSession], Awaitable[CachedResponse]],
+                db: AsyncSession, read_db: Optional[AsyncSession] = None) -> Response:
+    """Answer from the cache, rendering and storing the response on a miss.
+
+    ``render`` gets the session to read from: the replica session ``read_db``
+    if given, unless the group was written to within the replica lag window.
+    Then the primary ``db`` is read, so a write is visible to the next read
+    and a lagging replica cannot put the old data back in the cache.
+    ``render`` may raise HTTPException; errors are not cached.
+    """
+    entry, generation = await cache.lookup(group, variant)
+    if entry is None:
+        if read_db is not None and await cache.recently_invalidated(group):
+            read_db = None
+        entry = await render(read_db or db)
+        await cache.store(group, variant, entry, generation)
+    return respond(request, entry)
+
+
+def get_response_cache(request: Request):
+    return request.app.state.response_cache
@@ -0,0 +1,183 @@
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import literal_column, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Note
+from app.services.ngrams import tokenize
+
+
+SEARCH_BATCH_SIZE = 1000
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_EXPANSIONS = 64
+# Shorter terms match exactly: a one- or two-letter prefix matches most of the corpus.
+MIN_PREFIX_LENGTH = 3
+SNIPPET_LENGTH = 200
+SNIPPET_CONTEXT = 60
+# PostgreSQL: notes.search_vector is a generated tsvector column with a GIN
+# index, created by migration. The 'simple' configuration neither stems nor
+# drops stop words, so it matches the in-process index.
+TS_CONFIG = "simple"
+HEADLINE_OPTIONS = 'MaxFragments=1, MaxWords=35, MinWords=15, StartSel="", StopSel=""'
+
+
+def to_tsquery_text(terms: list[str]) -> str:
+    # Terms come from tokenize(), so they hold only word characters.
+    return " & ".join(f"{term}:*" if len(term) >= MIN_PREFIX_LENGTH else term for term in terms)
+
+
+def make_snippet(content: str, terms: list[str]) -> str:
+    match = re.search(r"\b(?:" + "|".join(map(re.escape, terms)) + ")", content, re.IGNORECASE)
+    start = 0
+    if match and match.start() > SNIPPET_CONTEXT:
+        # Start at a word boundary a little before the first match.
+        start = content.rfind(" ", 0, match.start() - SNIPPET_CONTEXT) + 1
+    end = start + SNIPPET_LENGTH
+    if end < len(content):
+        space = content.rfind(" ", start, end)
+        end = space if space > start else end
+    return ("..." if start else "") + content[start:end].strip() + ("..." if end < len(content) else "")
+
+
+class SearchIndex:
+    """In-process inverted index ranking notes with BM25.
+
+    Used where the database has no full-text search (SQLite, tests). It is
+    built once at startup and kept current by the note write paths; every
+    query term of ``MIN_PREFIX_LENGTH`` or more characters matches as a prefix,
+    and all terms must match. Title terms count
+    ``TITLE_WEIGHT`` times.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, int]] = {}
+        self._terms: list[str] = []
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._doc_lengths: dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, note_id: int, title: str, content: str):
+        self.remove(note_id)
+        counts = Counter(tokenize(content))
+        for term in tokenize(title):
+            counts[term] += TITLE_WEIGHT
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[note_id] = count
+        self._doc_terms[note_id] = tuple(counts)
+        self._doc_lengths[note_id] = length = sum(counts.values())
+        self._total_length += length
+
+    def remove(self, note_id: int):
+        terms = self._doc_terms.pop(note_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(note_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[note_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def expand(self, prefix: str) -> list[str]:
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return [prefix] if prefix in self._postings else []
+        start = bisect.bisect_left(self._terms, prefix)
+        expansions = []
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def search(self, terms: list[str], limit: int) -> list[tuple[int, float]]:
+        if not terms or not self._doc_lengths:
+            return []
+
+        doc_count = len(self._doc_lengths)
+        average_length = self._total_length / doc_count
+        scores: Optional[dict[int, float]] = None
+        for prefix in terms:
+            term_scores: dict[int, float] = {}
+            for term in self.expand(prefix):
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for note_id, count in postings.items():
+                    if scores is not None and note_id not in scores:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[note_id] / average_length)
+                    term_scores[note_id] = term_scores.get(note_id, 0.0) + idf * count * (BM25_K1 + 1) / (count + norm)
+            if scores is not None:
+                term_scores = {note_id: score + scores[note_id] for note_id, score in term_scores.items()}
+            scores = term_scores
+            if not scores:
+                return []
+
+        return heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+
+    @classmethod
+    async def build(cls, db: AsyncSession, batch_size: int = SEARCH_BATCH_SIZE) -> "SearchIndex":
+        index = cls()
+        result = await db.stream(select(Note.id, Note.title, Note.content).execution_options(yield_per=batch_size))
+        async for note_id, title, content in result:
+            index.add(note_id, title, content)
+        return index
+
+
+async def search_notes(db: AsyncSession, index: Optional[SearchIndex], query: str, limit: int) -> list[dict]:
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    if index is None:
+        tsquery = func.to_tsquery(TS_CONFIG, to_tsquery_text(terms))
+        search_vector = literal_column("notes.search_vector")
+        rank = func.ts_rank(search_vector, tsquery, 1)
+        ranked = (
+            select(Note.id, Note.title, Note.content, rank.label("score"))
+            .where(search_vector.op("@@")(tsquery))
+            .order_by(rank.desc())
+            .limit(limit)
+            .subquery()
+        )
+        # ts_headline is costly, so it only runs on the rows that made the page.
+        result = await db.execute(
+            select(
+                ranked.c.id,
+                ranked.c.title,
+                func.ts_headline(TS_CONFIG, ranked.c.content, tsquery, HEADLINE_OPTIONS).label("snippet"),
+                ranked.c.score,
+            ).order_by(ranked.c.score.desc())
+        )
+        return [dict(row._mapping) for row in result.all()]
+
+    ranked = index.search(terms, limit)
+    if not ranked:
+        return []
+    result = await db.execute(
+        select(Note.id, Note.title, Note.content).where(Note.id.in_([note_id for note_id, _ in ranked]))
+    )
+    notes = {note_id: (title, content) for note_id, title, content in result.all()}
+    return [
+        {"id": note_id, "title": notes[note_id][0], "snippet": make_snippet(notes[note_id][1], terms), "score": score}
+        for note_id, score in ranked
+        if note_id in notes
+    ]
+
+
+def get_search_index(request: Request) -> Optional[SearchIndex]:
+    return request.app.state.search_index
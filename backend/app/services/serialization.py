@@ -0,0 +1,49 @@
+"""Rendering of note responses straight from ORM rows.
+
+The routes' response models describe these payloads, but validating every
+ORM object back through Pydantic only to dump it again costs more than the
+query on large pages. These builders read the attributes the schemas
+declare, in the same order, and orjson renders the result. Their output
+matches ``schemas.NoteResponse``, ``NoteListItem`` and ``NoteVersionResponse``.
+"""
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def version_fields(version) -> dict:
+    return {
+        "id": version.id,
+        "created_at": version.created_at,
+        "content_length": version.content_length,
+        "content": version.content,
+    }
+
+
+def note_fields(note) -> dict:
+    return {
+        "title": note.title,
+        "content": note.content,
+        "id": note.id,
+        "created_at": note.created_at,
+        "updated_at": note.updated_at,
+        "revision": note.revision,
+    }
+
+
+def note_list_item_fields(row: dict) -> dict:
+    versions = row.get("versions")
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "preview": row["preview"],
+        "created_at": row["created_at"],
+        "versions": None if versions is None else [version_fields(version) for version in versions],
+    }
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def note_response(note, status_code: int = 200, headers: dict | None = None) -> ORJSONResponse:
+    return ORJSONResponse(note_fields(note), status_code=status_code, headers=headers)
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+from typing import Optional
+from cachetools import LRUCache
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.config import GEMINI_MODEL, SUMMARY_CACHE_SIZE
+from app.database import dialect_insert
+from app.models import Summary
+from app.services.chunked_summarizer import CHUNK_PROMPT, map_chunks, reduce_prompt, split_chunks
+from app.services.gemini_summerizer import GeminiClient, SUMMARY_PROMPT
+
+
+logger = logging.getLogger(__name__)
+
+
+async def release_connection(db: AsyncSession):
+    """End the session's read transaction so its connection serves other requests during a Gemini call.
+
+    The session checks a connection out again for its next statement. Callers
+    must not have pending changes, which would be committed.
+    """
+    await db.commit()
+
+
+def summary_key(content: str, model: str = GEMINI_MODEL, prompt: str = SUMMARY_PROMPT) -> str:
+    digest = hashlib.sha256()
+    for part in (prompt, model, content):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """Summaries addressed by a hash of (prompt, model, content).
+
+    An in-process LRU sits in front of the summaries table. Edited notes simply
+    hash to a new key, so entries for old content are never served for new
+    content and can be shared by notes with identical text. Long notes are
+    summarized in chunks whose summaries are cached the same way, keyed by the
+    chunk prompt, so an edit only re-summarizes the chunks it touched.
+    """
+
+    def __init__(self, maxsize: int = SUMMARY_CACHE_SIZE):
+        self._memory = LRUCache(maxsize=maxsize)
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[str]:
+        summary = self._memory.get(key)
+        if summary is not None:
+            return summary
+
+        result = await db.execute(select(Summary.summary).where(Summary.content_hash == key))
+        summary = result.scalar()
+        if summary is not None:
+            self._memory[key] = summary
+        return summary
+
+    async def get_many(self, db: AsyncSession, keys: list[str]) -> dict[str, str]:
+        summaries = {key: self._memory[key] for key in keys if key in self._memory}
+        missing = [key for key in keys if key not in summaries]
+        if missing:
+            result = await db.execute(select(Summary.content_hash, Summary.summary)
+                                      .where(Summary.content_hash.in_(missing)))
+            for key, summary in result.all():
+                self._memory[key] = summaries[key] = summary
+        return summaries
+
+    async def put(self, db: AsyncSession, key: str, model: str, summary: str):
+        await self.put_many(db, model, {key: summary})
+
+    async def put_many(self, db: AsyncSession, model: str, summaries: dict[str, str]):
+        if not summaries:
+            return
+        self._memory.update(summaries)
+        stmt = dialect_insert(db)(Summary).values([
+            {"content_hash": key, "model": model, "summary": summary} for key, summary in summaries.items()
+        ])
+        await db.execute(stmt.on_conflict_do_nothing(index_elements=["content_hash"]))
+        await db.commit()
+
+    async def chunk_summaries(self, db: AsyncSession, client: GeminiClient, content: str) -> Optional[list[str]]:
+        """Summaries of ``content``'s chunks in order, or None when it fits one prompt.
+
+        Missing chunks are summarized concurrently and cached, also when another
+        chunk fails; the first failure is then raised.
+        """
+        chunks = split_chunks(content)
+        if len(chunks) == 1:
+            return None
+
+        keys = [summary_key(chunk, client.model, CHUNK_PROMPT) for chunk in chunks]
+        summaries = await self.get_many(db, keys)
+        missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in summaries}
+        if missing:
+            await release_connection(db)
+            summarized, error = await map_chunks(client, missing)
+            await self.put_many(db, client.model, summarized)
+            logger.info(f"Summarized {len(summarized)} of {len(missing)} uncached chunks out of {len(chunks)}")
+            if error is not None:
+                raise error
+            summaries.update(summarized)
+        return [summaries[key] for key in keys]
+
+    async def generate(self, db: AsyncSession, client: GeminiClient, content: str) -> str:
+        """Summarize ``content`` without looking up or storing the whole-note summary."""
+        partials = await self.chunk_summaries(db, client, content)
+        await release_connection(db)
+        if partials is None:
+            return await client.summarize(content)
+        return await client.generate(reduce_prompt(partials))
+
+    async def summarize(self, db: AsyncSession, client: GeminiClient, content: str) -> tuple[str, bool]:
+        """Return ``(summary, cached)``; Gemini errors propagate and are not cached."""
+        key = summary_key(content, client.model)
+        summary = await self.get(db, key)
+        if summary is not None:
+            return summary, True
+
+        summary = await self.generate(db, client, content)
+        await self.put(db, key, client.model, summary)
+        logger.info(f"Summary cached with key: {key}")
+        return summary, False
+
+
+def get_summary_cache(request: Request) -> SummaryCache:
+    return request.app.state.summary_cache
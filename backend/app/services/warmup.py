@@ -0,0 +1,56 @@
+"""Work done at startup so the first requests of a new process are not slow.
+
+Hooks run concurrently before the app takes traffic. A failing or slow hook
+is logged and skipped: warm-up only saves time, it is never required.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.services import aggregates
+from app.services.analytics import NoteAnalytics
+from app.services.analytics_cache import AnalyticsCache
+
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_pool(engine: AsyncEngine, connections: int):
+    """Open ``connections`` pooled connections at once, so they stay in the pool for the first requests."""
+    opened = await asyncio.gather(*(engine.connect().start() for _ in range(connections)), return_exceptions=True)
+    await asyncio.gather(*(conn.close() for conn in opened if not isinstance(conn, BaseException)))
+    errors = [conn for conn in opened if isinstance(conn, BaseException)]
+    if errors:
+        raise errors[0]
+
+
+async def prime_analytics(session_factory, cache: AnalyticsCache):
+    async with session_factory() as db:
+        version = await aggregates.get_corpus_version(db)
+        await cache.get_or_compute("summary", version, NoteAnalytics(db).get_summary)
+
+
+async def run_warmup(hooks: dict[str, Callable[[], Awaitable]], timeout: float) -> dict[str, str]:
+    """Run ``hooks`` concurrently and return each one's outcome: ok, failed or timed out."""
+    if not hooks:
+        return {}
+    started = time.perf_counter()
+    tasks = {name: asyncio.create_task(hook()) for name, hook in hooks.items()}
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    outcomes = {}
+    for name, task in tasks.items():
+        if task in pending:
+            outcomes[name] = "timed out"
+            logger.warning(f"Warm-up {name} did not finish within {timeout}s")
+        elif task.exception() is not None:
+            outcomes[name] = "failed"
+            logger.warning(f"Warm-up {name} failed: {task.exception()}")
+        else:
+            outcomes[name] = "ok"
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s: {outcomes}")
+    return outcomes
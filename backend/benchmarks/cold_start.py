@@ -0,0 +1,91 @@
+"""Cold start time of an API process.
+
+Starts fresh interpreters that import the app, run its startup (lifespan,
+including warm-up) against a scratch SQLite database and serve one request.
+Each phase is timed, and the slowest imports are listed from
+``python -X importtime``. This is the delay a new worker or serverless
+instance adds before it can take traffic.
+
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def main():
+    from httpx import AsyncClient, ASGITransport
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app), base_url="http://probe") as ac:
+            response = await ac.get("/notes/")
+        served = time.perf_counter()
+    response.raise_for_status()
+    return ready, served
+
+ready, served = asyncio.run(main())
+print(json.dumps({"import_ms": 1000 * (imported - started), "startup_ms": 1000 * (ready - imported),
+                  "first_request_ms": 1000 * (served - ready)}))
+"""
+
+
+def slowest_imports(importtime: str, top: int) -> list[dict]:
+    """Top-level imports by cumulative time, from ``-X importtime`` output."""
+    imports = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Only direct imports of the probe (and of the app's own modules) are listed.
+        if cumulative.strip().isdigit() and (not name.startswith("  ") or name.strip().startswith("app.")):
+            imports.append({"module": name.strip(), "ms": round(int(cumulative) / 1000, 1)})
+    return sorted(imports, key=lambda entry: entry["ms"], reverse=True)[:top]
+
+
+def run(args) -> dict:
+    runs, importtime = [], ""
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(directory, 'cold.db')}",
+            "EMBEDDING_DIR": os.path.join(directory, "embeddings"),
+            "JOB_WORKERS": "0",
+        }
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                                    capture_output=True, text=True, env=env, check=True)
+            total_ms = 1000 * (time.perf_counter() - started)
+            runs.append({**json.loads(result.stdout.strip().splitlines()[-1]), "process_ms": total_ms})
+            importtime = result.stderr
+
+    phases = ("import_ms", "startup_ms", "first_request_ms", "process_ms")
+    return {
+        "runs": args.runs,
+        # The first run also pays for a cold OS file cache and creating the database.
+        "median": {phase: round(statistics.median(run[phase] for run in runs), 1) for phase in phases},
+        "min": {phase: round(min(run[phase] for run in runs), 1) for phase in phases},
+        "slowest_imports": slowest_imports(importtime, args.top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Recall and latency of the IVF note embedding index.
+
+Indexes synthetic clustered unit vectors, then compares approximate top-k
+results for several nprobe settings with an exact brute-force scan.
+
+    python -m benchmarks.embedding_search --sizes 100000 1000000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from app.config import EMBEDDING_DIMENSION
+from app.services.embeddings import EmbeddingIndex, HashingEmbedder
+
+
+def clustered_vectors(rng: np.random.Generator, count: int, dimension: int, clusters: int) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    for start in range(0, count, 100_000):
+        end = min(count, start + 100_000)
+        noise = rng.normal(size=(end - start, dimension)).astype(np.float32)
+        vectors[start:end] = centers[rng.integers(clusters, size=end - start)] + 0.5 * noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_size(size: int, args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(rng, size, args.dimension, args.clusters)
+    index = EmbeddingIndex(HashingEmbedder(args.dimension), path=None)
+    for start in range(0, size, 100_000):
+        index.add_vectors(list(range(start, min(size, start + 100_000))), vectors[start:start + 100_000])
+
+    started = time.perf_counter()
+    index.train()
+    result = {"lists": len(index.centroids), "train_seconds": round(time.perf_counter() - started, 2)}
+
+    queries = vectors[rng.choice(size, args.queries, replace=False)]
+    queries += 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    started = time.perf_counter()
+    exact = []
+    for query in queries:
+        scores = vectors @ query
+        exact.append(set(np.argpartition(-scores, args.k)[:args.k].tolist()))
+    result["exact_ms"] = round(1000 * (time.perf_counter() - started) / args.queries, 3)
+
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        found = [{note_id for note_id, _ in index.search(query, args.k, nprobe=nprobe)} for query in queries]
+        elapsed = time.perf_counter() - started
+        recall = sum(len(hits & truth) for hits, truth in zip(found, exact)) / (args.k * args.queries)
+        result[f"nprobe_{nprobe}"] = {"recall": round(recall, 4), "ms": round(1000 * elapsed / args.queries, 3)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--dimension", type=int, default=EMBEDDING_DIMENSION)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps({size: run_size(size, args) for size in args.sizes}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
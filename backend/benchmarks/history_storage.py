@@ -0,0 +1,112 @@
+"""Storage size and reconstruction latency of note version history.
+
+Simulates notes edited many times with small changes and compares storing a
+full copy per version with delta encoding, with and without compression.
+
+    python -m benchmarks.history_storage --notes 20 --edits 200 --size 10000
+"""
+import argparse
+import json
+import random
+import time
+from app.models import NoteVersion
+from app.services import history
+
+
+_vocabulary = random.Random(1)
+WORDS = ["".join(_vocabulary.choices("etaoinshrdlucmfwyp", k=_vocabulary.randint(2, 9))) for _ in range(3000)]
+
+
+def random_text(rng: random.Random, size: int) -> str:
+    words, length = [], 0
+    while length < size:
+        words.append(rng.choice(WORDS))
+        length += len(words[-1]) + 1
+    return " ".join(words)[:size]
+
+
+def edit(rng: random.Random, content: str) -> str:
+    words = content.split(" ")
+    for _ in range(rng.randint(1, 5)):
+        position = rng.randrange(len(words))
+        action = rng.random()
+        if action < 0.4:
+            words[position] = rng.choice(WORDS)
+        elif action < 0.7:
+            words.insert(position, rng.choice(WORDS))
+        elif len(words) > 1:
+            del words[position]
+    return " ".join(words)
+
+
+def encode_history(contents: list[str], interval: int, compress: bool) -> list[NoteVersion]:
+    # contents[-1] is the current note; everything before it is history.
+    versions = []
+    for position in reversed(range(len(contents) - 1)):
+        values = history.encode_version(contents[position], contents[position + 1], position % interval == 0, compress)
+        versions.append(NoteVersion(id=position, **values))
+    return versions
+
+
+def stored_size(version: NoteVersion) -> int:
+    if version.payload is not None:
+        return len(version.payload)
+    return len(version.content.encode())
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    notes = []
+    for _ in range(args.notes):
+        contents = [random_text(rng, args.size)]
+        for _ in range(args.edits):
+            contents.append(edit(rng, contents[-1]))
+        notes.append(contents)
+
+    results = {"full_copy": {"bytes": sum(len(content.encode()) for contents in notes for content in contents[:-1])}}
+    for compress in (False, True):
+        started = time.perf_counter()
+        encoded = [encode_history(contents, args.interval, compress) for contents in notes]
+        encode_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for contents, versions in zip(notes, encoded):
+            history.load_contents(contents[-1], versions)
+        full_seconds = time.perf_counter() - started
+
+        # One random version per note: only the rows back to the nearest newer
+        # snapshot (or the current content) are needed.
+        started = time.perf_counter()
+        for contents, versions in zip(notes, encoded):
+            ordered = sorted(versions, key=lambda version: version.id)
+            target = rng.randrange(len(ordered))
+            end = next((i for i in range(target, len(ordered)) if ordered[i].kind == "snapshot"), len(ordered) - 1)
+            history.load_contents(contents[-1], ordered[target:end + 1])
+        single_seconds = time.perf_counter() - started
+
+        assert all(version.content == contents[version.id] for contents, versions in zip(notes, encoded)
+                   for version in versions)
+        results["delta_compressed" if compress else "delta"] = {
+            "bytes": sum(stored_size(version) for versions in encoded for version in versions),
+            "encode_ms_per_version": 1000 * encode_seconds / (args.notes * args.edits),
+            "full_history_ms_per_note": 1000 * full_seconds / args.notes,
+            "single_version_ms": 1000 * single_seconds / args.notes,
+        }
+
+    for name, result in results.items():
+        result["ratio"] = round(result["bytes"] / results["full_copy"]["bytes"], 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--size", type=int, default=10_000, help="characters per note")
+    parser.add_argument("--interval", type=int, default=history.HISTORY_SNAPSHOT_INTERVAL)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cost of rendering note payloads as JSON.
+
+Builds detached ORM notes with versions and renders them as one response body
+in three ways: FastAPI's response_model path (validate from attributes, dump
+to JSON-compatible Python, json.dumps), Pydantic's own JSON dump, and the
+fast path of app.services.serialization (plain dicts rendered by orjson).
+
+    python -m benchmarks.serialization --notes 10000 --versions 3
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from pydantic import TypeAdapter
+from app import schemas
+from app.models import Note, NoteVersion
+from app.services.serialization import dumps, note_fields, note_list_item_fields
+
+
+def make_notes(count: int, versions: int, size: int) -> list[Note]:
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+    started = datetime(2026, 1, 1)
+
+    def text() -> str:
+        return " ".join(rng.choice(words) for _ in range(size // 6))[:size]
+
+    notes = []
+    for i in range(count):
+        created_at = started + timedelta(seconds=i, microseconds=rng.randrange(1_000_000))
+        notes.append(Note(
+            id=i + 1, title=f"Note {i}", content=text(), revision=versions + 1,
+            created_at=created_at, updated_at=created_at,
+            versions=[
+                NoteVersion(id=i * versions + v, content=text(), content_length=size,
+                            created_at=created_at + timedelta(minutes=v))
+                for v in range(versions)
+            ],
+        ))
+    return notes
+
+
+def timed(render, repeat: int) -> tuple[float, int]:
+    best, size = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(render())
+        best = min(best, time.perf_counter() - started)
+    return best, size
+
+
+def run(args) -> dict:
+    notes = make_notes(args.notes, args.versions, args.size)
+    rows = [{"id": note.id, "title": note.title, "preview": note.content[:200], "created_at": note.created_at,
+             "versions": note.versions} for note in notes]
+    notes_adapter = TypeAdapter(list[schemas.NoteResponse])
+    rows_adapter = TypeAdapter(list[schemas.NoteListItem])
+
+    payloads = {
+        "notes": (notes, notes_adapter, lambda: dumps([note_fields(note) for note in notes])),
+        "list_items": (rows, rows_adapter, lambda: dumps([note_list_item_fields(row) for row in rows])),
+    }
+    results = {}
+    for name, (items, adapter, fast) in payloads.items():
+        paths = {
+            # What FastAPI does with a response_model: validate, serialize to
+            # JSON-compatible Python, then json.dumps in JSONResponse.render.
+            "response_model": lambda: json.dumps(
+                adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json"),
+                ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+            ).encode(),
+            "pydantic_dump_json": lambda: adapter.dump_json(adapter.validate_python(items, from_attributes=True)),
+            "orjson_fast_path": fast,
+        }
+        results[name] = {}
+        for path, render in paths.items():
+            seconds, size = timed(render, args.repeat)
+            results[name][path] = {"ms": round(1000 * seconds, 1), "bytes": size}
+        baseline = results[name]["response_model"]["ms"]
+        for path in paths:
+            results[name][path]["speedup"] = round(baseline / results[name][path]["ms"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--versions", type=int, default=3, help="versions per note")
+    parser.add_argument("--size", type=int, default=500, help="characters per note and version")
+    parser.add_argument("--repeat", type=int, default=5)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
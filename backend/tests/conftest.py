@@ -1,4 +1,11 @@
+import asyncio
+import json
+import socket
+import httpx
 import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
@@ -6,10 +13,19 @@ from app.main import app
 from app.database import Base, get_db
 from app.models import Note, NoteVersion
 from app.config import TEST_DATABASE_URL
+from app.services.analytics_cache import AnalyticsCache
+from app.services.gemini_summerizer import GeminiClient
+from app.services.summary_cache import SummaryCache
+from app.services.jobs import JobQueue
+from app.services.search import SearchIndex
+from app.services.embeddings import EmbeddingIndex
+from app.services.response_cache import MemoryResponseCache
+from app.services.metrics import instrument_engine
 
 
 test_engine = create_async_engine(TEST_DATABASE_URL, echo=True, future=True)
 TestingSessionLocal = sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False)
+instrument_engine(test_engine, "test")
 
 
 @pytest.fixture(scope="function")
@@ -34,3 +50,160 @@ async def override_get_db(test_db_session):
     app.dependency_overrides[get_db] = _get_db
     yield
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="function", autouse=True)
+def search_index():
+    # Every note write goes through the index, and the test database starts empty.
+    app.state.search_index = SearchIndex()
+    yield app.state.search_index
+    del app.state.search_index
+
+
+@pytest.fixture(scope="function", autouse=True)
+def embedding_index():
+    app.state.embedding_index = EmbeddingIndex(path=None)
+    yield app.state.embedding_index
+    del app.state.embedding_index
+
+
+@pytest.fixture(scope="function", autouse=True)
+def response_cache():
+    app.state.response_cache = MemoryResponseCache()
+    yield app.state.response_cache
+    del app.state.response_cache
+
+
+@pytest.fixture(scope="function")
+def analytics_cache():
+    app.state.analytics_cache = AnalyticsCache()
+    yield app.state.analytics_cache
+    del app.state.analytics_cache
+
+
+class FakeGemini:
+    """Local stand-in for the Gemini generateContent API.
+
+    Queued replies are served in order; once exhausted, every call succeeds
+    with ``responder(prompt)`` if set, else ``summary_text``. Streamed calls
+    send ``stream_chunks`` as server-sent events; when ``stream_gate`` is set,
+    the stream pauses after the first chunk until the gate opens.
+    """
+
+    def __init__(self):
+        self.app = FastAPI()
+        self.requests = []
+        self.replies = []
+        self.summary_text = "This is a summary"
+        self.responder = None
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.stream_chunks = ["This is ", "a summary"]
+        self.stream_gate: asyncio.Event | None = None
+        self.streams_started = 0
+        self.streams_finished = 0
+        self.streams_aborted = 0
+
+        @self.app.post("/models/{model_action}")
+        async def generate(model_action: str, request: Request):
+            received = {"path": model_action, "params": dict(request.query_params), "body": await request.json()}
+            self.requests.append(received)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
+            if self.replies:
+                return self.replies.pop(0)
+            if model_action.endswith(":streamGenerateContent"):
+                return StreamingResponse(self.stream(), media_type="text/event-stream")
+            text = self.responder(self.prompt_of(received)) if self.responder else self.summary_text
+            return JSONResponse({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def stream(self):
+        self.streams_started += 1
+        try:
+            for i, chunk in enumerate(self.stream_chunks):
+                if i == 1 and self.stream_gate is not None:
+                    await self.stream_gate.wait()
+                event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+                yield f"data: {json.dumps(event)}\r\n\r\n"
+            self.streams_finished += 1
+        except asyncio.CancelledError:
+            self.streams_aborted += 1
+            raise
+
+    def reply(self, status_code: int = 200, json: dict | None = None, text: str | None = None, headers: dict | None = None):
+        if json is not None:
+            self.replies.append(JSONResponse(json, status_code=status_code, headers=headers))
+        else:
+            self.replies.append(Response(text or "", status_code=status_code, headers=headers))
+
+    @staticmethod
+    def prompt_of(request: dict) -> str:
+        return request["body"]["contents"][0]["parts"][0]["text"]
+
+
+@pytest.fixture(scope="function")
+def fake_gemini():
+    return FakeGemini()
+
+
+@pytest.fixture(scope="function")
+async def gemini_client(fake_gemini):
+    client = GeminiClient(
+        api_key="test-key",
+        base_url="http://gemini.test",
+        retry_base_delay=0,
+        transport=httpx.ASGITransport(fake_gemini.app),
+    )
+    app.state.gemini_client = client
+    yield client
+    await client.aclose()
+    del app.state.gemini_client
+
+
+@pytest.fixture(scope="function")
+async def live_server():
+    """Serve apps over real TCP on localhost; ASGITransport buffers whole responses, so streaming needs this."""
+    running = []
+
+    async def start(asgi_app) -> str:
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        server = uvicorn.Server(uvicorn.Config(asgi_app, lifespan="off", log_level="warning"))
+        running.append((server, asyncio.create_task(server.serve(sockets=[sock]))))
+        while not server.started:
+            await asyncio.sleep(0.01)
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    yield start
+    for server, task in running:
+        server.should_exit = True
+        await task
+
+
+@pytest.fixture(scope="function")
+async def live_gemini_client(fake_gemini, live_server):
+    client = GeminiClient(api_key="test-key", base_url=await live_server(fake_gemini.app), retry_base_delay=0)
+    app.state.gemini_client = client
+    yield client
+    await client.aclose()
+    del app.state.gemini_client
+
+
+@pytest.fixture(scope="function")
+def summary_cache():
+    app.state.summary_cache = SummaryCache()
+    yield app.state.summary_cache
+    del app.state.summary_cache
+
+
+@pytest.fixture(scope="function")
+async def job_queue(test_db_session):
+    app.state.job_queue = JobQueue(TestingSessionLocal, app.state, workers=0, poll_interval=0.01)
+    yield app.state.job_queue
+    await app.state.job_queue.stop()
+    del app.state.job_queue
@@ -1,6 +1,14 @@
+import asyncio
 import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import delete
+from app.crud import create_note, create_notes, delete_note, update_note
+from app.models import CorpusStats, TermFrequency
+from app.schemas import NoteCreate, NoteUpdate
+from app.services import aggregates
 from app.services.analytics import NoteAnalytics
-from app.models import Note
+from app.services.analytics_cache import AnalyticsCache
+from app.main import app
 
 
 @pytest.fixture
@@ -8,14 +16,13 @@ def note_analytics(test_db_session):
     return NoteAnalytics(test_db_session)
 
 
-@pytest.mark.asyncio
-async def test_get_word_count(note_analytics, test_db_session):
-    note1 = Note(title="title", content="Hello world")
-    note2 = Note(title="title", content="This is a test note")
+async def add_notes(db, *contents):
+    return [await create_note(db, NoteCreate(title="title", content=content)) for content in contents]
 
-    test_db_session.add_all([note1, note2])
 
-    await test_db_session.commit()
+@pytest.mark.asyncio
+async def test_get_word_count(note_analytics, test_db_session):
+    await add_notes(test_db_session, "Hello world", "This is a test note")
 
     result = await note_analytics.get_word_count()
     assert result == 7
@@ -29,12 +36,7 @@ async def test_get_word_count_empty_db(note_analytics):
 
 @pytest.mark.asyncio
 async def test_get_average_length(note_analytics, test_db_session):
-    note1 = Note(title="title", content="Short")
-    note2 = Note(title="title", content="This is longer")
-
-    test_db_session.add_all([note1, note2])
-
-    await test_db_session.commit()
+    await add_notes(test_db_session, "Short", "This is longer")
 
     result = await note_analytics.get_average_length()
     assert result == (5 + 14) / 2
@@ -48,18 +50,15 @@ async def test_get_average_length_empty_db(note_analytics):
 
 @pytest.mark.asyncio
 async def test_get_top_notes(note_analytics, test_db_session):
-    notes = [
-        Note(title="title", content="shortest"),
-        Note(title="title", content="much longer note"),
-        Note(title="title", content="a bit longer than short"),
-        Note(title="title", content="short"),
-        Note(title="title", content="small"),
-        Note(title="title", content="bigger one note"),
-    ]
-
-    test_db_session.add_all(notes)
-
-    await test_db_session.commit()
+    notes = await add_notes(
+        test_db_session,
+        "shortest",
+        "much longer note",
+        "a bit longer than short",
+        "short",
+        "small",
+        "bigger one note",
+    )
 
     result = await note_analytics.get_top_notes()
 
@@ -74,13 +73,20 @@ async def test_get_top_notes(note_analytics, test_db_session):
 
 
 @pytest.mark.asyncio
-async def test_get_character_count(note_analytics, test_db_session):
-    note1 = Note(title="title", content="abc")
-    note2 = Note(title="title", content="defg")
+async def test_top_notes_follow_content_counts(note_analytics, test_db_session):
+    note, = await add_notes(test_db_session, "one two")
+    await create_notes(test_db_session, [NoteCreate(title="title", content="three four five")])
+    await update_note(test_db_session, note.id, NoteUpdate(content="one two three four five six"))
 
-    test_db_session.add_all([note1, note2])
+    result = await note_analytics.get_top_notes(top_n=1)
 
-    await test_db_session.commit()
+    assert (note.char_count, note.word_count) == (27, 6)
+    assert result == {"longest": [{"id": note.id, "length": 27}], "shortest": [{"id": 2, "length": 15}]}
+
+
+@pytest.mark.asyncio
+async def test_get_character_count(note_analytics, test_db_session):
+    await add_notes(test_db_session, "abc", "defg")
 
     result = await note_analytics.get_character_count()
     assert result == 7
@@ -94,15 +100,7 @@ async def test_get_character_count_empty_db(note_analytics):
 
 @pytest.mark.asyncio
 async def test_get_median_length(note_analytics, test_db_session):
-    notes = [
-        Note(title="title", content="a"),
-        Note(title="title", content="abcd"),
-        Note(title="title", content="abcdefg"),
-    ]
-
-    test_db_session.add_all(notes)
-
-    await test_db_session.commit()
+    await add_notes(test_db_session, "a", "abcd", "abcdefg")
 
     result = await note_analytics.get_median_length()
     assert result == 4
@@ -112,3 +110,125 @@ async def test_get_median_length(note_analytics, test_db_session):
 async def test_get_median_length_empty_db(note_analytics):
     result = await note_analytics.get_median_length()
     assert result == 0
+
+
+@pytest.mark.asyncio
+async def test_get_median_length_even_count(note_analytics, test_db_session):
+    await add_notes(test_db_session, "ab", "abcd", "abcdef", "abcdefgh")
+
+    result = await note_analytics.get_median_length()
+    assert result == 5
+
+
+@pytest.mark.asyncio
+async def test_get_common_ngrams(note_analytics, test_db_session):
+    await add_notes(test_db_session, "red apple pie", "red apple tart", "red apple")
+
+    assert set(await note_analytics.get_most_common_words(top_n=2)) == {"red", "apple"}
+    assert (await note_analytics.get_common_bigrams(top_n=1)) == ["red apple"]
+    assert set(await note_analytics.get_common_trigrams()) == {"red apple pie", "red apple tart"}
+
+
+@pytest.mark.asyncio
+async def test_ngrams_do_not_cross_note_boundaries(note_analytics, test_db_session):
+    await add_notes(test_db_session, "alpha beta", "gamma delta")
+
+    assert "beta gamma" not in await note_analytics.get_common_bigrams()
+
+
+@pytest.mark.asyncio
+async def test_aggregates_follow_updates_and_deletes(test_db_session):
+    note, other = await add_notes(test_db_session, "one two three", "four five")
+
+    await update_note(test_db_session, note.id, NoteUpdate(content="one two"))
+    await delete_note(test_db_session, other.id)
+
+    stats = await aggregates.get_corpus_stats(test_db_session)
+    assert stats == {"note_count": 1, "char_count": 7, "word_count": 2}
+    assert await aggregates.get_median_length(test_db_session, stats["note_count"]) == 7
+    assert await aggregates.get_top_terms(test_db_session, 3, 10) == []
+    assert set(await aggregates.get_top_terms(test_db_session, 1, 10)) == {"one", "two"}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental_aggregates(test_db_session):
+    note, _ = await add_notes(test_db_session, "the quick brown fox", "the lazy dog")
+    await update_note(test_db_session, note.id, NoteUpdate(content="the quick red fox"))
+
+    incremental_stats = await aggregates.get_corpus_stats(test_db_session)
+    incremental_bigrams = set(await aggregates.get_top_terms(test_db_session, 2, 100))
+
+    await aggregates.rebuild(test_db_session)
+
+    assert await aggregates.get_corpus_stats(test_db_session) == incremental_stats
+    assert set(await aggregates.get_top_terms(test_db_session, 2, 100)) == incremental_bigrams
+
+
+@pytest.mark.asyncio
+async def test_analytics_endpoint_cached_until_corpus_changes(override_get_db, analytics_cache, response_cache,
+                                                              test_db_session):
+    note, = await add_notes(test_db_session, "hello world")
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        first = await ac.get("/analytics/")
+        # Past the response cache, as in another API process.
+        response_cache.clear()
+        second = await ac.get("/analytics/")
+        await ac.put(f"/notes/{note.id}", json={"content": "hello there world"})
+        third = await ac.get("/analytics/")
+        stats = await ac.get("/analytics/cache")
+
+    assert first.json() == second.json()
+    assert first.json()["total_word_count"] == 2
+    assert third.json()["total_word_count"] == 3
+    assert stats.json()["hits"] == 1
+    assert stats.json()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_analytics_cache_single_flights_concurrent_misses():
+    cache = AnalyticsCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    results = await asyncio.gather(*(cache.get_or_compute("summary", 1, compute) for _ in range(10)))
+
+    assert calls == 1
+    assert all(result == {"value": 1} for result in results)
+    assert cache.stats()["coalesced"] == 9
+
+
+@pytest.mark.asyncio
+async def test_analytics_cache_does_not_store_failures():
+    cache = AnalyticsCache()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def succeeding():
+        return 42
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("summary", 1, failing)
+
+    assert await cache.get_or_compute("summary", 1, succeeding) == 42
+
+
+@pytest.mark.asyncio
+async def test_ensure_built_counts_notes_written_before_the_aggregates(test_db_session):
+    # As right after the migration: notes exist, the aggregate tables are empty.
+    await add_notes(test_db_session, "alpha beta", "beta gamma")
+    await test_db_session.execute(delete(CorpusStats))
+    await test_db_session.execute(delete(TermFrequency))
+    await test_db_session.commit()
+
+    await aggregates.ensure_built(test_db_session)
+    await update_note(test_db_session, (await add_notes(test_db_session, "delta"))[0].id, NoteUpdate(content="beta"))
+
+    assert await aggregates.get_corpus_stats(test_db_session) == {"note_count": 3, "char_count": 24, "word_count": 5}
+    assert await aggregates.get_top_terms(test_db_session, 1, 3) == ["beta", "alpha", "gamma"]
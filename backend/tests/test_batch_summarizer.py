@@ -0,0 +1,124 @@
+import json
+import pytest
+import re
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event
+from app.main import app
+from app.models import Note
+from app.services.batch_summarizer import BATCH_PROMPT, pack_groups, parse_batch_response
+from app.services.gemini_summerizer import GeminiAPIError
+from app.services.summary_cache import SummaryCache
+
+
+def batch_responder(prompt):
+    texts = re.findall(r"### Text \d+\n(.*?)(?=\n\n### Text|\Z)", prompt, re.S)
+    if texts:
+        return json.dumps([f"summary of {text}" for text in texts])
+    return "summary of " + prompt.rsplit("\n\n", 1)[-1]
+
+
+async def add_notes(db, *contents):
+    notes = [Note(title="title", content=content) for content in contents]
+    db.add_all(notes)
+    await db.commit()
+    return notes
+
+
+async def post_batch(note_ids):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/summarizer/batch", json={"note_ids": note_ids})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return {line["note_id"]: line for line in map(json.loads, response.text.splitlines())}
+
+
+@pytest.mark.asyncio
+async def test_batch_packs_and_dedupes_notes(override_get_db, fake_gemini, gemini_client, summary_cache,
+                                             test_db_session):
+    fake_gemini.responder = batch_responder
+    first, duplicate, other = await add_notes(test_db_session, "alpha", "alpha", "beta")
+
+    results = await post_batch([first.id, duplicate.id, other.id, 9999])
+
+    assert len(fake_gemini.requests) == 1
+    assert results[first.id] == {"note_id": first.id, "summary": "summary of alpha", "cached": False}
+    assert results[duplicate.id]["summary"] == "summary of alpha"
+    assert results[other.id]["summary"] == "summary of beta"
+    assert results[9999] == {"note_id": 9999, "error": "Note not found"}
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_cached_summaries(override_get_db, fake_gemini, gemini_client, summary_cache,
+                                             test_db_session):
+    fake_gemini.responder = batch_responder
+    note, = await add_notes(test_db_session, "gamma")
+
+    await post_batch([note.id])
+    results = await post_batch([note.id])
+
+    assert results[note.id] == {"note_id": note.id, "summary": "summary of gamma", "cached": True}
+    assert len(fake_gemini.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_looks_up_cached_summaries_in_one_query(override_get_db, fake_gemini, gemini_client,
+                                                            summary_cache, test_db_session):
+    fake_gemini.responder = batch_responder
+    notes = await add_notes(test_db_session, *(f"note {i}" for i in range(5)))
+    await post_batch([note.id for note in notes])
+    # As in another API process: nothing in memory, everything in the summaries table.
+    app.state.summary_cache = SummaryCache()
+    lookups = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM summaries" in statement:
+            lookups.append(statement)
+
+    event.listen(test_db_session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        results = await post_batch([note.id for note in notes])
+    finally:
+        event.remove(test_db_session.bind.sync_engine, "before_cursor_execute", record)
+
+    assert all(results[note.id]["cached"] for note in notes)
+    assert len(lookups) == 1
+    assert len(fake_gemini.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_falls_back_to_single_prompts(override_get_db, fake_gemini, gemini_client, summary_cache,
+                                                  test_db_session):
+    fake_gemini.summary_text = "not a json array"
+    first, second = await add_notes(test_db_session, "one", "two")
+
+    results = await post_batch([first.id, second.id])
+
+    assert len(fake_gemini.requests) == 3
+    assert results[first.id]["summary"] == "not a json array"
+    assert results[second.id]["summary"] == "not a json array"
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_upstream_errors_per_note(override_get_db, fake_gemini, gemini_client, summary_cache,
+                                                      test_db_session):
+    note, = await add_notes(test_db_session, "delta")
+    fake_gemini.reply(status_code=400, json={"error": "bad request"})
+
+    results = await post_batch([note.id])
+
+    assert results[note.id] == {"note_id": note.id, "error": "Generation failed"}
+
+
+def test_pack_groups_respects_budget():
+    items = [("a", "x" * 10), ("b", "x" * 10), ("c", "x" * 10), ("long", "x" * 100)]
+
+    groups = pack_groups(items, char_budget=25, max_notes=5)
+
+    assert sorted([key for key, _ in group] for group in groups) == [["a", "b"], ["c"], ["long"]]
+
+
+def test_parse_batch_response():
+    assert parse_batch_response('```json\n["one", "two"]\n```', 2) == ["one", "two"]
+    with pytest.raises(GeminiAPIError):
+        parse_batch_response('["only one"]', 2)
+    assert "3 texts" in BATCH_PROMPT.format(count=3)
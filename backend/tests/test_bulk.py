@@ -0,0 +1,77 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.services import aggregates, bulk
+
+
+def ndjson(*rows) -> str:
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_ndjson_reports_invalid_rows(override_get_db, search_index, test_db_session):
+    body = ndjson(
+        {"title": "First", "content": "alpha note"},
+        "{not json",
+        {"title": "", "content": "missing title"},
+        {"title": "Second", "content": "beta note"},
+    )
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/notes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+        notes_response = await ac.get("/notes/")
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (2, 2)
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert result["errors"][0]["error"].startswith("Invalid JSON")
+    assert [note["title"] for note in notes_response.json()] == ["First", "Second"]
+    assert len(search_index.search(["note"], 10)) == 2
+    assert (await aggregates.get_corpus_stats(test_db_session))["note_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_csv_with_quoted_newlines(override_get_db):
+    body = 'title,content\r\nPlain,one line\r\n"Quoted, title","first line\nsecond ""line"""\r\nBroken\r\n'
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post("/notes/bulk", content=body, headers={"Content-Type": "text/csv"})
+        note_response = await ac.get("/notes/2")
+
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (2, 1)
+    assert result["errors"][0]["line"] == 5
+    assert note_response.json()["title"] == "Quoted, title"
+    assert note_response.json()["content"] == 'first line\nsecond "line"'
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_splits_batches_and_chunks(test_db_session):
+    async def chunks():
+        # Lines split across arbitrary chunk boundaries.
+        body = ndjson(*({"title": f"Note {i}", "content": f"content {i}"} for i in range(5))).encode()
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    result = await bulk.import_notes(test_db_session, chunks(), batch_size=2)
+
+    assert result == {"inserted": 5, "failed": 0, "errors": []}
+
+
+@pytest.mark.asyncio
+async def test_export_round_trips_with_versions(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        await ac.post("/notes/bulk", content=ndjson(*({"title": f"Note {i}", "content": f"v0 {i}"} for i in range(3))))
+        await ac.put("/notes/1", json={"content": "v1 0"})
+        await ac.put("/notes/1", json={"content": "v2 0"})
+        plain_response = await ac.get("/notes/export")
+        versions_response = await ac.get("/notes/export", params={"include_versions": True})
+
+    assert plain_response.headers["content-type"].startswith("application/x-ndjson")
+    plain = [json.loads(line) for line in plain_response.text.splitlines()]
+    assert [(note["id"], note["content"]) for note in plain] == [(1, "v2 0"), (2, "v0 1"), (3, "v0 2")]
+    assert "versions" not in plain[0]
+
+    exported = [json.loads(line) for line in versions_response.text.splitlines()]
+    assert [version["content"] for version in exported[0]["versions"]] == ["v1 0", "v0 0"]
+    assert exported[1]["versions"] == []
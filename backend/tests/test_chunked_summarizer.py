@@ -0,0 +1,110 @@
+import httpx
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.models import Note
+from app.services.chunked_summarizer import CHUNK_PROMPT, REDUCE_PROMPT, map_chunks, split_chunks
+from app.services.summary_cache import SummaryCache
+
+
+def long_text(paragraphs: int = 25, edit: int | None = None) -> str:
+    return "\n\n".join(
+        " ".join(
+            f"Sentence {p}.{s} {'was edited and now' if (p, s) == (edit, 3) else ''} covers topic {(p * s) % 7} in detail."
+            for s in range(8)
+        )
+        for p in range(paragraphs)
+    )
+
+
+def respond(prompt: str) -> str:
+    if prompt.startswith(REDUCE_PROMPT):
+        return "Combined summary"
+    return "Part about " + prompt[len(CHUNK_PROMPT):].split()[1]
+
+
+def test_short_text_is_one_chunk():
+    assert split_chunks("Short note.", max_chars=100) == ["Short note."]
+
+
+@pytest.mark.parametrize("text", [long_text(), long_text().replace("\n\n", " ")], ids=["paragraphs", "one_paragraph"])
+def test_split_chunks_respects_size_and_keeps_text(text):
+    chunks = split_chunks(text, max_chars=1000)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_edit_only_changes_nearby_chunks():
+    before = split_chunks(long_text(), max_chars=1000)
+    after = split_chunks(long_text(edit=12), max_chars=1000)
+
+    changed = set(after) - set(before)
+    assert len(before) >= 8
+    assert 1 <= len(changed) <= 2
+
+
+@pytest.mark.asyncio
+async def test_long_note_is_map_reduced_and_chunks_are_reused(fake_gemini, gemini_client, test_db_session):
+    fake_gemini.responder = respond
+    cache = SummaryCache()
+    chunk_count = len(split_chunks(long_text()))
+
+    summary, cached = await cache.summarize(test_db_session, gemini_client, long_text())
+    first_calls = len(fake_gemini.requests)
+    await cache.summarize(test_db_session, gemini_client, long_text(edit=12))
+    edit_calls = len(fake_gemini.requests) - first_calls
+
+    assert (summary, cached) == ("Combined summary", False)
+    assert chunk_count > 2
+    assert first_calls == chunk_count + 1
+    reduce = fake_gemini.prompt_of(fake_gemini.requests[first_calls - 1])
+    assert reduce.startswith(REDUCE_PROMPT) and "### Part 1\nPart about 0.0" in reduce
+    assert 2 <= edit_calls <= 3
+
+
+@pytest.mark.asyncio
+async def test_map_chunks_runs_concurrently_under_cap(fake_gemini, gemini_client):
+    fake_gemini.delay = 0.02
+    chunks = {str(i): f"chunk {i}" for i in range(6)}
+
+    summaries, error = await map_chunks(gemini_client, chunks, concurrency=3)
+
+    assert error is None
+    assert list(summaries) == list(chunks)
+    assert fake_gemini.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_keeps_the_others_cached(fake_gemini, gemini_client, test_db_session):
+    fake_gemini.responder = respond
+    fake_gemini.reply(status_code=400, json={"error": "bad request"})
+    cache = SummaryCache()
+    chunk_count = len(split_chunks(long_text()))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await cache.summarize(test_db_session, gemini_client, long_text())
+    summary, _ = await SummaryCache().summarize(test_db_session, gemini_client, long_text())
+
+    assert summary == "Combined summary"
+    # The retry summarizes only the failed chunk, from a fresh process cache, then reduces.
+    assert len(fake_gemini.requests) == chunk_count + 2
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_streams_reduce_of_long_note(override_get_db, fake_gemini, gemini_client,
+                                                           summary_cache, test_db_session):
+    fake_gemini.responder = respond
+    note = Note(title="Long", content=long_text())
+    test_db_session.add(note)
+    await test_db_session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post(f"/summarizer/{note.id}/stream")
+
+    last = fake_gemini.requests[-1]
+    assert last["path"].endswith(":streamGenerateContent")
+    assert fake_gemini.prompt_of(last).startswith(REDUCE_PROMPT)
+    assert len(fake_gemini.requests) == len(split_chunks(long_text())) + 1
+    assert '"summary": "This is a summary"' in response.text
@@ -0,0 +1,82 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event, text
+from app import crud
+from app.main import app
+from app.schemas import NoteCreate, NoteUpdate
+
+
+def concurrent_writer(session, note_id: int, content: str, times: int = 1):
+    """Stand-in for another request updating the note between our read and our flush.
+
+    It writes on our own connection, so a failed attempt rolls it back too.
+    """
+    writes = {"left": times}
+
+    @event.listens_for(session.sync_session, "before_flush")
+    def write(sync_session, *_):
+        if writes["left"]:
+            writes["left"] -= 1
+            sync_session.connection().execute(
+                text("UPDATE notes SET content = :content, revision = revision + 1 WHERE id = :id"),
+                {"content": content, "id": note_id},
+            )
+
+
+@pytest.mark.asyncio
+async def test_put_with_if_match(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Title", "content": "first"})
+        note_id = create_response.json()["id"]
+        get_response = await ac.get(f"/notes/{note_id}")
+        update_response = await ac.put(f"/notes/{note_id}", json={"content": "second"},
+                                       headers={"If-Match": get_response.headers["ETag"]})
+        stale_response = await ac.put(f"/notes/{note_id}", json={"content": "lost"},
+                                      headers={"If-Match": get_response.headers["ETag"]})
+        any_response = await ac.put(f"/notes/{note_id}", json={"content": "third"}, headers={"If-Match": "*"})
+        history_response = await ac.get(f"/history/{note_id}")
+
+    assert create_response.headers["ETag"] == get_response.headers["ETag"] == '"1"'
+    assert update_response.status_code == 200
+    assert update_response.headers["ETag"] == '"2"'
+    assert update_response.json()["revision"] == 2
+    assert stale_response.status_code == 412
+    assert stale_response.headers["ETag"] == '"2"'
+    assert any_response.status_code == 200
+    assert [version["content"] for version in history_response.json()] == ["second", "first"]
+
+
+@pytest.mark.asyncio
+async def test_if_match_is_checked_by_the_update_itself(test_db_session):
+    note_id = (await crud.create_note(test_db_session, NoteCreate(title="Title", content="first"))).id
+    concurrent_writer(test_db_session, note_id, "theirs")
+
+    with pytest.raises(crud.RevisionConflict) as conflict:
+        await crud.update_note(test_db_session, note_id, NoteUpdate(content="mine"), revisions={1})
+
+    assert conflict.value.note_id == note_id
+    stored = await test_db_session.execute(text("SELECT content, revision FROM notes"))
+    assert tuple(stored.one()) == ("first", 1)
+
+
+@pytest.mark.asyncio
+async def test_unconditional_update_retries_lost_race(test_db_session):
+    note = await crud.create_note(test_db_session, NoteCreate(title="Title", content="first"))
+    concurrent_writer(test_db_session, note.id, "theirs")
+
+    updated = await crud.update_note(test_db_session, note.id, NoteUpdate(content="mine"))
+
+    assert (updated.content, updated.revision) == ("mine", 2)
+    versions, _ = await crud.get_note_versions(test_db_session, note.id, 10)
+    assert [version.content for version in versions] == ["first"]
+
+
+@pytest.mark.asyncio
+async def test_unconditional_update_gives_up_after_repeated_conflicts(override_get_db, test_db_session):
+    note_id = (await crud.create_note(test_db_session, NoteCreate(title="Title", content="first"))).id
+    concurrent_writer(test_db_session, note_id, "theirs", times=crud.UPDATE_ATTEMPTS)
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.put(f"/notes/{note_id}", json={"content": "mine"})
+
+    assert response.status_code == 409
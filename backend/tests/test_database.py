@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.database import MonitoredPool
+
+
+@pytest.mark.asyncio
+async def test_monitored_pool_reports_saturation_and_timeouts(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=MonitoredPool,
+                                 pool_size=1, max_overflow=0, pool_timeout=0.05)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            busy = engine.pool.stats()
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        stats = engine.pool.stats()
+    finally:
+        await engine.dispose()
+
+    assert busy["checked_out"] == 1
+    assert busy["saturation"] == 1.0
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.05
@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.services import embeddings
+from app.services.embeddings import EmbeddingIndex, HashingEmbedder, VectorStore
+
+
+NOTES = [
+    ("Pasta", "Boil the pasta, then add tomato sauce, garlic and fresh basil."),
+    ("Pizza", "Bake the pizza dough with tomato sauce, garlic, basil and mozzarella."),
+    ("Python", "Use asyncio tasks and an event loop to run coroutines concurrently."),
+    ("Async", "An event loop schedules coroutines; asyncio tasks wrap them."),
+]
+
+
+async def create_notes(ac):
+    ids = []
+    for title, content in NOTES:
+        response = await ac.post("/notes/", json={"title": title, "content": content})
+        ids.append(response.json()["id"])
+    return ids
+
+
+def clustered_vectors(count: int, dimension: int = 32, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.asyncio
+async def test_similar_notes(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac)
+        response = await ac.get(f"/notes/{ids[0]}/similar", params={"limit": 2})
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["id"] for result in results] == [ids[1], results[1]["id"]]
+    assert results[0]["title"] == "Pizza"
+    assert ids[0] not in [result["id"] for result in results]
+
+
+@pytest.mark.asyncio
+async def test_semantic_search(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac)
+        response = await ac.get("/notes/semantic-search", params={"q": "asyncio event loop", "limit": 2})
+
+    assert {result["id"] for result in response.json()} == {ids[2], ids[3]}
+
+
+@pytest.mark.asyncio
+async def test_similar_notes_follow_writes(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac)
+        await ac.put(f"/notes/{ids[1]}", json={"content": "Coroutines and tasks on the asyncio event loop."})
+        await ac.delete(f"/notes/{ids[3]}")
+        response = await ac.get(f"/notes/{ids[2]}/similar", params={"limit": 1})
+        missing_response = await ac.get(f"/notes/{ids[3]}/similar")
+
+    assert [result["id"] for result in response.json()] == [ids[1]]
+    assert missing_response.status_code == 404
+    assert missing_response.json() == {"detail": "Note not found."}
+
+
+@pytest.mark.asyncio
+async def test_sync_embeds_missing_and_drops_deleted(test_db_session, override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac)
+    index = EmbeddingIndex(path=None)
+    index.add(9999, "Gone", "deleted meanwhile")
+
+    await index.sync(test_db_session)
+
+    assert sorted(index.store.slots) == sorted(ids)
+
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    embedder = HashingEmbedder(64)
+    vectors = embedder.embed(["some words here", "some words here", ""])
+
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_ivf_search_matches_exact_when_probing_every_list():
+    vectors = clustered_vectors(2000)
+    index = EmbeddingIndex(HashingEmbedder(32), path=None)
+    index.add_vectors(list(range(2000)), vectors)
+    exact = index.search(vectors[0], 10)
+
+    index.train()
+    list_count = len(index.centroids)
+
+    assert list_count == 44
+    assert index.search(vectors[0], 10, nprobe=list_count) == exact
+    approximate = {note_id for note_id, _ in index.search(vectors[0], 10, nprobe=4)}
+    assert len(approximate & {note_id for note_id, _ in exact}) >= 8
+
+
+def test_ivf_lists_follow_updates_and_removals():
+    vectors = clustered_vectors(500)
+    index = EmbeddingIndex(HashingEmbedder(32), path=None)
+    index.add_vectors(list(range(500)), vectors)
+    index.train()
+
+    index.add_vectors([0], vectors[1:2])
+    index.remove(1)
+
+    results = index.search(vectors[1], 2, nprobe=len(index.centroids))
+    assert results[0][0] == 0
+    assert 1 not in [note_id for note_id, _ in results]
+    assert sum(len(members) for members in index._lists) == 499
+
+
+def test_vector_store_memory_maps_and_grows(tmp_path):
+    vectors = clustered_vectors(10, dimension=8)
+    store = VectorStore(8, str(tmp_path), capacity=4)
+    for note_id, vector in enumerate(vectors):
+        store.put(note_id + 100, vector)
+    store.delete(103)
+    store.flush()
+
+    reopened = VectorStore(8, str(tmp_path), capacity=4)
+
+    assert len(reopened.ids) == 16
+    assert sorted(reopened.slots) == [100, 101, 102] + list(range(104, 110))
+    assert np.array_equal(reopened.vectors[reopened.slots[105]], vectors[5])
+    assert reopened.put(200, vectors[0]) == 3
+
+
+def test_embedding_index_persists_training(tmp_path):
+    vectors = clustered_vectors(300)
+    index = EmbeddingIndex(HashingEmbedder(32), path=str(tmp_path))
+    index.add_vectors(list(range(300)), vectors)
+    index.train()
+    expected = index.search(vectors[7], 5)
+
+    reopened = EmbeddingIndex(HashingEmbedder(32), path=str(tmp_path))
+
+    assert reopened.trained_size == 300
+    assert reopened.search(vectors[7], 5) == expected
+    assert len(EmbeddingIndex(HashingEmbedder(16), path=str(tmp_path))) == 0
+
+
+@pytest.mark.asyncio
+async def test_training_runs_off_the_request_path(monkeypatch):
+    monkeypatch.setattr(embeddings, "IVF_MIN_SIZE", 400)
+    vectors = clustered_vectors(600)
+    index = EmbeddingIndex(HashingEmbedder(32), path=None)
+    index.add_vectors(list(range(399)), vectors[:399])
+
+    index.add_vectors([399], vectors[399:400])
+    training = index._training
+    exact_while_training = index.search(vectors[0], 5)
+    index.add_vectors(list(range(400, 600)), vectors[400:])
+    index.remove(3)
+    await training
+
+    assert exact_while_training[0][0] == 0
+    assert index.centroids is not None and index.trained_size == 400
+    assert index._training is None
+    assert sum(len(members) for members in index._lists) == 599
+    assert index.search(vectors[500], 1, nprobe=len(index.centroids))[0][0] == 500
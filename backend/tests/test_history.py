@@ -1,7 +1,10 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+from app.config import HISTORY_SNAPSHOT_INTERVAL
 from app.models import Note, NoteVersion
 from app.main import app
+from app.services import history
 
 
 @pytest.mark.asyncio
@@ -24,8 +27,8 @@ async def test_get_note_history(test_db_session, override_get_db):
 
     data = response.json()
     assert len(data) == 2
-    assert data[0]["content"] == "Version 1"
-    assert data[1]["content"] == "Version 2"
+    assert data[0]["content"] == "Version 2"
+    assert data[1]["content"] == "Version 1"
 
 
 @pytest.mark.asyncio
@@ -35,3 +38,117 @@ async def test_get_note_history_not_found(test_db_session, override_get_db):
 
     assert response.status_code == 404
     assert response.json() == {"detail": "Note history not found."}
+
+
+@pytest.mark.asyncio
+async def test_history_stores_deltas_and_returns_full_contents(test_db_session, override_get_db):
+    contents = [f"Paragraph one stays the same. Edit number {i} changes this line." for i in range(25)]
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Edited", "content": contents[0]})
+        note_id = create_response.json()["id"]
+        for content in contents[1:]:
+            await ac.put(f"/notes/{note_id}", json={"content": content})
+        response = await ac.get(f"/history/{note_id}")
+
+    assert response.status_code == 200
+    assert [version["content"] for version in response.json()] == contents[-2::-1]
+
+    result = await test_db_session.execute(
+        select(NoteVersion).where(NoteVersion.note_id == note_id).order_by(NoteVersion.id)
+    )
+    versions = result.scalars().all()
+    assert [version.kind for version in versions] == [
+        "snapshot" if i % HISTORY_SNAPSHOT_INTERVAL == 0 else "delta" for i in range(len(versions))
+    ]
+    assert all(version.content_length == len(contents[i]) for i, version in enumerate(versions))
+    assert await test_db_session.scalar(select(Note.version_count).where(Note.id == note_id)) == len(versions)
+
+
+@pytest.mark.asyncio
+async def test_history_pages_are_reconstructed(override_get_db):
+    contents = [f"Shared opening words. Revision {i} of the note body." for i in range(2 * HISTORY_SNAPSHOT_INTERVAL + 4)]
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Edited", "content": contents[0]})
+        note_id = create_response.json()["id"]
+        for content in contents[1:]:
+            await ac.put(f"/notes/{note_id}", json={"content": content})
+
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 7} if cursor is None else {"limit": 7, "cursor": cursor}
+            response = await ac.get(f"/history/{note_id}", params=params)
+            pages.append(response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+
+    assert [len(page) for page in pages] == [7, 7, 7, 2]
+    assert [version["content"] for page in pages for version in page] == contents[-2::-1]
+
+
+@pytest.mark.asyncio
+async def test_history_metadata_only(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Edited", "content": "short"})
+        note_id = create_response.json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "a little longer"})
+        await ac.put(f"/notes/{note_id}", json={"content": "final"})
+        response = await ac.get(f"/history/{note_id}", params={"metadata_only": True})
+
+    assert response.status_code == 200
+    assert [version["content_length"] for version in response.json()] == [len("a little longer"), len("short")]
+    assert all("content" not in version for version in response.json())
+
+
+@pytest.mark.asyncio
+async def test_history_page_past_the_end_is_empty(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Edited", "content": "first"})
+        note_id = create_response.json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        first_page = await ac.get(f"/history/{note_id}")
+        response = await ac.get(f"/history/{note_id}", params={"cursor": first_page.json()[-1]["id"]})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_history_versions_are_reconstructed(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Edited", "content": "one two three"})
+        note_id = create_response.json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "one two three four"})
+        update_response = await ac.put(f"/notes/{note_id}", json={"content": "zero one three four"})
+        get_response = await ac.get(f"/notes/{note_id}")
+        history_response = await ac.get(f"/history/{note_id}")
+
+    # Single-note responses leave the history to /history.
+    assert "versions" not in update_response.json()
+    assert "versions" not in get_response.json()
+    assert [version["content"] for version in history_response.json()] == ["one two three four", "one two three"]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_encode_version_round_trip(compress):
+    newer = "The quick brown fox jumps over the lazy dog.\nSecond line here." * 20
+    older = newer.replace("quick", "slow").replace("Second", "2nd") + " Trailing words."
+
+    delta = history.encode_version(older, newer, is_snapshot=False, compress=compress)
+    snapshot = history.encode_version(older, newer, is_snapshot=True, compress=compress)
+
+    assert delta["kind"] == "delta"
+    assert len(delta["payload"]) < len(older)
+    assert snapshot["kind"] == "snapshot"
+    for values in (delta, snapshot):
+        assert history.decode_version(NoteVersion(**values), newer) == older
+
+
+def test_encode_version_falls_back_to_snapshot_for_unrelated_text():
+    values = history.encode_version("completely different", "nothing in common at all", is_snapshot=False,
+                                    compress=False)
+
+    assert values["kind"] == "snapshot"
+    assert values["content"] == "completely different"
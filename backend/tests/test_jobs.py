@@ -0,0 +1,157 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from sqlalchemy import select
+from app.models import Job, Note
+from app.services.jobs import JOB_HANDLERS, utcnow
+
+
+async def wait_for_job(ac, job_id):
+    for _ in range(100):
+        response = await ac.get(f"/jobs/{job_id}")
+        if response.json()["status"] not in ("queued", "running"):
+            return response.json()
+        await asyncio.sleep(0.01)
+    raise AssertionError("Job did not finish")
+
+
+@pytest.mark.asyncio
+async def test_summarize_job_runs_in_background(override_get_db, job_queue, gemini_client, summary_cache,
+                                                test_db_session):
+    note = Note(title="Title", content="Some content")
+    test_db_session.add(note)
+    await test_db_session.commit()
+    # Submitting wakes the worker; a long poll keeps it idle (not mid-query) when the test tears down.
+    job_queue.workers, job_queue.poll_interval = 1, 5
+    job_queue.start()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        submit_response = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": note.id}})
+        job = await wait_for_job(ac, submit_response.json()["id"])
+        result_response = await ac.get(f"/jobs/{job['id']}/result")
+
+    assert submit_response.status_code == 202
+    assert submit_response.json()["status"] == "queued"
+    assert job["status"] == "succeeded"
+    assert result_response.json()["result"] == {"note_id": note.id, "summary": "This is a summary", "cached": False}
+
+
+@pytest.mark.asyncio
+async def test_analytics_job(override_get_db, job_queue, analytics_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        await ac.post("/notes/", json={"title": "Title", "content": "hello world"})
+        submit_response = await ac.post("/jobs/", json={"kind": "analytics"})
+        await job_queue.run_next()
+        result_response = await ac.get(f"/jobs/{submit_response.json()['id']}/result")
+
+    assert result_response.json()["result"]["total_word_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_jobs_are_deduplicated(override_get_db, job_queue):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        first = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": 1}})
+        second = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": 1}})
+        other = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": 2}})
+
+    assert first.json()["id"] == second.json()["id"]
+    assert other.json()["id"] != first.json()["id"]
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_jobs_run_first(override_get_db, job_queue, analytics_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        low = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": 1}})
+        high = await ac.post("/jobs/", json={"kind": "analytics", "priority": 10})
+        await job_queue.run_next()
+        low_job = await ac.get(f"/jobs/{low.json()['id']}")
+        high_job = await ac.get(f"/jobs/{high.json()['id']}")
+
+    assert low_job.json()["status"] == "queued"
+    assert high_job.json()["status"] == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_failed_job_reports_error(override_get_db, job_queue, gemini_client, summary_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        submit_response = await ac.post("/jobs/", json={"kind": "summarize", "params": {"note_id": 9999}})
+        await job_queue.run_next()
+        job_response = await ac.get(f"/jobs/{submit_response.json()['id']}")
+        result_response = await ac.get(f"/jobs/{submit_response.json()['id']}/result")
+
+    assert job_response.json()["status"] == "failed"
+    assert "9999" in job_response.json()["error"]
+    assert result_response.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_job_validation_and_not_found(override_get_db, job_queue):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        invalid_kind = await ac.post("/jobs/", json={"kind": "unknown"})
+        missing_param = await ac.post("/jobs/", json={"kind": "summarize"})
+        missing_job = await ac.get("/jobs/does-not-exist")
+
+    assert invalid_kind.status_code == 422
+    assert missing_param.status_code == 422
+    assert missing_job.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_running_job_with_expired_lease_is_claimed_again(override_get_db, job_queue, analytics_cache,
+                                                              test_db_session):
+    stale = Job(id="stale", kind="analytics", params={}, dedupe_key="stale", status="running",
+                lease_expires_at=utcnow() - timedelta(seconds=1))
+    live = Job(id="live", kind="analytics", params={}, dedupe_key="live", status="running",
+               lease_expires_at=utcnow() + timedelta(seconds=60))
+    test_db_session.add_all([stale, live])
+    await test_db_session.commit()
+
+    assert await job_queue.run_next()
+    assert not await job_queue.run_next()
+
+    await test_db_session.refresh(stale)
+    await test_db_session.refresh(live)
+    assert stale.status == "succeeded"
+    assert stale.lease_expires_at is None
+    assert live.status == "running"
+
+
+@pytest.mark.asyncio
+async def test_lease_is_renewed_while_the_job_runs(override_get_db, job_queue, test_db_session, monkeypatch):
+    leases = []
+
+    async def slow(db, state, params):
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            result = await test_db_session.execute(select(Job.lease_expires_at).where(Job.id == job.id))
+            leases.append(result.scalar())
+        return {}
+
+    monkeypatch.setitem(JOB_HANDLERS, "slow", slow)
+    job_queue.lease_seconds = 0.06
+    job = await job_queue.submit(test_db_session, "slow", {})
+    await job_queue.run_next()
+
+    assert leases == sorted(leases)
+    assert leases[0] < leases[-1]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submit_returns_the_job_that_won(override_get_db, job_queue, test_db_session,
+                                                        monkeypatch):
+    first = await job_queue.submit(test_db_session, "analytics", {})
+    real_active_job = job_queue._active_job
+    calls = []
+
+    async def miss_once(db, key):
+        # The first lookup runs before the other submit commits.
+        calls.append(key)
+        return None if len(calls) == 1 else await real_active_job(db, key)
+
+    monkeypatch.setattr(job_queue, "_active_job", miss_once)
+    second = await job_queue.submit(test_db_session, "analytics", {})
+
+    assert second.id == first.id
+    assert len(calls) == 2
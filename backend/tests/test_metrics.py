@@ -0,0 +1,72 @@
+import asyncio
+import time
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.services import metrics
+from app.services.gemini_summerizer import GEMINI_CALL_DURATION, summarize_text
+
+
+@pytest.mark.asyncio
+async def test_render_text_format():
+    registry = metrics.Registry()
+    requests = metrics.Counter("requests_total", "Requests.", ("path",), registry=registry)
+    latency = metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+    requests.labels('/a"b').inc(2)
+    latency.observe(0.5)
+
+    text = metrics.render(registry=registry).decode()
+
+    assert '# TYPE requests_total counter\nrequests_total{path="/a\\"b"} 2.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in text
+    assert "latency_seconds_sum 0.5\nlatency_seconds_count 1" in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_and_queries(override_get_db, analytics_cache):
+    route = metrics.HTTP_REQUEST_DB_QUERIES.labels("GET", "/notes/{note_id}")
+    requests_before, queries_before = sum(route.counts), route.sum
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "hello"})).json()["id"]
+        await ac.get(f"/notes/{note_id}")
+        await ac.get(f"/notes/{note_id}")
+        await ac.get("/analytics/")
+        response = await ac.get("/metrics")
+
+    text = response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/notes/{note_id}",status="200"}' in text
+    assert 'http_requests_in_flight 1.0' in text
+    assert 'analytics_cache_lookups_total{result="miss"} 1' in text
+    assert 'response_cache_lookups_total{result="hit"} 1' in text
+    # The first read queries the note alone, without its versions; the second is a cache hit.
+    assert sum(route.counts) - requests_before == 2
+    assert route.sum - queries_before == 1
+
+
+@pytest.mark.asyncio
+async def test_gemini_calls_recorded_by_outcome(fake_gemini, gemini_client):
+    ok, failed = GEMINI_CALL_DURATION.labels("ok"), GEMINI_CALL_DURATION.labels("api_error")
+    ok_before, failed_before = sum(ok.counts), sum(failed.counts)
+    fake_gemini.reply(json={})
+
+    await summarize_text(gemini_client, "Some text.")
+    await summarize_text(gemini_client, "Some text.")
+
+    assert sum(failed.counts) - failed_before == 1
+    assert sum(ok.counts) - ok_before == 1
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_measured():
+    lag = metrics.EVENT_LOOP_LAG.labels()
+    before = lag.sum
+    monitor = asyncio.create_task(metrics.monitor_event_loop(0.01))
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+    await asyncio.sleep(0.02)
+    monitor.cancel()
+
+    assert lag.sum - before >= 0.03
@@ -0,0 +1,67 @@
+import pytest
+from collections import Counter
+from app.crud import create_note
+from app.schemas import NoteCreate
+from app.services.ngrams import NgramCounter, SpaceSaving, count_batch, count_terms, scan_notes
+
+
+def test_ngram_counter_counts_all_sizes_in_one_pass():
+    counter = NgramCounter()
+    counter.add_text("the cat sat")
+    counter.add_text("The cat ran")
+
+    assert counter.note_count == 2
+    assert counter.word_count == 6
+    assert set(counter.most_common(1, 2)) == {"the", "cat"}
+    assert counter.most_common(2, 1) == ["the cat"]
+    assert set(counter.most_common(3, 5)) == {"the cat sat", "the cat ran"}
+    assert len(counter.vocabulary) == 4
+
+
+def test_count_batch_matches_per_note_counts():
+    contents = ["alpha beta gamma", "beta gamma delta"]
+
+    batch = count_batch(contents)
+
+    assert batch.terms == count_terms(contents[0]) + count_terms(contents[1])
+    assert batch.note_count == 2
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=5)
+    stream = ["hot"] * 50 + ["warm"] * 40 + [f"cold{i}" for i in range(100)]
+
+    for item in stream:
+        sketch.add(item)
+
+    assert len(sketch) == 5
+    assert [item for item, _ in sketch.most_common(2)] == ["hot", "warm"]
+    assert sketch["hot"] >= 50
+
+
+def test_approximate_counter_is_bounded():
+    counter = NgramCounter(capacity=10)
+    for i in range(200):
+        counter.add_text(f"common word token{i}")
+
+    assert counter.pending_terms() <= 30
+    assert counter.most_common(2, 1) == ["common word"]
+
+
+@pytest.mark.asyncio
+async def test_scan_notes_streams_corpus(test_db_session):
+    for content in ["one two", "two three", "three four"]:
+        await create_note(test_db_session, NoteCreate(title="title", content=content))
+
+    batches = 0
+
+    async def on_batch():
+        nonlocal batches
+        batches += 1
+
+    counter = await scan_notes(test_db_session, NgramCounter(), batch_size=2, on_batch=on_batch)
+
+    assert counter.note_count == 3
+    assert batches == 2
+    assert Counter({term: count for n, term, count in counter.terms() if n == 1})["two"] == 2
+    assert "two two" not in {term for n, term, _ in counter.terms() if n == 2}
@@ -85,6 +85,56 @@ async def test_get_all_notes(override_get_db):
     assert {note["title"] for note in retrieved_notes} == {note["title"] for note in notes}
 
 
+@pytest.mark.asyncio
+async def test_get_notes_paginated(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        for i in range(5):
+            await ac.post("/notes/", json={"title": f"Note {i}", "content": f"Content {i}"})
+
+        first_page = await ac.get("/notes/", params={"limit": 2})
+        second_page = await ac.get("/notes/", params={"limit": 2, "cursor": first_page.headers["X-Next-Cursor"]})
+        last_page = await ac.get("/notes/", params={"limit": 2, "cursor": second_page.headers["X-Next-Cursor"]})
+
+    assert [note["title"] for note in first_page.json()] == ["Note 0", "Note 1"]
+    assert [note["title"] for note in second_page.json()] == ["Note 2", "Note 3"]
+    assert [note["title"] for note in last_page.json()] == ["Note 4"]
+    assert "X-Next-Cursor" not in last_page.headers
+
+
+@pytest.mark.asyncio
+async def test_get_notes_returns_preview_without_versions(override_get_db):
+    note_data = {"title": "Long Note", "content": "x" * 500}
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json=note_data)
+        await ac.put(f"/notes/{create_response.json()['id']}", json={"content": "y" * 500})
+        response = await ac.get("/notes/")
+
+    note = response.json()[0]
+    assert note["preview"] == "y" * 200
+    assert "content" not in note
+    assert note["versions"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_notes_include_versions(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Versioned", "content": "First"})
+        await ac.put(f"/notes/{create_response.json()['id']}", json={"content": "Second"})
+        response = await ac.get("/notes/", params={"include_versions": True})
+
+    note = response.json()[0]
+    assert [version["content"] for version in note["versions"]] == ["First"]
+
+
+@pytest.mark.asyncio
+async def test_get_notes_rejects_oversized_page(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.get("/notes/", params={"limit": 10000})
+
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_update_note(override_get_db):
     original_note = {"title": "Old Title", "content": "Old Content"}
@@ -102,6 +152,21 @@ async def test_update_note(override_get_db):
     assert updated_data["content"] == updated_note["content"]
 
 
+@pytest.mark.asyncio
+async def test_update_note_returns_note_without_reload(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Title", "content": "first"})
+        note_id = create_response.json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        update_response = await ac.put(f"/notes/{note_id}", json={"content": "third"})
+        get_response = await ac.get(f"/notes/{note_id}")
+
+    assert create_response.json()["created_at"] is not None
+    assert update_response.json()["content"] == "third"
+    assert update_response.json()["revision"] == 3
+    assert update_response.json() == get_response.json()
+
+
 @pytest.mark.asyncio
 async def test_update_note_not_found(override_get_db):
     updated_data = {"title": "Updated Title", "content": "Updated Content"}
@@ -144,6 +209,18 @@ async def test_delete_note(override_get_db):
     assert get_response.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_delete_note_removes_versions(override_get_db, test_db_session):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "first"})).json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        delete_response = await ac.delete(f"/notes/{note_id}")
+
+    assert delete_response.status_code == 204
+    remaining = await test_db_session.execute(text("SELECT COUNT(*) FROM note_versions"))
+    assert remaining.scalar() == 0
+
+
 @pytest.mark.asyncio
 async def test_delete_note_not_found(override_get_db):
     async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
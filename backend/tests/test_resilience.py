@@ -0,0 +1,153 @@
+import asyncio
+import httpx
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.services.gemini_summerizer import GeminiClient
+from app.services.resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_when_reset():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.on_failure()
+    breaker.acquire()
+    breaker.on_success()
+    for _ in range(3):
+        breaker.acquire()
+        breaker.on_failure()
+
+    with pytest.raises(CircuitOpenError) as rejected:
+        breaker.acquire()
+    clock.now += 30
+    breaker.acquire()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.on_success()
+
+    assert rejected.value.retry_after == 30
+    assert rejected.value.retry_after_header == "30"
+    assert breaker.state == breaker.CLOSED
+    breaker.acquire()
+
+
+def test_failed_probe_reopens_and_cancelled_probe_frees_its_slot():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.acquire()
+    breaker.on_failure()
+    clock.now += 10
+
+    breaker.acquire()
+    breaker.on_cancel()
+    breaker.acquire()
+    breaker.on_failure()
+
+    assert breaker.state == breaker.OPEN
+    assert breaker.retry_after() == 10
+
+
+@pytest.mark.asyncio
+async def test_limiter_aimd():
+    limiter = AdaptiveLimiter(max_limit=8, min_limit=1, latency_target=1.0)
+    epoch = await limiter.acquire()
+    limiter.release()
+
+    limiter.on_overload(epoch)
+    limiter.on_overload(epoch)
+    halved = limiter.limit
+    limiter.on_response(0.1, limiter.epoch)
+    limiter.on_response(0.1, limiter.epoch)
+    recovered = limiter.limit
+    limiter.on_response(2.0, limiter.epoch)
+
+    assert halved == 4
+    assert recovered == pytest.approx(4.25 + 1 / 4.25)
+    assert limiter.limit == pytest.approx(recovered / 2)
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_calls_over_the_limit():
+    limiter = AdaptiveLimiter(max_limit=4)
+    limiter.on_overload(limiter.epoch)
+    slots = [await limiter.acquire() for _ in range(2)]
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    queued = not waiting.done()
+
+    limiter.release()
+    await asyncio.wait_for(waiting, 1)
+
+    assert len(slots) == 2 and queued
+    assert limiter.in_flight == 2
+
+
+@pytest.fixture
+async def fragile_client(fake_gemini):
+    client = GeminiClient(api_key="test-key", base_url="http://gemini.test", max_retries=0,
+                          transport=ASGITransport(fake_gemini.app),
+                          breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    app.state.gemini_client = client
+    yield client
+    await client.aclose()
+    del app.state.gemini_client
+
+
+@pytest.mark.asyncio
+async def test_client_fails_fast_once_the_breaker_opens(fake_gemini, fragile_client):
+    fake_gemini.reply(status_code=503, json={"error": "unavailable"})
+    fake_gemini.reply(status_code=429, json={"error": "rate limited"})
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await fragile_client.summarize("Some text.")
+    with pytest.raises(CircuitOpenError):
+        await fragile_client.summarize("Some text.")
+
+    assert len(fake_gemini.requests) == 2
+    assert fragile_client.limiter.limit < fragile_client.limiter.max_limit
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_open_the_breaker(fake_gemini, fragile_client):
+    for _ in range(3):
+        fake_gemini.reply(status_code=400, json={"error": "bad request"})
+        with pytest.raises(httpx.HTTPStatusError):
+            await fragile_client.summarize("Some text.")
+
+    assert fragile_client.breaker.state == CircuitBreaker.CLOSED
+    assert await fragile_client.summarize("Some text.") == "This is a summary"
+
+
+@pytest.mark.asyncio
+async def test_routes_answer_503_with_retry_after_while_open(override_get_db, fake_gemini, fragile_client,
+                                                             summary_cache):
+    for _ in range(2):
+        fake_gemini.reply(status_code=500, json={"error": "Something went wrong"})
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "Some content"})).json()["id"]
+        failures = [await ac.post(f"/summarizer/{note_id}") for _ in range(2)]
+        rejected = await ac.post(f"/summarizer/{note_id}")
+        rejected_stream = await ac.post(f"/summarizer/{note_id}/stream")
+        crud = await ac.get(f"/notes/{note_id}")
+        metrics = await ac.get("/metrics")
+
+    assert [response.status_code for response in failures] == [502] * 2
+    for response in (rejected, rejected_stream):
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "30"
+        assert response.json() == {"detail": "Summarization is temporarily unavailable."}
+    assert len(fake_gemini.requests) == 2
+    assert crud.status_code == 200
+    assert 'gemini_circuit_state{state="open"} 1.0' in metrics.text
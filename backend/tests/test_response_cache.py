@@ -0,0 +1,147 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.main import app
+from app.database import Base, get_read_db
+from app.models import Note
+from app.services.response_cache import CORPUS_GROUP, CachedResponse, MemoryResponseCache, note_group
+
+
+@pytest.mark.asyncio
+async def test_note_served_from_cache_and_revalidated(override_get_db, response_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "first"})).json()["id"]
+        first = await ac.get(f"/notes/{note_id}")
+        second = await ac.get(f"/notes/{note_id}")
+        not_modified = await ac.get(f"/notes/{note_id}", headers={"If-None-Match": first.headers["ETag"]})
+        since = await ac.get(f"/notes/{note_id}", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        changed = await ac.get(f"/notes/{note_id}", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert (response_cache.misses, response_cache.hits) == (2, 3)
+    assert not_modified.status_code == since.status_code == 304
+    assert not_modified.content == b""
+    assert changed.status_code == 200
+    assert changed.json()["content"] == "second"
+    assert changed.headers["ETag"] == '"2"'
+
+
+@pytest.mark.asyncio
+async def test_listing_and_history_follow_writes(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "first"})).json()["id"]
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        listing = await ac.get("/notes/")
+        history = await ac.get(f"/history/{note_id}")
+        await ac.post("/notes/", json={"title": "Other", "content": "other"})
+        await ac.put(f"/notes/{note_id}", json={"content": "third"})
+        new_listing = await ac.get("/notes/", headers={"If-None-Match": listing.headers["ETag"]})
+        new_history = await ac.get(f"/history/{note_id}", headers={"If-None-Match": history.headers["ETag"]})
+        same_history = await ac.get(f"/history/{note_id}", headers={"If-None-Match": new_history.headers["ETag"]})
+
+    assert listing.headers["ETag"].startswith('"c')
+    assert [note["title"] for note in new_listing.json()] == ["Title", "Other"]
+    assert new_listing.json()[0]["preview"] == "third"
+    assert [version["content"] for version in history.json()] == ["first"]
+    assert [version["content"] for version in new_history.json()] == ["second", "first"]
+    assert same_history.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_missing_note_is_not_cached(override_get_db, response_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        missing = await ac.get("/notes/1")
+        await ac.post("/notes/", json={"title": "Title", "content": "first"})
+        found = await ac.get("/notes/1")
+
+    assert missing.status_code == 404
+    assert found.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_analytics_not_modified_until_corpus_changes(override_get_db, analytics_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        await ac.post("/notes/", json={"title": "Title", "content": "hello world"})
+        first = await ac.get("/analytics/")
+        unchanged = await ac.get("/analytics/", headers={"If-None-Match": first.headers["ETag"]})
+        await ac.post("/notes/", json={"title": "Other", "content": "more words here"})
+        changed = await ac.get("/analytics/", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json()["total_word_count"] == 5
+
+
+@pytest.fixture
+async def replica_db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        async def _get_read_db():
+            yield session
+
+        app.dependency_overrides[get_read_db] = _get_read_db
+        yield session
+    app.dependency_overrides.pop(get_read_db, None)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_except_right_after_a_write(override_get_db, replica_db, response_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "first"})).json()["id"]
+        # The replica lags behind the primary.
+        replica_db.add(Note(id=note_id, title="Title", content="replica", versions=[]))
+        await replica_db.commit()
+        from_replica = await ac.get(f"/notes/{note_id}")
+        await ac.put(f"/notes/{note_id}", json={"content": "second"})
+        after_write = await ac.get(f"/notes/{note_id}")
+        listing = await ac.get("/notes/")
+
+    assert from_replica.json()["content"] == "replica"
+    assert after_write.json()["content"] == "second"
+    assert [note["preview"] for note in listing.json()] == ["second"]
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_reports_recent_invalidations():
+    cache = MemoryResponseCache(lag_window=60)
+    await cache.invalidate(note_group(1))
+
+    assert await cache.recently_invalidated(note_group(1))
+    assert not await cache.recently_invalidated(note_group(2))
+    assert not await MemoryResponseCache(lag_window=0).recently_invalidated(note_group(1))
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used_by_size():
+    cache = MemoryResponseCache(max_bytes=120)
+    entry = CachedResponse(b"x" * 30, {"ETag": '"1"'})
+    for variant in "abc":
+        _, generation = await cache.lookup(CORPUS_GROUP, variant)
+        await cache.store(CORPUS_GROUP, variant, entry, generation)
+    await cache.lookup(CORPUS_GROUP, "a")
+    _, generation = await cache.lookup(note_group(1), "")
+    await cache.store(note_group(1), "", entry, generation)
+
+    assert (await cache.lookup(CORPUS_GROUP, "b"))[0] is None
+    assert (await cache.lookup(CORPUS_GROUP, "a"))[0] == entry
+    assert cache.size <= 120
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_drops_responses_rendered_before_invalidation():
+    cache = MemoryResponseCache()
+    _, generation = await cache.lookup(note_group(1), "")
+    # A write commits and invalidates while the response is being rendered.
+    await cache.invalidate(note_group(1))
+    await cache.store(note_group(1), "", CachedResponse(b"stale", {}), generation)
+
+    entry, generation = await cache.lookup(note_group(1), "")
+    assert entry is None
+    await cache.store(note_group(1), "", CachedResponse(b"fresh", {}), generation)
+    assert (await cache.lookup(note_group(1), ""))[0].body == b"fresh"
@@ -0,0 +1,105 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.services.search import SearchIndex, make_snippet, to_tsquery_text
+
+
+async def create_notes(ac, notes):
+    ids = []
+    for title, content in notes:
+        response = await ac.post("/notes/", json={"title": title, "content": content})
+        ids.append(response.json()["id"])
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_matches(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac, [
+            ("Groceries", "Buy apples, pears and bread."),
+            ("Apple pie", "Apples, apples and more apples for the pie."),
+            ("Meeting", "Discuss the roadmap with the team."),
+        ])
+        response = await ac.get("/notes/search", params={"q": "apple"})
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["id"] for result in results] == [ids[1], ids[0]]
+    assert results[0]["title"] == "Apple pie"
+    assert results[0]["score"] > results[1]["score"]
+
+
+@pytest.mark.asyncio
+async def test_search_matches_prefixes_and_requires_every_term(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac, [
+            ("Roadmap", "Quarterly planning for the platform team."),
+            ("Planning", "Holiday planning."),
+        ])
+        prefix_response = await ac.get("/notes/search", params={"q": "plan"})
+        both_response = await ac.get("/notes/search", params={"q": "plan platf"})
+
+    assert {result["id"] for result in prefix_response.json()} == set(ids)
+    assert [result["id"] for result in both_response.json()] == [ids[0]]
+
+
+@pytest.mark.asyncio
+async def test_search_follows_updates_and_deletes(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id, other_id = await create_notes(ac, [("First", "kiwi smoothie"), ("Second", "kiwi salad")])
+        await ac.put(f"/notes/{note_id}", json={"content": "mango smoothie"})
+        await ac.delete(f"/notes/{other_id}")
+        kiwi_response = await ac.get("/notes/search", params={"q": "kiwi"})
+        mango_response = await ac.get("/notes/search", params={"q": "mango"})
+
+    assert kiwi_response.json() == []
+    assert [result["id"] for result in mango_response.json()] == [note_id]
+
+
+@pytest.mark.asyncio
+async def test_search_returns_snippet_around_match(override_get_db):
+    content = "Filler sentence number one. " * 20 + "The needle is here. " + "More filler text. " * 20
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        await create_notes(ac, [("Haystack", content)])
+        response = await ac.get("/notes/search", params={"q": "needle"})
+
+    snippet = response.json()[0]["snippet"]
+    assert "The needle is here." in snippet
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert len(snippet) <= 206
+
+
+@pytest.mark.asyncio
+async def test_search_validation(override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        missing_response = await ac.get("/notes/search")
+        punctuation_response = await ac.get("/notes/search", params={"q": "?!"})
+
+    assert missing_response.status_code == 422
+    assert punctuation_response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_index_build(test_db_session, override_get_db):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        ids = await create_notes(ac, [("Alpha", "first body"), ("Beta", "second body")])
+
+    index = await SearchIndex.build(test_db_session)
+
+    assert len(index) == 2
+    assert [note_id for note_id, _ in index.search(["second"], 10)] == [ids[1]]
+
+
+def test_short_terms_match_exactly():
+    index = SearchIndex()
+    index.add(1, "Note", "an answer")
+    index.add(2, "Note", "an")
+
+    assert {note_id for note_id, _ in index.search(["an"], 10)} == {1, 2}
+    assert [note_id for note_id, _ in index.search(["ans"], 10)] == [1]
+    assert to_tsquery_text(["an", "ans"]) == "an & ans:*"
+
+
+def test_snippet_of_short_content_is_unchanged():
+    assert make_snippet("Short note", ["short"]) == "Short note"
@@ -0,0 +1,39 @@
+from datetime import datetime
+import orjson
+from app import schemas
+from app.models import Note, NoteVersion
+from app.services.serialization import dumps, note_fields, note_list_item_fields, version_fields
+
+
+def make_note() -> Note:
+    versions = [
+        NoteVersion(id=7, content="older text", content_length=10, created_at=datetime(2026, 1, 2, 3, 4, 5, 123456)),
+        NoteVersion(id=3, content="oldest", content_length=None, created_at=datetime(2026, 1, 1)),
+    ]
+    return Note(id=1, title="Title", content="Current «text»", revision=3,
+                created_at=datetime(2025, 12, 31, 23, 59, 59), updated_at=None, versions=versions)
+
+
+def test_note_fields_match_response_model():
+    note = make_note()
+
+    expected = schemas.NoteResponse.model_validate(note).model_dump(mode="json")
+    assert orjson.loads(dumps(note_fields(note))) == expected
+    assert list(note_fields(note)) == list(expected)
+
+
+def test_list_item_fields_match_response_model():
+    note = make_note()
+    row = {"id": note.id, "title": note.title, "preview": "Current", "created_at": note.created_at}
+
+    for versions in (None, note.versions):
+        item = row if versions is None else {**row, "versions": versions}
+        expected = schemas.NoteListItem.model_validate(item).model_dump(mode="json")
+        assert orjson.loads(dumps(note_list_item_fields(item))) == expected
+
+
+def test_version_fields_match_response_model():
+    version = make_note().versions[0]
+
+    expected = schemas.NoteVersionResponse.model_validate(version).model_dump(mode="json")
+    assert orjson.loads(dumps(version_fields(version))) == expected
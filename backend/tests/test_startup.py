@@ -0,0 +1,99 @@
+import asyncio
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import main
+from app.config import ConfigError
+from app.main import app
+from app.services.analytics_cache import AnalyticsCache
+from app.services.gemini_summerizer import GeminiClient
+from app.services.warmup import prime_analytics, run_warmup, warm_pool
+from tests.conftest import TestingSessionLocal
+
+
+def test_app_imports_without_heavy_modules_or_gemini_key():
+    env = {name: value for name, value in os.environ.items() if name != "GENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.main; print(sorted({'nltk', 'numpy', 'pandas'} & set(sys.modules)))"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(__file__)),
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.asyncio
+async def test_summaries_unavailable_without_gemini_settings(override_get_db):
+    with pytest.raises(ConfigError, match="GENAI_API_KEY"):
+        GeminiClient(api_key=None)
+
+    app.state.gemini_client = None
+    try:
+        async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+            response = await ac.post("/summarizer/1")
+    finally:
+        del app.state.gemini_client
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Summarization is not configured."
+
+
+@pytest.mark.asyncio
+async def test_warm_pool_leaves_connections_open(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'warm.db'}", pool_size=3)
+    try:
+        await warm_pool(engine, 3)
+        assert engine.pool.checkedin() == 3
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_warmup_primes_analytics_and_tolerates_failing_hooks(test_db_session):
+    cache = AnalyticsCache()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    outcomes = await run_warmup({"analytics": lambda: prime_analytics(TestingSessionLocal, cache),
+                                 "failing": failing, "slow": slow}, timeout=0.5)
+
+    assert outcomes == {"analytics": "ok", "failing": "failed", "slow": "timed out"}
+    assert cache.stats()["computations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_startup_stops_the_monitor_and_disposes_the_engine(monkeypatch):
+    monitor_cancelled, disposed = asyncio.Event(), []
+
+    async def monitor():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            monitor_cancelled.set()
+            raise
+
+    async def failing_init_db():
+        await asyncio.sleep(0)  # The monitor starts running.
+        raise RuntimeError("database unreachable")
+
+    async def dispose():
+        disposed.append(True)
+
+    monkeypatch.setattr(main, "monitor_event_loop", monitor)
+    monkeypatch.setattr(main, "init_db", failing_init_db)
+    monkeypatch.setattr(main, "engine", SimpleNamespace(dispose=dispose))
+
+    with pytest.raises(RuntimeError, match="database unreachable"):
+        async with main.lifespan(app):
+            pass
+
+    assert monitor_cancelled.is_set()
+    assert disposed == [True]
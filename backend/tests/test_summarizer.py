@@ -1,88 +1,313 @@
+import asyncio
+import json
+import httpx
 import pytest
-import requests
-from app.services.gemini_summerizer import summarize_text, GEMINI_URL
-
-
-@pytest.mark.parametrize(
-    "mock_response, expected_summary",
-    [
-        (
-            {"candidates": [{"content": {"parts": [{"text": "This is a summary"}]}}]},
-            "This is a summary",
-        ),
-        (
-            {"candidates": [{"content": {"parts": [{"text": "Short summary"}]}}]},
-            "Short summary",
-        ),
-    ],
-)
-def test_summarize_text_success(mocker, mock_response, expected_summary):
-    mock_post = mocker.patch("requests.post")
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = mock_response
-
-    text = "Some long text to summarize."
-    result = summarize_text(text)
-
-    assert result == expected_summary
-    mock_post.assert_called_once_with(
-        GEMINI_URL,
-        json={"contents": [{"parts": [{"text": mocker.ANY}]}]},
-        headers={"Content-Type": "application/json"},
-        params={"key": mocker.ANY},
-        timeout=10,
-    )
-
-
-def test_summarize_text_empty_response(mocker):
-    mock_post = mocker.patch("requests.post")
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = {}
-
-    text = "Some text."
-    result = summarize_text(text)
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.models import Note
+from app.services.gemini_summerizer import GeminiAPIError, GeminiClient, SUMMARY_PROMPT, summarize_text
+from app.services.summary_cache import SummaryCache, summary_key
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("summary_text", ["This is a summary", "Short summary"])
+async def test_summarize_text_success(fake_gemini, gemini_client, summary_text):
+    fake_gemini.summary_text = summary_text
+
+    result = await summarize_text(gemini_client, "Some long text to summarize.")
+
+    assert result == summary_text
+    assert len(fake_gemini.requests) == 1
+    request = fake_gemini.requests[0]
+    assert request["path"] == "gemini-2.0-flash:generateContent"
+    assert request["params"] == {"key": "test-key"}
+    assert fake_gemini.prompt_of(request) == SUMMARY_PROMPT + "Some long text to summarize."
+
+
+@pytest.mark.asyncio
+async def test_summarize_text_empty_response(fake_gemini, gemini_client):
+    fake_gemini.reply(json={})
+
+    result = await summarize_text(gemini_client, "Some text.")
 
     assert result == "API response error"
 
 
-def test_summarize_text_invalid_json(mocker):
-    mock_post = mocker.patch("requests.post")
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.side_effect = ValueError("Invalid JSON")
+@pytest.mark.asyncio
+async def test_summarize_text_invalid_json(fake_gemini, gemini_client):
+    fake_gemini.reply(text="not json")
 
-    text = "Some text."
-    result = summarize_text(text)
+    result = await summarize_text(gemini_client, "Some text.")
 
     assert result == "API response error"
 
 
-def test_summarize_text_timeout(mocker):
-    mock_post = mocker.patch("requests.post", side_effect=requests.Timeout)
+@pytest.mark.asyncio
+async def test_summarize_text_timeout(fake_gemini):
+    fake_gemini.delay = 0.2
+    client = GeminiClient(api_key="test-key", base_url="http://gemini.test", timeout=0.05,
+                          transport=ASGITransport(fake_gemini.app))
 
-    text = "Some text."
-    result = summarize_text(text)
+    result = await summarize_text(client, "Some text.")
+    await client.aclose()
 
     assert result == "API request timed out"
-    mock_post.assert_called_once()
 
 
-def test_summarize_text_request_error(mocker):
-    mock_post = mocker.patch("requests.post", side_effect=requests.RequestException("Network error"))
+@pytest.mark.asyncio
+async def test_summarize_text_retries_server_errors(fake_gemini, gemini_client):
+    fake_gemini.reply(status_code=503, json={"error": "unavailable"})
+    fake_gemini.reply(status_code=429, json={"error": "rate limited"})
+
+    result = await summarize_text(gemini_client, "Some text.")
+
+    assert result == "This is a summary"
+    assert len(fake_gemini.requests) == 3
 
-    text = "Some text."
-    result = summarize_text(text)
+
+@pytest.mark.asyncio
+async def test_summarize_text_gives_up_after_max_retries(fake_gemini, gemini_client):
+    for _ in range(gemini_client.max_retries + 1):
+        fake_gemini.reply(status_code=500, json={"error": "Something went wrong"})
+
+    result = await summarize_text(gemini_client, "Some text.")
 
     assert result == "Generation failed"
-    mock_post.assert_called_once()
+    assert len(fake_gemini.requests) == gemini_client.max_retries + 1
 
 
-def test_summarize_text_api_error(mocker):
-    mock_post = mocker.patch("requests.post")
-    mock_post.return_value.status_code = 500
-    mock_post.return_value.json.return_value = {"error": "Something went wrong"}
+@pytest.mark.asyncio
+async def test_summarize_text_does_not_retry_client_errors(fake_gemini, gemini_client):
+    fake_gemini.reply(status_code=400, json={"error": "bad request"})
 
-    text = "Some text."
-    result = summarize_text(text)
+    result = await summarize_text(gemini_client, "Some text.")
 
-    assert result == "API response error"
-    mock_post.assert_called_once()
+    assert result == "Generation failed"
+    assert len(fake_gemini.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_client_bounds_concurrency(fake_gemini):
+    fake_gemini.delay = 0.02
+    client = GeminiClient(api_key="test-key", base_url="http://gemini.test", max_concurrency=2,
+                          transport=ASGITransport(fake_gemini.app))
+
+    results = await asyncio.gather(*(client.summarize(f"text {i}") for i in range(6)))
+    await client.aclose()
+
+    assert results == ["This is a summary"] * 6
+    assert fake_gemini.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_summarizer_endpoint(override_get_db, gemini_client, summary_cache, test_db_session):
+    note = Note(title="Title", content="Some content to summarize")
+    test_db_session.add(note)
+    await test_db_session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        response = await ac.post(f"/summarizer/{note.id}")
+        missing = await ac.post("/summarizer/9999")
+
+    assert response.status_code == 200
+    assert response.json() == {"note_id": note.id, "summary": "This is a summary", "cached": False}
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_summarizer_endpoint_serves_unchanged_notes_from_cache(override_get_db, fake_gemini, gemini_client,
+                                                                      summary_cache):
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        create_response = await ac.post("/notes/", json={"title": "Title", "content": "Original content"})
+        note_id = create_response.json()["id"]
+
+        first = await ac.post(f"/summarizer/{note_id}")
+        second = await ac.post(f"/summarizer/{note_id}")
+        await ac.put(f"/notes/{note_id}", json={"content": "Edited content"})
+        third = await ac.post(f"/summarizer/{note_id}")
+
+    assert first.json()["cached"] is False
+    assert second.json()["cached"] is True
+    assert second.json()["summary"] == first.json()["summary"]
+    assert third.json()["cached"] is False
+    assert len(fake_gemini.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_summary_cache_falls_back_to_database(fake_gemini, gemini_client, test_db_session):
+    await SummaryCache().summarize(test_db_session, gemini_client, "Shared content")
+
+    summary, cached = await SummaryCache().summarize(test_db_session, gemini_client, "Shared content")
+
+    assert (summary, cached) == ("This is a summary", True)
+    assert len(fake_gemini.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_summary_cache_does_not_store_failures(override_get_db, fake_gemini, gemini_client, summary_cache,
+                                                     test_db_session):
+    note = Note(title="Title", content="Some content")
+    test_db_session.add(note)
+    await test_db_session.commit()
+    fake_gemini.reply(status_code=400, json={"error": "bad request"})
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        failed = await ac.post(f"/summarizer/{note.id}")
+        retried = await ac.post(f"/summarizer/{note.id}")
+
+    assert failed.status_code == 502
+    assert retried.json() == {"note_id": note.id, "summary": "This is a summary", "cached": False}
+
+
+@pytest.mark.asyncio
+async def test_summarizer_endpoint_maps_upstream_failures_to_status_codes(override_get_db, fake_gemini,
+                                                                          gemini_client, summary_cache):
+    gemini_client.max_retries = 0
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        note_id = (await ac.post("/notes/", json={"title": "Title", "content": "Some content"})).json()["id"]
+
+        fake_gemini.reply(status_code=500, json={"error": "Something went wrong"})
+        server_error = await ac.post(f"/summarizer/{note_id}")
+        fake_gemini.reply(json={})
+        malformed = await ac.post(f"/summarizer/{note_id}")
+        fake_gemini.reply(status_code=429, json={"error": "rate limited"}, headers={"Retry-After": "7"})
+        rate_limited = await ac.post(f"/summarizer/{note_id}")
+
+        gemini_client.timeout, fake_gemini.delay = 0.05, 0.2
+        timed_out = await ac.post(f"/summarizer/{note_id}")
+
+    assert server_error.status_code == 502
+    assert server_error.json() == {"detail": "Summarization failed: Generation failed."}
+    assert malformed.status_code == 502
+    assert malformed.json() == {"detail": "Summarization failed: API response error."}
+    assert rate_limited.status_code == 503
+    assert rate_limited.headers["Retry-After"] == "7"
+    assert timed_out.status_code == 504
+    assert timed_out.json() == {"detail": "Summarization timed out."}
+
+
+def test_summary_key_depends_on_model_and_content():
+    assert summary_key("text") == summary_key("text")
+    assert summary_key("text") != summary_key("other text")
+    assert summary_key("text", model="a") != summary_key("text", model="b")
+
+
+def sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_relays_chunks_before_generation_finishes(fake_gemini, live_gemini_client):
+    fake_gemini.stream_gate = asyncio.Event()
+    stream = live_gemini_client.stream_summary("Some text.")
+
+    first = await anext(stream)
+    finished_before_first_chunk = fake_gemini.streams_finished
+    fake_gemini.stream_gate.set()
+    rest = [text async for text in stream]
+
+    assert first == "This is "
+    assert finished_before_first_chunk == 0
+    assert rest == ["a summary"]
+    request = fake_gemini.requests[0]
+    assert request["path"] == "gemini-2.0-flash:streamGenerateContent"
+    assert request["params"] == {"key": "test-key", "alt": "sse"}
+    assert fake_gemini.prompt_of(request) == SUMMARY_PROMPT + "Some text."
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_aborts_upstream_generation(fake_gemini, live_gemini_client):
+    fake_gemini.stream_gate = asyncio.Event()
+    stream = live_gemini_client.stream_summary("Some text.")
+
+    await anext(stream)
+    await stream.aclose()
+
+    await wait_for(lambda: fake_gemini.streams_aborted == 1)
+    assert fake_gemini.streams_finished == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_retries_before_streaming(fake_gemini, gemini_client):
+    fake_gemini.reply(status_code=503, json={"error": "unavailable"})
+
+    chunks = [text async for text in gemini_client.stream_summary("Some text.")]
+
+    assert chunks == ["This is ", "a summary"]
+    assert len(fake_gemini.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_rejects_empty_stream(fake_gemini, gemini_client):
+    fake_gemini.stream_chunks = []
+
+    with pytest.raises(GeminiAPIError):
+        [text async for text in gemini_client.stream_summary("Some text.")]
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_endpoint(override_get_db, fake_gemini, gemini_client, summary_cache, test_db_session):
+    note = Note(title="Title", content="Some content to summarize")
+    test_db_session.add(note)
+    await test_db_session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        first = await ac.post(f"/summarizer/{note.id}/stream")
+        second = await ac.post(f"/summarizer/{note.id}/stream")
+        missing = await ac.post("/summarizer/9999/stream")
+
+    assert first.headers["content-type"].startswith("text/event-stream")
+    assert sse_events(first.text) == [
+        ("chunk", {"text": "This is "}),
+        ("chunk", {"text": "a summary"}),
+        ("done", {"note_id": note.id, "summary": "This is a summary", "cached": False}),
+    ]
+    assert sse_events(second.text)[-1] == ("done", {"note_id": note.id, "summary": "This is a summary", "cached": True})
+    assert len(fake_gemini.requests) == 1
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_endpoint_reports_errors_without_caching(override_get_db, fake_gemini, gemini_client,
+                                                                      summary_cache, test_db_session):
+    note = Note(title="Title", content="Some content")
+    test_db_session.add(note)
+    await test_db_session.commit()
+    fake_gemini.reply(status_code=400, json={"error": "bad request"})
+
+    async with AsyncClient(transport=ASGITransport(app), base_url="http://test") as ac:
+        failed = await ac.post(f"/summarizer/{note.id}/stream")
+        retried = await ac.post(f"/summarizer/{note.id}/stream")
+
+    assert sse_events(failed.text) == [("error", {"note_id": note.id, "error": "Generation failed"})]
+    assert sse_events(retried.text)[-1][1]["cached"] is False
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_endpoint_client_disconnect_aborts_upstream(override_get_db, fake_gemini,
+                                                                         live_gemini_client, live_server,
+                                                                         summary_cache, test_db_session):
+    note = Note(title="Title", content="Some content")
+    test_db_session.add(note)
+    await test_db_session.commit()
+    fake_gemini.stream_gate = asyncio.Event()
+    base_url = await live_server(app)
+
+    async with httpx.AsyncClient(base_url=base_url) as ac:
+        async with ac.stream("POST", f"/summarizer/{note.id}/stream") as response:
+            first = await anext(response.aiter_text())
+
+    await wait_for(lambda: fake_gemini.streams_aborted == 1)
+    assert sse_events(first) == [("chunk", {"text": "This is "})]
+    assert fake_gemini.streams_finished == 0
+    assert len(summary_cache._memory) == 0